@@ -47,9 +47,11 @@ class AppMixin:
 
         DestructionManager()
 
+        from photofilmstrip.lib.Settings import Settings
         from photofilmstrip.lib.jobimpl.JobManager import JobManager
         JobManager().Init(workerCount=2)
-        JobManager().Init("render")
+        JobManager().Init("render",
+                          processes=Settings().GetRenderProcesses())
 
         try:
             return self._OnStart()
@@ -10,7 +10,7 @@ import random
 from photofilmstrip.action.IAction import IAction
 
 from photofilmstrip.core.Aspect import Aspect
-from photofilmstrip.core import PILBackend
+from photofilmstrip.core.PictureCache import PictureCache
 
 
 class ActionAutoPath(IAction):
@@ -24,7 +24,7 @@ class ActionAutoPath(IAction):
 
     def Execute(self):
         try:
-            width, height = PILBackend.GetImageSize(
+            width, height = PictureCache().GetImageSize(
                 self.__picture.GetFilename())
         except:
             return
@@ -8,7 +8,7 @@
 from photofilmstrip.action.IAction import IAction
 
 from photofilmstrip.core.Aspect import Aspect
-from photofilmstrip.core import PILBackend
+from photofilmstrip.core.PictureCache import PictureCache
 
 
 class ActionCenterPath(IAction):
@@ -22,7 +22,7 @@ class ActionCenterPath(IAction):
 
     def Execute(self):
         try:
-            width, height = PILBackend.GetImageSize(
+            width, height = PictureCache().GetImageSize(
                 self.__picture.GetFilename())
         except:
             return
@@ -12,10 +12,14 @@ from photofilmstrip.action.IAction import IAction
 
 from photofilmstrip.lib.Settings import Settings
 from photofilmstrip.lib.util import CheckFile
+from photofilmstrip.core.exceptions import RenderException
 from photofilmstrip.core.Renderer import RENDERERS
 from photofilmstrip.core.RenderEngine import RenderEngineSlideshow, \
     RenderEngineTimelapse
 from photofilmstrip.core.RenderJob import RenderJob
+from photofilmstrip.core.renderer.MultiRenderer import MultiRenderer
+from photofilmstrip.core.SegmentCache import SegmentCache
+from photofilmstrip.core.SegmentScheduler import SegmentScheduler
 from photofilmstrip.core.GPlayer import GPlayer
 
 
@@ -24,10 +28,18 @@ class ActionRender(IAction):
     def __init__(self, photoFilmStrip,
                  profile,
                  rendererClass, draftMode,
-                 outpath=None):
+                 outpath=None, targets=None):
+        '''
+        targets is a list of (profile, rendererClass) tuples of additional
+        outputs that are rendered in the same pass, their profiles must have
+        the frame rate of profile. Outputs with the same profile get the name
+        of their renderer appended to the file name, so neither the videos
+        nor the subtitle files overwrite each other.
+        '''
         self.__photoFilmStrip = photoFilmStrip
         self.__profile = profile
         self.__rendererClass = rendererClass
+        self.__targets = targets or []
         self.__draftMode = draftMode
         self.__outpath = outpath
 
@@ -36,13 +48,13 @@ class ActionRender(IAction):
     def GetName(self):
         return _(u'Start')
 
-    def _CheckAndGetOutFile(self):
+    def _CheckAndGetOutFile(self, profile):
         if self.__outpath == "-":
             return
 
         projFile = self.__photoFilmStrip.GetFilename()
         baseDir = os.path.dirname(projFile)
-        baseDir = os.path.join(baseDir, self.__profile.GetName())
+        baseDir = os.path.join(baseDir, profile.GetName())
         if not os.path.isdir(baseDir):
             os.makedirs(baseDir)
 
@@ -73,45 +85,113 @@ class ActionRender(IAction):
             else:
                 logging.warning("Missing audiofile '%s'!", audioFile)
 
-        outFile = self._CheckAndGetOutFile()
-
         self._SaveSettings()
 
-        savedProps = Settings().GetRenderProperties(self.__rendererClass.__name__)
-        for prop in self.__rendererClass.GetProperties():
-            value = savedProps.get(prop.lower(), self.__rendererClass.GetProperty(prop))
-            self.__rendererClass.SetProperty(prop, value)
-
         totalLength = self.__photoFilmStrip.GetDuration(False)
         if totalLength == -1:
             totalLength = int(round((audioLength + 500) / 1000.0))
 
-        renderer = self.__rendererClass()
-        renderer.Init(self.__profile,
-                      self.__photoFilmStrip.GetAspect(),
-                      outFile)
+        renderer = self.__CreateRenderer(self.__profile, self.__rendererClass)
+        renderProfile = self.__profile
+        if self.__targets:
+            # the frames are generated once with the largest resolution and
+            # resized for the other outputs
+            renderers = [renderer]
+            outputs = [(self.__profile.GetName(), self.__rendererClass)]
+            outFiles = [self._CheckAndGetOutFile(self.__profile)]
+            for profile, rendererClass in self.__targets:
+                if profile.GetFrameRate().AsFloat() != \
+                        self.__profile.GetFrameRate().AsFloat():
+                    raise RenderException(
+                        _(u"All output profiles must have the same frame rate!"))
+                if (profile.GetName(), rendererClass) in outputs:
+                    raise RenderException(
+                        _(u"Output '%(profile)s' (%(format)s) is rendered twice!")
+                        % {"profile": profile.GetName(),
+                           "format": rendererClass.GetName()})
+                outputs.append((profile.GetName(), rendererClass))
+
+                outFile = self._CheckAndGetOutFile(profile)
+                if outFile in outFiles:
+                    outFile = "%s_%s" % (outFile, rendererClass.__name__)
+                outFiles.append(outFile)
+
+                renderers.append(self.__CreateRenderer(profile, rendererClass,
+                                                       outFile))
+                width, height = profile.GetResolution()
+                if width * height > renderProfile.GetResolution()[0] * \
+                        renderProfile.GetResolution()[1]:
+                    renderProfile = profile
+
+            renderer = MultiRenderer(renderers)
+            renderer.Init(renderProfile,
+                          self.__photoFilmStrip.GetAspect(),
+                          None)
 
         renderer.SetAudioFiles(audioFiles)
 
         if self.__photoFilmStrip.GetTimelapse():
             uxEvent = "RenderTimeLapse"
-            renderEngine = RenderEngineTimelapse(self.__profile,
+            renderEngine = RenderEngineTimelapse(renderProfile,
                                                  self.__photoFilmStrip.GetPictures(),
                                                  self.__draftMode)
         else:
             uxEvent = "RenderSlideshow"
-            renderEngine = RenderEngineSlideshow(self.__profile,
+            renderEngine = RenderEngineSlideshow(renderProfile,
                                                  self.__photoFilmStrip.GetPictures(),
                                                  self.__draftMode,
                                                  totalLength)
 
+        renderEngine.SetQuantum(Settings().GetRenderQuantum())
+
         name = "%s (%s)" % (self.__photoFilmStrip.GetName(),
                             self.__profile.GetName())
 
+        imageCacheBytes = None
+        cacheSize = Settings().GetRenderCacheSize()
+        if cacheSize is not None:
+            imageCacheBytes = cacheSize * 1024 * 1024
+
+        segmentCount = renderer.GetSegmentCount()
+        if segmentCount > 1:
+            segmentCacheSize = Settings().GetSegmentCacheSize()
+            if segmentCacheSize is not None:
+                SegmentCache().SetMaxBytes(segmentCacheSize * 1024 * 1024)
+
+            # one segment per picture, after editing a picture only its
+            # segment is encoded again
+            segmentScheduler = SegmentScheduler(
+                renderEngine, renderEngine.GetSegments(), segmentCount)
+            renderer.SetSegmentScheduler(segmentScheduler)
+            tasks = segmentScheduler.IterTasks()
+            taskCount = segmentScheduler.GetTaskCount()
+        else:
+            tasks = renderEngine.IterTasks()
+            # counting the tasks validates the pictures before the job is queued
+            taskCount = renderEngine.GetTaskCount()
+
         self.__renderJob = RenderJob(name, renderer,
-                                     renderEngine.GetTasks())
+                                     tasks,
+                                     imageCacheBytes,
+                                     taskCount,
+                                     Settings().GetRenderReorderWindow())
         self.__renderJob.AddUxEvent(uxEvent)
         self.__renderJob.AddUxEvent(self.__profile.GetName())
 
+    def __CreateRenderer(self, profile, rendererClass, outFile=None):
+        if outFile is None:
+            outFile = self._CheckAndGetOutFile(profile)
+
+        savedProps = Settings().GetRenderProperties(rendererClass.__name__)
+        for prop in rendererClass.GetProperties():
+            value = savedProps.get(prop.lower(), rendererClass.GetProperty(prop))
+            rendererClass.SetProperty(prop, value)
+
+        renderer = rendererClass()
+        renderer.Init(profile,
+                      self.__photoFilmStrip.GetAspect(),
+                      outFile)
+        return renderer
+
     def GetRenderJob(self):
         return self.__renderJob
@@ -16,6 +16,7 @@ from photofilmstrip.lib.util import CheckFile
 from photofilmstrip.core.OutputProfile import (
     GetOutputProfiles, GetMPEGProfiles)
 from photofilmstrip.core.ProjectFile import ProjectFile
+from photofilmstrip.core.exceptions import RenderException
 from photofilmstrip.core.Renderer import RENDERERS
 from photofilmstrip.core.renderer.StreamRenderer import StreamRenderer
 from photofilmstrip.action.ActionRender import ActionRender
@@ -104,6 +105,7 @@ def main(showHelp=False):
     parser.add_option("-t", "--profile", help=profStr + " [default: %default]", default=0, type="int")
     parser.add_option("-n", "--videonorm", help=_("Option videonorm is deprecated, use an appropriate profile!"))
     parser.add_option("-f", "--format", help=formatStr + " [default: %default]", default=4, type="int")
+    parser.add_option("-e", "--extra", action="append", default=[], help=_("renders an additional output in the same pass, given as PROFILE or PROFILE:FORMAT, may be used several times"), metavar="PROFILE[:FORMAT]")
     parser.add_option("-a", "--draft", action="store_true", default=False, help="%s - %s" % (_("enable draft mode"), _("Activate this option to generate a preview of your PhotoFilmStrip. The rendering process will speed up dramatically, but results in lower quality.")))
     parser.add_option("-d", "--debug", action="store_true", default=False, help="enable debug logging")
 
@@ -140,6 +142,18 @@ def main(showHelp=False):
         return 3
     profile = profiles[options.profile]
 
+    targets = []
+    for extra in options.extra:
+        try:
+            values = [int(value) for value in extra.split(":")]
+            extraProfile = profiles[values[0]]
+            extraRenderer = RENDERERS[values[1]] if len(values) > 1 else rendererClass
+        except (ValueError, IndexError):
+            parser.print_help()
+            logging.error(_("invalid extra output specified: %s"), extra)
+            return 9
+        targets.append((extraProfile, extraRenderer))
+
     prjFile = ProjectFile(filename=options.project)
     if not prjFile.Load():
         logging.error(_("cannot load project"))
@@ -160,8 +174,13 @@ def main(showHelp=False):
     else:
         outpath = None
 
+    if targets and outpath == "-":
+        logging.error(_("extra outputs cannot be written to stdout"))
+        return 9
+
     project = prjFile.GetProject()
-    ar = ActionRender(project, profile, rendererClass, False, outpath)
+    ar = ActionRender(project, profile, rendererClass, False, outpath,
+                      targets)
 
     audioFile = project.GetAudioFile()
     if not CheckFile(audioFile):
@@ -175,7 +194,11 @@ def main(showHelp=False):
 
     cliGui.Info(options.project, rendererClass, profile)
 
-    ar.Execute()
+    try:
+        ar.Execute()
+    except RenderException as exc:
+        logging.error(exc.GetMessage())
+        return 11
     renderJob = ar.GetRenderJob()
     renderJob.AddVisualJobHandler(cliGui)
 
@@ -189,6 +212,10 @@ def main(showHelp=False):
         cliGui.Write("\n" + _("...aborted!"))
         return 10
 
+    if renderJob.IsAborted():
+        logging.error(renderJob.GetInfo())
+        return 12
+
     resultObj = renderJob.GetResultObject()
     result = resultObj.GetResult()
     if result:
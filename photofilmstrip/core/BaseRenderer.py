@@ -118,15 +118,61 @@ class BaseRenderer(metaclass=MetaBaseRenderer):
     def ToSink(self, data):
         raise NotImplementedError()
 
+    def ToSinkRepeated(self, data, count):
+        '''
+        Passes a frame that is shown count times in a row. Renderers that can
+        repeat or extend a frame themselves should override this.
+        '''
+        for __ in range(count):
+            self.ToSink(data)
+
     def ProcessAbort(self):
         raise NotImplementedError()
 
+    def GetStatistics(self):
+        '''
+        Returns a dict with statistics of the renderer for logging.
+        '''
+        return {}
+
+    def GetSegmentCount(self):
+        '''
+        Returns the number of segments the renderer can encode in parallel.
+        If greater than 1 the frames of several segments are passed
+        interleaved and the renderer gets the SegmentScheduler that tells
+        the segment of each frame, see SetSegmentScheduler().
+        '''
+        return 1
+
+    def SetSegmentScheduler(self, segmentScheduler):
+        '''
+        Each segment has a fingerprint of its frames, see
+        RenderSegment.GetFingerprint(). Renderers may use it to reuse
+        segments they have encoded already and mark them as finished in the
+        segmentScheduler.
+        '''
+        raise NotImplementedError()
+
 
 class FinalizeHandler(object):
 
     def ProcessFinalize(self, pilImg):
         raise NotImplementedError()
 
+    def IsProcessable(self):
+        '''
+        Returns True if the handler is picklable and produces bytes, so the
+        finalization can be done within a worker process.
+        '''
+        return False
+
+    def GetKey(self):
+        '''
+        Returns a key that is equal for handlers that produce the same result
+        of a frame, so the result can be shared, or None if not.
+        '''
+        return None
+
 
 class ImageDataFinalizeHandler(FinalizeHandler):
 
@@ -141,3 +187,32 @@ class ImageDataFinalizeHandler(FinalizeHandler):
         else:
             pilImg.save(res, self._format)
         return res.getvalue()
+
+    def IsProcessable(self):
+        return True
+
+    def GetKey(self):
+        return ("ImageData", self._format, self._quality)
+
+
+class RawImageFinalizeHandler(FinalizeHandler):
+    '''
+    Hands over the uncompressed pixel data of the frame. The default raw mode
+    RGBX uses 4 bytes per pixel so each row is aligned to 4 bytes, which is
+    what video/x-raw expects for any frame width.
+    '''
+
+    def __init__(self, rawMode="RGBX"):
+        self._rawMode = rawMode
+
+    def GetRawMode(self):
+        return self._rawMode
+
+    def ProcessFinalize(self, pilImg):
+        return pilImg.tobytes("raw", self._rawMode)
+
+    def IsProcessable(self):
+        return True
+
+    def GetKey(self):
+        return ("Raw", self._rawMode)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2017 Jens Goepfert
+#
+
+import threading
+
+from photofilmstrip.core.PILBackend import SourceImage
+from photofilmstrip.lib.common.LruCache import LruCache
+
+
+class ImageSourceCache:
+    '''
+    Holds the decoded source pictures used by the tasks of a RenderJob. The
+    cache keeps at most maxBytes of image data. The least recently used
+    pictures are evicted first and are decoded again on the next request.
+    '''
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, maxBytes=None):
+        if maxBytes is None:
+            maxBytes = ImageSourceCache.DEFAULT_MAX_BYTES
+        self.__images = LruCache(maxBytes, ImageSourceCache.GetImageBytes)
+
+        # keys of images that are currently decoded by a thread
+        self.__loading = {}
+        self.__lock = threading.Lock()
+
+        self.__hits = 0
+        self.__misses = 0
+
+    @staticmethod
+    def GetImageBytes(pilImg):
+        if isinstance(pilImg, SourceImage):
+            return pilImg.GetBytes()
+        width, height = pilImg.size
+        # PIL stores multi band images with 4 bytes per pixel
+        if len(pilImg.getbands()) > 1:
+            return width * height * 4
+        else:
+            return width * height
+
+    def GetMaxBytes(self):
+        return self.__images.GetMaxBytes()
+
+    def GetBytes(self):
+        return self.__images.GetBytes()
+
+    def Get(self, key, loader):
+        '''
+        Returns the image for the given key. If it is not cached, loader is
+        called to decode it. Concurrent requests for the same key wait for
+        the first one instead of decoding the picture twice.
+        :param key: the key of the picture
+        :param loader: callable without arguments that returns a PIL image
+        '''
+        while True:
+            with self.__lock:
+                pilImg = self.__images.Get(key)
+                if pilImg is not None:
+                    self.__hits += 1
+                    return pilImg
+
+                event = self.__loading.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self.__loading[key] = event
+                    self.__misses += 1
+                    break
+            event.wait()
+
+        try:
+            pilImg = loader()
+            with self.__lock:
+                # the newest image is always kept, even if it exceeds the
+                # budget
+                self.__images.Put(key, pilImg)
+        finally:
+            with self.__lock:
+                del self.__loading[key]
+            event.set()
+        return pilImg
+
+    def Clear(self):
+        self.__images.Clear()
+
+    def GetStatistics(self):
+        with self.__lock:
+            return {"hits": self.__hits,
+                    "misses": self.__misses,
+                    "evictions": self.__images.GetEvictions(),
+                    "bytes": self.__images.GetBytes(),
+                    "peakBytes": self.__images.GetPeakBytes(),
+                    "maxBytes": self.__images.GetMaxBytes()}
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import logging
+import os
+import threading
+
+from photofilmstrip.core.PictureCache import PictureCache
+from photofilmstrip.lib.jobimpl.VisualJob import VisualJob
+from photofilmstrip.lib.jobimpl.WorkLoad import WorkLoad
+
+
+class ImportJob(VisualJob):
+    '''
+    Reads size and orientation of new pictures in the worker threads of the
+    general group. The pictures are passed to callback in their original
+    order as soon as they and all pictures before them are read, so they can
+    be inserted while the others are still read. callback is called from a
+    worker thread with the list of pictures and the index of the first one.
+    '''
+
+    def __init__(self, pictures, callback):
+        VisualJob.__init__(self, _(u"Importing %d pictures") % len(pictures),
+                           maxProgress=len(pictures))
+        self.__pictures = pictures
+        self.__callback = callback
+
+        self.__lock = threading.Lock()
+        self.__ready = set()
+        self.__nextIdx = 0
+
+        for idx, pic in enumerate(pictures):
+            self.AddWorkLoad(ImportWorkLoad(idx, pic))
+
+    def PushResult(self, resultObject):
+        VisualJob.PushResult(self, resultObject)
+        workLoad = resultObject.GetSource()
+
+        with self.__lock:
+            self.__ready.add(workLoad.GetIndex())
+            startIdx = self.__nextIdx
+            while self.__nextIdx in self.__ready:
+                self.__ready.remove(self.__nextIdx)
+                self.__nextIdx += 1
+
+            if self.__nextIdx > startIdx and not self.IsAborted():
+                self.__callback(self.__pictures[startIdx:self.__nextIdx],
+                                startIdx)
+
+        filename = workLoad.GetPicture().GetFilename()
+        self.StepProgress(_(u"Reading '%s' ...") % os.path.basename(filename))
+
+
+class ImportWorkLoad(WorkLoad):
+
+    def __init__(self, idx, picture):
+        WorkLoad.__init__(self)
+        self.__idx = idx
+        self.__picture = picture
+
+    def GetIndex(self):
+        return self.__idx
+
+    def GetPicture(self):
+        return self.__picture
+
+    def Run(self, jobContext):
+        filename = self.__picture.GetFilename()
+        try:
+            width, height = PictureCache().GetImageSize(filename)
+        except Exception as err:
+            # the picture is shown as a dummy, like before
+            logging.getLogger("ImportJob").debug("cannot read %s: %s",
+                                                 filename, err)
+            return
+
+        if self.__picture.GetWidth() == -1:
+            self.__picture.SetWidth(width)
+            self.__picture.SetHeight(height)
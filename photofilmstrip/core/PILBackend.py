@@ -7,6 +7,7 @@
 
 import logging
 import io
+import math
 
 from PIL import Image, ImageDraw
 
@@ -25,7 +26,39 @@ def ImageFromBuffer(size, buffr):
     return pilImg
 
 
-def RotateExif(pilImg):
+def ImageFromStream(fd):
+    pilImg = Image.open(fd)
+    pilImg.load()
+    return pilImg
+
+
+class SourceImage:
+    """
+    A decoded picture for rendering together with the affine matrix that maps
+    coordinates of the picture as it is shown (full size, EXIF orientation
+    and rotation applied) to pixels of the decoded image.
+    """
+
+    def __init__(self, pilImg, matrix):
+        self.__pilImg = pilImg
+        self.__matrix = matrix
+
+    def GetImage(self):
+        return self.__pilImg
+
+    def GetMatrix(self):
+        return self.__matrix
+
+    def GetBytes(self):
+        width, height = self.__pilImg.size
+        # PIL stores multi band images with 4 bytes per pixel
+        if len(self.__pilImg.getbands()) > 1:
+            return width * height * 4
+        else:
+            return width * height
+
+
+def GetExifOrientation(pilImg):
     exifOrient = 274
     rotation = 0
     try:
@@ -36,6 +69,11 @@ def RotateExif(pilImg):
         pass
     except Exception as err:
         logging.debug("PILBackend.RotateExif(): %s", err, exc_info=1)
+    return rotation
+
+
+def RotateExif(pilImg):
+    rotation = GetExifOrientation(pilImg)
 
     if rotation == 2:
         # flip horizontal
@@ -64,15 +102,76 @@ def RotateExif(pilImg):
     return pilImg
 
 
-def CropAndResize(pilImg, rect, size, draft=False):
+def __MultiplyAffine(matrix1, matrix2):
+    """
+    returns the affine matrix that applies matrix2 first and then matrix1
+    """
+    a, b, c, d, e, f = matrix1
+    g, h, i, j, k, l = matrix2
+    return (a * g + b * j, a * h + b * k, a * i + b * l + c,
+            d * g + e * j, d * h + e * k, d * i + e * l + f)
+
+
+def __GetOrientationMatrix(orientation, width, height):
+    """
+    returns the affine matrix that maps coordinates of the picture with the
+    EXIF orientation applied to the stored picture of size width x height
+    """
+    if orientation == 2:
+        # flip horizontal
+        return (-1, 0, width, 0, 1, 0)
+    elif orientation == 3:
+        # rotate 180
+        return (-1, 0, width, 0, -1, height)
+    elif orientation == 4:
+        # flip vertical
+        return (1, 0, 0, 0, -1, height)
+    elif orientation == 5:
+        # transpose
+        return (0, 1, 0, 1, 0, 0)
+    elif orientation == 6:
+        # rotate 90
+        return (0, 1, 0, -1, 0, height)
+    elif orientation == 7:
+        # transverse
+        return (0, -1, width, -1, 0, height)
+    elif orientation == 8:
+        # rotate 270
+        return (0, -1, width, 1, 0, 0)
+    return (1, 0, 0, 0, 1, 0)
+
+
+def __GetRotationMatrix(angle, width, height):
+    """
+    returns the affine matrix Image.rotate() uses to rotate a picture of size
+    width x height by angle degrees around its center without expanding it
+    """
+    angle = -math.radians(angle)
+    cos = round(math.cos(angle), 15)
+    sin = round(math.sin(angle), 15)
+    centerX = width / 2.0
+    centerY = height / 2.0
+    return (cos, sin, cos * -centerX + sin * -centerY + centerX,
+            -sin, cos, -sin * -centerX + cos * -centerY + centerY)
+
+
+def CropAndResize(pilImg, rect, size, draft=False, matrix=None):
+    """
+    Crops rect out of the picture and resizes it to size with one affine
+    transformation. If matrix is given the rect is mapped with it into the
+    picture, see GetSourceImage().
+    """
     if draft:
         filtr = Image.NEAREST
     else:
         filtr = Image.BILINEAR
+    data = (rect[2] / size[0], 0, rect[0],
+            0, rect[3] / size[1], rect[1])
+    if matrix is not None:
+        data = __MultiplyAffine(matrix, data)
     img = pilImg.transform(size,
                            Image.AFFINE,
-                           [rect[2] / size[0], 0, rect[0],
-                            0, rect[3] / size[1], rect[1]],
+                           data,
                            filtr)
     return img
 
@@ -141,10 +240,17 @@ def __ProcessImage(img, picture):
         if rotation != 0:
             img = img.rotate(rotation)
 
-    if picture.GetEffect() == picture.EFFECT_BLACK_WHITE:
+    return ApplyEffect(img, picture.GetEffect())
+
+
+def ApplyEffect(img, effect):
+    """
+    Applies the color effect of a picture and returns an RGB image.
+    """
+    if effect == Picture.EFFECT_BLACK_WHITE:
         img = img.convert("L")
 
-    elif picture.GetEffect() == picture.EFFECT_SEPIA:
+    elif effect == Picture.EFFECT_SEPIA:
 
         def make_linear_ramp(white):
             # putpalette expects [r,g,b,r,g,b,...]
@@ -163,6 +269,9 @@ def __ProcessImage(img, picture):
 
 
 def GetImage(picture):
+    """
+    Loads the picture with rotation and effect applied.
+    """
     pilImg = __GetImage(picture)
     pilImg = __ProcessImage(pilImg, picture)
     picture.SetWidth(pilImg.size[0])
@@ -170,17 +279,58 @@ def GetImage(picture):
     return pilImg
 
 
+def GetSourceImage(picture, scale=None):
+    """
+    Loads the picture for rendering with a single decode. EXIF orientation
+    and rotation are not applied to the pixels but returned as affine matrix
+    for CropAndResize(), the effect is applied to the cropped frames with
+    ApplyEffect(). If scale is given the picture is decoded in draft mode
+    (if supported by the format) and resized to its full size multiplied by
+    scale. The width and height of the picture are always set to the full
+    size.
+    :rtype: SourceImage
+    """
+    pilImg = __GetImage(picture)
+
+    rawWidth, rawHeight = pilImg.size
+    orientation = 0
+    if not picture.IsDummy():
+        orientation = GetExifOrientation(pilImg)
+
+    width, height = rawWidth, rawHeight
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    if scale is not None:
+        pilImg.draft("RGB", (int(math.ceil(rawWidth * scale)),
+                             int(math.ceil(rawHeight * scale))))
+    # decode now, the image is shared by several threads afterwards
+    pilImg.load()
+    if pilImg.mode != "RGB":
+        pilImg = pilImg.convert("RGB")
+    if scale is not None:
+        size = (max(1, int(round(rawWidth * scale))),
+                max(1, int(round(rawHeight * scale))))
+        if pilImg.size != size:
+            pilImg = pilImg.resize(size, Image.BILINEAR)
+
+    picture.SetWidth(width)
+    picture.SetHeight(height)
+
+    matrix = (pilImg.size[0] / rawWidth, 0, 0,
+              0, pilImg.size[1] / rawHeight, 0)
+    matrix = __MultiplyAffine(matrix,
+                              __GetOrientationMatrix(orientation,
+                                                     rawWidth, rawHeight))
+    if not picture.IsDummy() and picture.GetRotation() != 0:
+        matrix = __MultiplyAffine(matrix,
+                                  __GetRotationMatrix(picture.GetRotation() * -90,
+                                                      width, height))
+    return SourceImage(pilImg, matrix)
+
+
 def GetExifRotation(pilImg):
-    exifOrient = 274
-    rotation = 0
-    try:
-        exif = pilImg._getexif()  # pylint: disable=protected-access
-        if isinstance(exif, dict) and exifOrient in exif:
-            rotation = exif[exifOrient]
-    except AttributeError:
-        pass
-    except Exception as err:
-        logging.debug("PILBackend.RotateExif(): %s", err, exc_info=1)
+    rotation = GetExifOrientation(pilImg)
 
     if rotation == 3:
         # rotate 180
@@ -202,13 +352,21 @@ def GetExifRotation(pilImg):
 
 
 def GetImageSize(filename):
+    width, height = GetImageInfo(filename)[:2]
+    return width, height
+
+
+def GetImageInfo(filename):
+    """
+    Reads only the header of the file and returns width and height with the
+    EXIF orientation applied and the EXIF orientation itself.
+    """
     pilImg = Image.open(filename)
     width, height = pilImg.size
-    rotation = GetExifRotation(pilImg)
-    while rotation > 0:
+    orientation = GetExifOrientation(pilImg)
+    if orientation in (5, 6, 7, 8):
         width, height = height, width
-        rotation -= 1
-    return width, height
+    return width, height, orientation
 
 
 def GetThumbnail(picture, width=None, height=None):
@@ -225,7 +383,9 @@ def GetThumbnail(picture, width=None, height=None):
         thumbHeight = height
         thumbWidth = int(round(thumbHeight * aspect))
 
-    # prescale image to speed up processing
+    # let the decoder scale down JPEG pictures, then prescale image to speed
+    # up processing
+    img.draft("RGB", (max(thumbWidth, thumbHeight), max(thumbWidth, thumbHeight)))
     img.thumbnail((max(thumbWidth, thumbHeight), max(thumbWidth, thumbHeight)), Image.NEAREST)
     img = __ProcessImage(img, picture)
 
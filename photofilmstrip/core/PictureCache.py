@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from photofilmstrip.core import PILBackend
+from photofilmstrip.lib.common.Singleton import Singleton
+from photofilmstrip.lib.util import GetCacheDir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS `metadata` (
+    key TEXT PRIMARY KEY,
+    width INTEGER,
+    height INTEGER,
+    orientation INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS `thumbnail` (
+    key TEXT PRIMARY KEY,
+    accessed INTEGER,
+    size INTEGER,
+    data BLOB
+);
+
+CREATE INDEX IF NOT EXISTS `thumbnail_accessed` ON `thumbnail` (accessed);
+"""
+
+
+class PictureCache(Singleton):
+    '''
+    Keeps thumbnails and metadata of pictures in a database on disk that is
+    shared by all projects. An entry is addressed by the path, size and
+    modification time of the picture file, so a modified file is never
+    served from the cache. Thumbnails additionally depend on rotation and
+    effect of the picture and the requested size. The database is opened
+    on first use. If the cache cannot be used the values are computed every
+    time.
+    '''
+
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self):
+        self.__logger = logging.getLogger("PictureCache")
+        self.__lock = threading.Lock()
+        self.__conn = None
+        self.__opened = False
+        self.__filename = os.path.join(GetCacheDir("thumbnails"), "cache.db")
+        self.__bytes = 0
+        self.__maxBytes = PictureCache.DEFAULT_MAX_BYTES
+
+    def SetFilename(self, filename):
+        with self.__lock:
+            if self.__conn is not None:
+                self.__conn.close()
+                self.__conn = None
+            self.__opened = False
+            self.__filename = filename
+            self.__bytes = 0
+
+    def __Open(self):
+        '''
+        Opens the database on first use and returns the connection or None
+        if the cache is not available. Must be called with the lock held.
+        '''
+        if self.__opened:
+            return self.__conn
+        self.__opened = True
+
+        try:
+            dirname = os.path.dirname(self.__filename)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            conn = sqlite3.connect(self.__filename, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            cur = conn.execute("SELECT SUM(size) FROM `thumbnail`")
+            self.__bytes = cur.fetchone()[0] or 0
+            self.__conn = conn
+        except (OSError, sqlite3.Error) as err:
+            self.__logger.warning("cache not available (%s): %s",
+                                  self.__filename, err)
+        return self.__conn
+
+    def GetFilename(self):
+        return self.__filename
+
+    def SetMaxBytes(self, maxBytes):
+        self.__maxBytes = maxBytes
+
+    def __GetFileKey(self, filename):
+        stat = os.stat(filename)
+        return "%s:%s:%s" % (os.path.abspath(filename),
+                             stat.st_size, stat.st_mtime_ns)
+
+    def __Execute(self, query, values, commit=False):
+        '''
+        Executes the query and returns all rows. Returns None if the cache is
+        not available or broken.
+        '''
+        with self.__lock:
+            if self.__Open() is None:
+                return None
+            try:
+                rows = self.__conn.execute(query, values).fetchall()
+                if commit:
+                    self.__conn.commit()
+                return rows
+            except sqlite3.Error as err:
+                self.__logger.warning("query failed: %s", err)
+                return None
+
+    def GetImageInfo(self, filename):
+        '''
+        Returns width and height with the EXIF orientation applied and the
+        EXIF orientation of the picture file, see PILBackend.GetImageInfo().
+        '''
+        try:
+            key = self.__GetFileKey(filename)
+        except OSError:
+            return PILBackend.GetImageInfo(filename)
+
+        rows = self.__Execute("SELECT width, height, orientation "
+                              "FROM `metadata` WHERE key=?", (key,))
+        if rows:
+            return tuple(rows[0])
+
+        info = PILBackend.GetImageInfo(filename)
+        self.__Execute("INSERT OR REPLACE INTO `metadata` "
+                       "(key, width, height, orientation) "
+                       "VALUES (?, ?, ?, ?)", (key,) + tuple(info),
+                       commit=True)
+        return info
+
+    def GetImageSize(self, filename):
+        width, height = self.GetImageInfo(filename)[:2]
+        return width, height
+
+    def GetThumbnail(self, picture, width=None, height=None):
+        '''
+        Same as PILBackend.GetThumbnail() but decodes the picture only if
+        the thumbnail is not cached yet.
+        '''
+        try:
+            fileKey = self.__GetFileKey(picture.GetFilename())
+        except (OSError, TypeError):
+            return PILBackend.GetThumbnail(picture, width=width, height=height)
+
+        key = hashlib.sha1("{0}:{1}:{2}:{3}x{4}".format(
+            fileKey, picture.GetRotation(), picture.GetEffect(),
+            width, height).encode("utf-8")).hexdigest()
+
+        rows = self.__Execute("SELECT data FROM `thumbnail` WHERE key=?",
+                              (key,))
+        if rows:
+            self.__Execute("UPDATE `thumbnail` SET accessed=? WHERE key=?",
+                           (int(time.time()), key), commit=True)
+            picture.SetDummy(False)
+            return PILBackend.ImageFromStream(io.BytesIO(rows[0][0]))
+
+        pilImg = PILBackend.GetThumbnail(picture, width=width, height=height)
+        if not picture.IsDummy():
+            data = PILBackend.ImageToStream(pilImg).getvalue()
+            self.__PutThumbnail(key, data)
+        return pilImg
+
+    def __PutThumbnail(self, key, data):
+        '''
+        Stores the thumbnail and keeps the size of the cache up to date. The
+        thumbnail may have been stored by another thread in the meantime, its
+        size is replaced then.
+        '''
+        with self.__lock:
+            if self.__Open() is None:
+                return
+            try:
+                row = self.__conn.execute("SELECT size FROM `thumbnail` "
+                                          "WHERE key=?", (key,)).fetchone()
+                self.__conn.execute("INSERT OR REPLACE INTO `thumbnail` "
+                                    "(key, accessed, size, data) "
+                                    "VALUES (?, ?, ?, ?)",
+                                    (key, int(time.time()), len(data),
+                                     sqlite3.Binary(data)))
+                self.__conn.commit()
+            except sqlite3.Error as err:
+                self.__logger.warning("query failed: %s", err)
+                return
+
+            self.__bytes += len(data) - (row[0] if row else 0)
+            if self.__bytes > self.__maxBytes:
+                self.__Prune()
+
+    def __Prune(self):
+        '''
+        Removes the least recently used thumbnails until the cache uses 3/4
+        of its budget. Must be called with the lock held.
+        '''
+        try:
+            rows = self.__conn.execute("SELECT key, size FROM `thumbnail` "
+                                       "ORDER BY accessed ASC").fetchall()
+            totalBytes = sum(size for __, size in rows)
+
+            keys = []
+            for key, size in rows:
+                if totalBytes <= self.__maxBytes * 3 // 4:
+                    break
+                keys.append((key,))
+                totalBytes -= size
+
+            self.__conn.executemany("DELETE FROM `thumbnail` WHERE key=?",
+                                    keys)
+            self.__conn.commit()
+        except sqlite3.Error as err:
+            self.__logger.warning("pruning failed: %s", err)
+            return
+        self.__bytes = totalBytes
+        self.__logger.debug("pruned %s thumbnails", len(keys))
+
+    def GetBytes(self):
+        with self.__lock:
+            self.__Open()
+            return self.__bytes
@@ -5,6 +5,8 @@
 # Copyright (C) 2017 Jens Goepfert
 #
 
+import bisect
+import concurrent.futures
 import logging
 import os
 import random
@@ -13,6 +15,7 @@ import sqlite3
 from photofilmstrip.core import PILBackend
 from photofilmstrip.core.Aspect import Aspect
 from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.PictureCache import PictureCache
 
 from photofilmstrip.gui.util.ImageCache import ImageCache  # FIXME: no gui import here
 from photofilmstrip.core.Project import Project
@@ -69,6 +72,18 @@ CREATE TABLE `thumbnail` (
 );
 """
 
+PICTURE_COLUMNS = ("filename", "width", "height",
+                   "start_left", "start_top", "start_width", "start_height",
+                   "target_left", "target_top", "target_width", "target_height",
+                   "rotation", "duration", "movement", "comment", "effect",
+                   "transition", "transition_duration")
+
+BLOB_CHUNK_SIZE = 1024 * 1024
+# distance of the picture ids if the rows are numbered again, leaves room
+# to insert pictures without moving rows
+ID_STEP = 1024
+EXTRACT_WORKERS = 4
+
 
 class ProjectFile:
 
@@ -144,7 +159,7 @@ class ProjectFile:
             picIdx = random.randint(0, imgCount - 1)
             pic = pics[picIdx]
             if os.path.exists(pic.GetFilename()):
-                img = PILBackend.GetThumbnail(pic, width=136, height=70)
+                img = PictureCache().GetThumbnail(pic, width=136, height=70)
                 if pic.IsDummy():
                     img = None
         return img
@@ -163,35 +178,50 @@ class ProjectFile:
             self.__Close()
 
 # save methods
-    def __PicToQuery(self, pic, includePics):
-        if includePics:
-            fd = open(pic.GetFilename(), 'rb')
-            picData = fd.read()
-            fd.close()
-        else:
-            picData = None
+    def __PicToValues(self, pic):
+        return (pic.GetFilename(), pic.GetWidth(), pic.GetHeight(),
+                pic.GetStartRect()[0], pic.GetStartRect()[1], pic.GetStartRect()[2], pic.GetStartRect()[3],
+                pic.GetTargetRect()[0], pic.GetTargetRect()[1], pic.GetTargetRect()[2], pic.GetTargetRect()[3],
+                pic.GetRotation(), pic.GetDuration(), pic.GetMovement(),
+                pic.GetComment(), pic.GetEffect(),
+                pic.GetTransition(), pic.GetTransitionDuration(rawValue=True))
+
+    def __PicToQuery(self, pic, picId=None):
+        columns = PICTURE_COLUMNS
+        values = self.__PicToValues(pic)
+        if picId is not None:
+            columns = ("picture_id",) + columns
+            values = (picId,) + values
 
         query = "INSERT INTO `picture` (" \
-                    "filename, width, height, " \
-                    "start_left, start_top, start_width, start_height, " \
-                    "target_left, target_top, target_width, target_height, " \
-                    "rotation, duration, movement, comment, effect, " \
-                    "transition, transition_duration, data" \
+                    "%s" \
                 ") VALUES (" \
-                    "?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?" \
-                ");"
-
-        values = (pic.GetFilename(), pic.GetWidth(), pic.GetHeight(),
-                   pic.GetStartRect()[0], pic.GetStartRect()[1], pic.GetStartRect()[2], pic.GetStartRect()[3],
-                   pic.GetTargetRect()[0], pic.GetTargetRect()[1], pic.GetTargetRect()[2], pic.GetTargetRect()[3],
-                   pic.GetRotation(), pic.GetDuration(), pic.GetMovement(),
-                   pic.GetComment(), pic.GetEffect(),
-                   pic.GetTransition(), pic.GetTransitionDuration(rawValue=True),
-                   picData)
+                    "%s" \
+                ");" % (", ".join(columns), ", ".join("?" * len(columns)))
         return query, values
 
+    def __StorePicData(self, cur, picId, pic):
+        '''
+        Copies the picture file into the data column of the given row in
+        chunks, so the whole file is never held in memory.
+        '''
+        filename = pic.GetFilename()
+        if not hasattr(self.__conn, "blobopen"):
+            # incremental BLOB I/O needs Python 3.11
+            with open(filename, 'rb') as fd:
+                cur.execute("UPDATE `picture` SET data=? WHERE picture_id=?",
+                            (fd.read(), picId))
+            return
+
+        cur.execute("UPDATE `picture` SET data=zeroblob(?) "
+                    "WHERE picture_id=?", (os.path.getsize(filename), picId))
+        with open(filename, 'rb') as fd, \
+                self.__conn.blobopen("picture", "data", picId) as blob:
+            for chunk in iter(lambda: fd.read(BLOB_CHUNK_SIZE), b""):
+                blob.write(chunk)
+
     def __ThumbToQuery(self, picId, pic):
-        pilThumb = PILBackend.GetThumbnail(pic, height=120)
+        pilThumb = PictureCache().GetThumbnail(pic, height=120)
         thumbWidth, thumbHeight = pilThumb.size
         thumbData = pilThumb.tobytes()
 
@@ -203,6 +233,19 @@ class ProjectFile:
         values = (picId, thumbWidth, thumbHeight, thumbData)
         return query, values
 
+    def __GetProperties(self):
+        properties = []
+        for name, value in [('rev', SCHEMA_REV),
+                            ('aspect', self._project.GetAspect()),
+                            ('duration', self._project.GetDuration(False)),
+                            ('timelapse', int(self._project.GetTimelapse()))]:
+            if value is not None:
+                properties.append((name, value))
+
+        for audioFile in self._project.GetAudioFiles():
+            properties.append(('audiofile', audioFile))
+        return properties
+
     def _StepProgress(self, msg):
         pass
 
@@ -210,6 +253,38 @@ class ProjectFile:
         dirname = os.path.dirname(self._filename)
         if not os.path.exists(dirname):
             os.makedirs(dirname)
+
+        if self.__CanUpdate():
+            self.__Update(includePics)
+        else:
+            self.__Create(includePics)
+
+        self._project.SetFilename(self._filename)
+
+    def __CanUpdate(self):
+        '''
+        Checks if the existing file has the current schema and can be
+        updated in place.
+        '''
+        if not os.path.isfile(self._filename):
+            return False
+
+        self.__Connect()
+        try:
+            cur = self.__GetCursor()
+            cur.execute("SELECT value FROM `property` WHERE name=?", ("rev",))
+            result = cur.fetchone()
+            if result is None or int(result[0]) != SCHEMA_REV:
+                return False
+            cur.execute("SELECT thumbnail_id FROM `thumbnail` LIMIT 1")
+            return True
+        except (sqlite3.DatabaseError, ValueError) as err:
+            logging.debug("__CanUpdate(%s): %s", self._filename, err)
+            return False
+        finally:
+            self.__Close()
+
+    def __Create(self, includePics):
         if os.path.exists(self._filename):
             os.remove(self._filename)
 
@@ -220,26 +295,208 @@ class ProjectFile:
         cur = self.__GetCursor()
         for pic in self._project.GetPictures():
             self._StepProgress(_(u"Saving '%s' ...") % pic.GetFilename())
-            query, values = self.__PicToQuery(pic, includePics)
+            query, values = self.__PicToQuery(pic)
             cur.execute(query, values)
+            picId = cur.lastrowid
+            if includePics:
+                self.__StorePicData(cur, picId, pic)
 
-            query, values = self.__ThumbToQuery(cur.lastrowid, pic)
+            query, values = self.__ThumbToQuery(picId, pic)
             cur.execute(query, values)
 
         query = "INSERT INTO `property` (name, value) VALUES (?, ?);"
-        for name, value in [('rev', SCHEMA_REV),
-                            ('aspect', self._project.GetAspect()),
-                            ('duration', self._project.GetDuration(False)),
-                            ('timelapse', int(self._project.GetTimelapse()))]:
-            if value is not None:
-                cur.execute(query, (name, value))
+        for name, value in self.__GetProperties():
+            cur.execute(query, (name, value))
 
-        for audioFile in self._project.GetAudioFiles():
-            cur.execute(query, ('audiofile', audioFile))
+        self.__Close(commit=True)
+
+    def __Update(self, includePics):
+        '''
+        Compares the project with the rows in the existing file and writes
+        only the differences in one transaction. Rows are matched to the
+        pictures by their filename, so inserting, removing or moving a
+        picture does not touch the rows of the other pictures. The order of
+        the rows is the order of their picture_id, see __OrderRows().
+        Picture data and thumbnails are only written again if the picture is
+        new or its rotation or effect changed.
+        '''
+        self.__Connect()
+        try:
+            cur = self.__GetCursor()
+            cur.execute("SELECT picture_id, %s, data IS NULL AS no_data "
+                        "FROM `picture` "
+                        "ORDER BY picture_id ASC" % ", ".join(PICTURE_COLUMNS))
+            rows = cur.fetchall()
+
+            cur.execute("SELECT picture_id FROM `thumbnail`")
+            thumbIds = set(row["picture_id"] for row in cur)
+
+            rowsByFile = {}
+            for row in rows:
+                rowsByFile.setdefault(row["filename"], []).append(row)
+
+            pics = self._project.GetPictures()
+            matches = []
+            for pic in pics:
+                candidates = rowsByFile.get(pic.GetFilename())
+                matches.append(candidates.pop(0) if candidates else None)
+
+            obsolete = [(row["picture_id"],)
+                        for candidates in rowsByFile.values()
+                        for row in candidates]
+            cur.executemany("DELETE FROM `thumbnail` WHERE picture_id=?",
+                            obsolete)
+            cur.executemany("DELETE FROM `picture` WHERE picture_id=?",
+                            obsolete)
+
+            picIds = self.__OrderRows(cur, [row["picture_id"] if row else None
+                                            for row in matches])
+
+            for pic, row, picId in zip(pics, matches, picIds):
+                self._StepProgress(_(u"Saving '%s' ...") % pic.GetFilename())
+                if row is None:
+                    query, values = self.__PicToQuery(pic, picId)
+                    cur.execute(query, values)
+                    if includePics:
+                        self.__StorePicData(cur, picId, pic)
+                    query, values = self.__ThumbToQuery(picId, pic)
+                    cur.execute(query, values)
+                    continue
+
+                values = self.__PicToValues(pic)
+                if tuple(row[col] for col in PICTURE_COLUMNS) != values:
+                    cur.execute("UPDATE `picture` SET %s "
+                                "WHERE picture_id=?" % ", ".join(
+                                    "%s=?" % col for col in PICTURE_COLUMNS),
+                                values + (picId,))
+
+                if includePics and row["no_data"]:
+                    self.__StorePicData(cur, picId, pic)
+                elif not includePics and not row["no_data"]:
+                    cur.execute("UPDATE `picture` SET data=NULL "
+                                "WHERE picture_id=?", (picId,))
+
+                if row["picture_id"] not in thumbIds or \
+                        row["rotation"] != pic.GetRotation() or \
+                        row["effect"] != pic.GetEffect():
+                    cur.execute("DELETE FROM `thumbnail` WHERE picture_id=?",
+                                (picId,))
+                    query, values = self.__ThumbToQuery(picId, pic)
+                    cur.execute(query, values)
+
+            properties = self.__GetProperties()
+            cur.execute("SELECT name, value "
+                        "FROM `property` "
+                        "ORDER BY property_id ASC")
+            if [tuple(row) for row in cur] != \
+                    [(name, str(value)) for name, value in properties]:
+                cur.execute("DELETE FROM `property`")
+                cur.executemany("INSERT INTO `property` (name, value) "
+                                "VALUES (?, ?);", properties)
+        except BaseException:
+            self.__Close()
+            raise
 
         self.__Close(commit=True)
 
-        self._project.SetFilename(self._filename)
+    def __OrderRows(self, cur, rowIds):
+        '''
+        Returns a picture_id for each entry of rowIds in ascending order.
+        rowIds holds the picture_id of an existing row or None for a new
+        row. The longest ascending run of existing rows keeps its ids, the
+        others get ids in the gaps between them and their rows are moved,
+        together with their thumbnail. If a gap is too small all rows get new
+        ids that are ID_STEP apart, so later inserts find a gap.
+        '''
+        kept = set(self.__LongestAscending(
+            [rowId for rowId in rowIds if rowId is not None]))
+        result = self.__FillGaps([rowId if rowId in kept else None
+                                  for rowId in rowIds])
+        if result is None:
+            base = max([0] + [rowId for rowId in rowIds if rowId is not None])
+            result = [base + ID_STEP * (idx + 1) for idx in range(len(rowIds))]
+
+        moves = [(rowId, picId) for rowId, picId in zip(rowIds, result)
+                 if rowId is not None and rowId != picId]
+        if moves:
+            # move to temporary ids first, the new ids may still be in use
+            tempBase = max([0] + result + [rowId for rowId in rowIds
+                                           if rowId is not None])
+            temp = [(rowId, tempBase + idx + 1)
+                    for idx, (rowId, __) in enumerate(moves)]
+            for rowId, tempId in temp:
+                self.__MoveRow(cur, rowId, tempId)
+            for (__, tempId), (__, picId) in zip(temp, moves):
+                self.__MoveRow(cur, tempId, picId)
+        return result
+
+    def __MoveRow(self, cur, rowId, picId):
+        cur.execute("UPDATE `picture` SET picture_id=? WHERE picture_id=?",
+                    (picId, rowId))
+        cur.execute("UPDATE `thumbnail` SET picture_id=? WHERE picture_id=?",
+                    (picId, rowId))
+
+    @staticmethod
+    def __LongestAscending(values):
+        '''
+        Returns the longest strictly ascending subsequence of values.
+        '''
+        tails = []
+        tailIdx = []
+        prev = [None] * len(values)
+        for idx, value in enumerate(values):
+            pos = bisect.bisect_left(tails, value)
+            if pos > 0:
+                prev[idx] = tailIdx[pos - 1]
+            if pos == len(tails):
+                tails.append(value)
+                tailIdx.append(idx)
+            else:
+                tails[pos] = value
+                tailIdx[pos] = idx
+
+        result = []
+        idx = tailIdx[-1] if tailIdx else None
+        while idx is not None:
+            result.append(values[idx])
+            idx = prev[idx]
+        result.reverse()
+        return result
+
+    @staticmethod
+    def __FillGaps(ids):
+        '''
+        Replaces the None entries of the ascending ids by ids between their
+        neighbours. Returns None if there is no room.
+        '''
+        result = list(ids)
+        idx = 0
+        while idx < len(result):
+            if result[idx] is not None:
+                idx += 1
+                continue
+            end = idx
+            while end < len(result) and result[end] is None:
+                end += 1
+            count = end - idx
+            low = result[idx - 1] if idx > 0 else None
+            high = result[end] if end < len(result) else None
+            if low is None and high is None:
+                low = 0
+                step = ID_STEP
+            elif low is None:
+                step = ID_STEP
+                low = high - step * (count + 1)
+            elif high is None:
+                step = ID_STEP
+            else:
+                step = (high - low) // (count + 1)
+                if step < 1:
+                    return None
+            for offset in range(count):
+                result[idx + offset] = low + step * (offset + 1)
+            idx = end
+        return result
 
 # load methods
     def _SelectAlternatePath(self, imgPath):
@@ -264,19 +521,29 @@ class ProjectFile:
             pass
 
         try:
-            cur.execute("SELECT * FROM `picture`")
+            # the picture data is not selected, it is streamed into files
+            cur.execute("PRAGMA table_info(`picture`)")
+            columns = [row["name"] for row in cur]
+            if not columns:
+                raise sqlite3.DatabaseError("no such table: picture")
+            selection = [col for col in columns if col != "data"]
+            if "data" in columns:
+                selection.append("data IS NOT NULL AS has_data")
+            cur.execute("SELECT %s FROM `picture` "
+                        "ORDER BY picture_id ASC" % ", ".join(selection))
+            rows = cur.fetchall()
         except sqlite3.DatabaseError:
             self.__Close()
             return False
 
         picList = []
-        for row in cur:
+        extractions = {}
+        for row in rows:
             imgFile = row["filename"]
             imgPath = os.path.dirname(imgFile)
             self._StepProgress(_(u"Loading '%s' ...") % (os.path.basename(imgFile)))
 
-            picData = self.__LoadSafe(row, 'data', None)
-            if picData is None:
+            if not self.__LoadSafe(row, 'has_data', False):
                 if not (os.path.exists(imgPath) and os.path.isfile(imgFile)):
                     if imgPath not in self.__altPaths:
                         self._SelectAlternatePath(imgPath)
@@ -297,9 +564,8 @@ class ProjectFile:
                 if not os.path.isdir(importPath):
                     os.makedirs(importPath)
 
-                fd = open(tmpImg, 'wb')
-                fd.write(picData)
-                fd.close()
+                # like before the last picture with the same name wins
+                extractions[tmpImg] = row["picture_id"]
                 pic = Picture(tmpImg)
 
             pic.SetWidth(self.__LoadSafe(row, 'width', -1))
@@ -317,10 +583,15 @@ class ProjectFile:
             pic.SetTransition(self.__LoadSafe(row, 'transition', Picture.TRANS_FADE))
             pic.SetTransitionDuration(self.__LoadSafe(row, 'transition_duration', 1.0))
 
-            self.__LoadThumbnail(pic, row["picture_id"])
-
             picList.append(pic)
 
+        if extractions:
+            self._StepProgress(_(u"Extracting pictures ..."))
+            self.__ExtractPictures(extractions)
+
+        for pic, row in zip(picList, rows):
+            self.__LoadThumbnail(pic, row["picture_id"])
+
         project = Project(self._filename)
         project.SetPictures(picList)
         if fileRev >= 2:
@@ -334,6 +605,37 @@ class ProjectFile:
         self._project = project
         return True
 
+    def __ExtractPictures(self, extractions):
+        '''
+        Writes the embedded pictures into their files. Every picture is
+        streamed in chunks through its own connection, several pictures are
+        extracted in parallel.
+        '''
+        workers = min(EXTRACT_WORKERS, len(extractions))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(self.__ExtractPicture, picId, imgFile)
+                       for imgFile, picId in extractions.items()]
+            for future in futures:
+                future.result()
+
+    def __ExtractPicture(self, picId, imgFile):
+        conn = sqlite3.connect(self._filename)
+        try:
+            with open(imgFile, 'wb') as fd:
+                if not hasattr(conn, "blobopen"):
+                    # incremental BLOB I/O needs Python 3.11
+                    cur = conn.execute("SELECT data FROM `picture` "
+                                       "WHERE picture_id=?", (picId,))
+                    fd.write(cur.fetchone()[0])
+                    return
+
+                with conn.blobopen("picture", "data", picId,
+                                   readonly=True) as blob:
+                    for chunk in iter(lambda: blob.read(BLOB_CHUNK_SIZE), b""):
+                        fd.write(chunk)
+        finally:
+            conn.close()
+
     def __LoadThumbnail(self, pic, picId):
         ImageCache().RegisterPicture(pic)
         return
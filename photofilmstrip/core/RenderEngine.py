@@ -5,8 +5,13 @@
 # Copyright (C) 2011 Jens Goepfert
 #
 
+import hashlib
+import itertools
+import json
 import os
 
+import numpy
+
 from photofilmstrip.core.tasks import TaskCropResize, TaskTrans, TaskSubtitle
 from photofilmstrip.core.Picture import Picture
 from photofilmstrip.core.PicturePattern import PicturePattern
@@ -19,15 +24,163 @@ class RenderEngine:
         self._profile = profile
         self._pics = pics
         self._draftMode = draftMode
+        self._quantum = None
+
+    def SetQuantum(self, quantum):
+        """
+        snaps the rects of the motion paths to a grid of the given fraction of
+        an output pixel, so that frames that would be nearly pixel identical
+        share their results. None renders the exact path.
+        """
+        self._quantum = quantum
+
+    def _ComputePath(self, pic, picCount):
+        return ComputePath(pic, picCount,
+                           self._profile.GetResolution(), self._quantum)
 
-        self._tasks = []
+    def _GeneratePrologueTasks(self, pics):  # pylint: disable=unused-argument
+        """
+        yields the tasks that are rendered before the frames of the first
+        picture, they do not produce frames
+        """
+        return iter(())
 
-    def _PrepareTasks(self, pics):
+    def _GenerateTasks(self, pics, start=0, stop=None):
+        """
+        yields the tasks for the frames of the pictures start to stop
+        """
         raise NotImplementedError()
 
+    def _GetFrameCounts(self, pics):
+        """
+        returns the number of frames of each picture, the frames of a
+        transition belong to the picture after it
+        """
+        raise NotImplementedError()
+
+    def _GetSourceScale(self, pathRects):
+        """
+        returns the factor the source picture can be downscaled with, so that
+        the smallest rect of the path still covers the output resolution.
+        None if the picture is needed in full size.
+        """
+        if len(pathRects) == 0 or (pathRects[:, 2:] <= 0).any():
+            return None
+
+        width, height = self._profile.GetResolution()
+        scale = max(numpy.max(width / pathRects[:, 2]),
+                    numpy.max(height / pathRects[:, 3]))
+        if scale >= 1.0:
+            return None
+        return float(scale)
+
+    def IterTasks(self):
+        """
+        returns a generator that creates the tasks one after another
+        """
+        yield from self._GeneratePrologueTasks(self._pics)
+        yield from self._GenerateTasks(self._pics)
+
+    def IterPrologueTasks(self):
+        return self._GeneratePrologueTasks(self._pics)
+
+    def IterSegmentTasks(self, segment):
+        """
+        returns a generator that creates the tasks for the frames of the
+        given segment only
+        """
+        start, stop = segment.GetPictureRange()
+        return self._GenerateTasks(self._pics, start, stop)
+
+    def GetTaskCount(self):
+        """
+        returns the number of tasks IterTasks() yields without creating them,
+        a task that is repeated for several frames counts for each frame
+        """
+        count = sum(task.GetRepeat()
+                    for task in self._GeneratePrologueTasks(self._pics))
+        return count + sum(self._GetFrameCounts(self._pics))
+
+    def GetSegments(self, count=None):
+        """
+        splits the frames at picture boundaries into at most count segments
+        with about the same number of frames or into one segment for each
+        picture if count is None. Segments without frames are left out.
+        """
+        frameCounts = self._GetFrameCounts(self._pics)
+        total = sum(frameCounts)
+        if count is None:
+            count = max(1, total)
+
+        segments = []
+        start = 0
+        frames = 0
+        cumFrames = 0
+        for idx, frameCount in enumerate(frameCounts):
+            frames += frameCount
+            cumFrames += frameCount
+            if cumFrames * count >= total * (len(segments) + 1) \
+                    or idx == len(frameCounts) - 1:
+                if frames > 0:
+                    fingerprint = self.__GetSegmentFingerprint(
+                        start, idx + 1, len(frameCounts), frames)
+                    segments.append(RenderSegment(len(segments),
+                                                  start, idx + 1, frames,
+                                                  fingerprint))
+                start = idx + 1
+                frames = 0
+        return segments
+
     def GetTasks(self):
-        self._PrepareTasks(self._pics)
-        return self._tasks
+        return list(self.IterTasks())
+
+    def _GetFingerprintValues(self):
+        """
+        returns the values besides profile and pictures the frames depend on
+        """
+        return []
+
+    @staticmethod
+    def _GetPictureFingerprint(pic):
+        """
+        returns the identity of the picture file and all attributes that
+        change the frames of the picture, the comment is rendered into the
+        subtitle file only
+        """
+        try:
+            stat = os.stat(pic.GetFilename())
+            fileId = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            fileId = None
+        return [pic.GetFilename(), fileId,
+                pic.GetRotation(), pic.GetEffect(),
+                list(pic.GetStartRect()), list(pic.GetTargetRect()),
+                pic.GetDuration(), pic.GetMovement(),
+                pic.GetTransition(), pic.GetTransitionDuration()]
+
+    def _GetSegmentPictures(self, pics, start, stop):
+        """
+        returns the pictures the frames of the pictures start to stop
+        depend on
+        """
+        raise NotImplementedError()
+
+    def __GetSegmentFingerprint(self, start, stop, count, frameCount):
+        """
+        returns a hash of everything the frames of the pictures start to
+        stop depend on, but not of their position in the slide show. So
+        segments with the same fingerprint have the same frames, even if
+        pictures were inserted or removed before them.
+        """
+        frameRate = self._profile.GetFrameRate()
+        pics = self._GetSegmentPictures(self._pics, start, stop)
+        values = [self.__class__.__name__,
+                  list(self._profile.GetResolution()), frameRate.AsStr(),
+                  self._draftMode, self._quantum,
+                  self._GetFingerprintValues(),
+                  start > 0, stop == count, frameCount,
+                  [self._GetPictureFingerprint(pic) for pic in pics]]
+        return hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest()
 
 
 class RenderEngineSlideshow(RenderEngine):
@@ -37,6 +190,13 @@ class RenderEngineSlideshow(RenderEngine):
         self.__targetLengthSecs = totalLength
         self.__picCountFactor = None
 
+    def _GetFingerprintValues(self):
+        return [self.__GetPicCountFactor(self._pics)]
+
+    def _GetSegmentPictures(self, pics, start, stop):
+        # the transition into the first picture depends on the one before
+        return pics[max(0, start - 1):stop]
+
     def __GetPicCountFactor(self, pics):
         if self.__targetLengthSecs is None:
             result = 1.0
@@ -70,43 +230,75 @@ class RenderEngineSlideshow(RenderEngine):
                          fr * \
                          self.__picCountFactor))
 
-    def __TransAndFinal(self, infoText, trans,
-                        picFrom, picTo,
-                        pathRectsFrom, pathRectsTo):
+    def __IterTransTasks(self, infoText, trans,
+                         picFrom, picTo,
+                         pathRectsFrom, pathRectsTo,
+                         scaleFrom, scaleTo):
         if len(pathRectsFrom) != len(pathRectsTo):
             raise RuntimeError()
 
         count = len(pathRectsFrom)
+        rectsFrom = pathRectsFrom.tolist()
+        rectsTo = pathRectsTo.tolist()
         for idx in range(count):
             task = TaskTrans(trans, idx / count,
-                             picFrom.Copy(), pathRectsFrom[idx],
-                             picTo.Copy(), pathRectsTo[idx],
-                             self._profile.GetResolution())
+                             picFrom.Copy(), tuple(rectsFrom[idx]),
+                             picTo.Copy(), tuple(rectsTo[idx]),
+                             self._profile.GetResolution(),
+                             scaleFrom, scaleTo)
             task.SetInfo(infoText)
             task.SetDraft(self._draftMode)
-            self._tasks.append(task)
+            yield task
+
+    def _GetFrameCounts(self, pics):
+        self.__picCountFactor = self.__GetPicCountFactor(pics)
 
-        return True
+        frameCounts = []
+        transCountBefore = 0
+        for idxPic, pic in enumerate(pics):
+            frameCounts.append(transCountBefore + self.__GetPicCount(pic))
+            if idxPic < (len(pics) - 1):
+                transCountBefore = self.__GetTransCount(pic)
+        return frameCounts
 
-    def _PrepareTasks(self, pics):
+    def _GeneratePrologueTasks(self, pics):
         self.__picCountFactor = self.__GetPicCountFactor(pics)
 
         taskSub = TaskSubtitle(self.__picCountFactor, pics)
-        self._tasks.append(taskSub)
+        yield taskSub
 
-        pathRectsBefore = []
+    def _GenerateTasks(self, pics, start=0, stop=None):
+        self.__picCountFactor = self.__GetPicCountFactor(pics)
+        if stop is None:
+            stop = len(pics)
+
+        pathRectsBefore = None
         picBefore = None
+        scaleBefore = None
         transCountBefore = 0
+        if start > 1:
+            transCountBefore = self.__GetTransCount(pics[start - 2])
 
-        for idxPic, pic in enumerate(pics):
+        # the transition into the first picture needs the path of the
+        # picture before it
+        for idxPic in range(max(0, start - 1), stop):
+            pic = pics[idxPic]
             picCount = self.__GetPicCount(pic)
             transCount = 0
             if idxPic < (len(pics) - 1):
                 # last pic has no transition
                 transCount = self.__GetTransCount(pic)
 
-            cp = ComputePath(pic, picCount + transCount + transCountBefore)
+            cp = self._ComputePath(pic, picCount + transCount + transCountBefore)
             pathRects = cp.GetPathRects()
+            scale = self._GetSourceScale(pathRects)
+
+            if idxPic < start:
+                picBefore = pic
+                scaleBefore = scale
+                pathRectsBefore = pathRects
+                transCountBefore = transCount
+                continue
 
             if idxPic > 0 and idxPic < len(pics):
                 # first and last pic has no transition
@@ -115,11 +307,11 @@ class RenderEngineSlideshow(RenderEngine):
                 if transCountBefore > 0:
                     phase2a = pathRectsBefore[-transCountBefore:]
                     phase2b = pathRects[:transCountBefore]
-                    if not self.__TransAndFinal(infoText,
-                                                pics[idxPic - 1].GetTransition(),
-                                                picBefore, pic,
-                                                phase2a, phase2b):
-                        break
+                    yield from self.__IterTransTasks(infoText,
+                                                     pics[idxPic - 1].GetTransition(),
+                                                     picBefore, pic,
+                                                     phase2a, phase2b,
+                                                     scaleBefore, scale)
 
             infoText = _(u"processing image %d/%d") % (idxPic + 1, len(pics))
 
@@ -130,25 +322,29 @@ class RenderEngineSlideshow(RenderEngine):
                 # transition needs no pictures, use them all for movement
                 _pathRects = pathRects[transCountBefore:]
 
-            for rect in _pathRects:
-                task = TaskCropResize(pic.Copy(), rect,
-                                      self._profile.GetResolution())
+            # frames without movement are rendered only once
+            for rect, frames in itertools.groupby(_pathRects.tolist()):
+                task = TaskCropResize(pic.Copy(), tuple(rect),
+                                      self._profile.GetResolution(),
+                                      scale)
                 task.SetInfo(infoText)
                 task.SetDraft(self._draftMode)
-                self._tasks.append(task)
+                task.SetRepeat(len(list(frames)))
+                yield task
 
             picBefore = pic
+            scaleBefore = scale
             pathRectsBefore = pathRects
             transCountBefore = transCount
 
 
 class RenderEngineTimelapse(RenderEngine):
 
-    def _PrepareTasks(self, pics):
-        picBefore = None
-
-        picNum = None
-
+    def __IterPictures(self, pics):
+        """
+        yields the index of each picture, the picture with its number pattern
+        and the number of frames that are rendered for it
+        """
         idxPic = 0
         while idxPic < len(pics) - 1:
             pic = pics[idxPic]
@@ -159,7 +355,6 @@ class RenderEngineTimelapse(RenderEngine):
                      u"which is necessary for a time lapse "
                      u"slide show!") % pic.GetFilename())
 
-            picNum = picPattern.num
             picDur = int(pic.GetDuration())
             transDur = int(pic.GetTransitionDuration())
 
@@ -170,7 +365,7 @@ class RenderEngineTimelapse(RenderEngine):
                 idxPic += 1
                 continue
 
-            picCount = nextPicPattern.num - picNum
+            picCount = nextPicPattern.num - picPattern.num
             if picCount < 0:
                 raise RenderException(
                     (u"The picture counter is not "
@@ -178,11 +373,40 @@ class RenderEngineTimelapse(RenderEngine):
 
             if idxPic + 1 == len(pics) - 1:
                 # next pic is the last one so incluse the last pic
-                cp = ComputePath(pic, (picDur * (picCount + 1)) + (transDur * picCount))
+                frameCount = (picDur * (picCount + 1)) + (transDur * picCount)
             else:
-                cp = ComputePath(pic, (picDur + transDur) * picCount)
+                frameCount = (picDur + transDur) * picCount
+
+            yield idxPic, pic, picPattern, frameCount
+            idxPic += 1
+
+    def _GetFrameCounts(self, pics):
+        return [frameCount
+                for __, __, __, frameCount in self.__IterPictures(pics)]
+
+    def _GetSegmentPictures(self, pics, start, stop):
+        # the numbered files between the pictures are not identified, the
+        # next picture defines the number of frames
+        result = []
+        for idxPic, __, __, __ in itertools.islice(self.__IterPictures(pics),
+                                                   start, stop):
+            result.extend(pics[idxPic:idxPic + 2])
+        return result
+
+    def _GenerateTasks(self, pics, start=0, stop=None):
+        # each picture starts without a picture before it, so a range of
+        # pictures can be generated on its own
+        for __, pic, picPattern, frameCount in itertools.islice(
+                self.__IterPictures(pics), start, stop):
+            picNum = picPattern.num
+            picDur = int(pic.GetDuration())
+            transDur = int(pic.GetTransitionDuration())
+
+            cp = self._ComputePath(pic, frameCount)
             pathRects = cp.GetPathRects()
+            scale = self._GetSourceScale(pathRects)
             picDir = os.path.dirname(pic.GetFilename())
+            picBefore = None
             idxRect = 0
             while idxRect < len(pathRects):
                 picCopy = pic.Copy()
@@ -194,34 +418,74 @@ class RenderEngineTimelapse(RenderEngine):
 
                 if transDur > 0 and picBefore:
                     for idxTrans in range(transDur):
+                        rect = tuple(pathRects[idxRect].tolist())
                         task = TaskTrans(pic.GetTransition(), (idxTrans + 1) / (transDur + 1),
-                                         picBefore.Copy(), pathRects[idxRect],
-                                         picCopy.Copy(), pathRects[idxRect],
-                                         self._profile.GetResolution())
+                                         picBefore.Copy(), rect,
+                                         picCopy.Copy(), rect,
+                                         self._profile.GetResolution(),
+                                         scale, scale)
                         task.SetInfo(_(u"processing transition %d/%d") % (picNum, idxTrans + 1))
                         task.SetDraft(self._draftMode)
-                        self._tasks.append(task)
+                        yield task
                         idxRect += 1
 
                 if idxRect < len(pathRects):
-                    for __ in range(picDur):
-                        task = TaskCropResize(picCopy.Copy(), pathRects[idxRect],
-                                              self._profile.GetResolution())
-                        task.SetInfo(_(u"processing image %d/%d") % (picNum, __ + 1))
+                    # frames without movement are rendered only once
+                    idxFrame = 0
+                    for rect, frames in itertools.groupby(
+                            pathRects[idxRect:idxRect + picDur].tolist()):
+                        repeat = len(list(frames))
+                        task = TaskCropResize(picCopy.Copy(), tuple(rect),
+                                              self._profile.GetResolution(),
+                                              scale)
+                        task.SetInfo(_(u"processing image %d/%d") % (picNum, idxFrame + 1))
                         task.SetDraft(self._draftMode)
-                        self._tasks.append(task)
-                        idxRect += 1
+                        task.SetRepeat(repeat)
+                        yield task
+                        idxFrame += repeat
+                    idxRect += picDur
 
                 picNum += 1
                 picBefore = picCopy
 
-            picBefore = None
-            idxPic += 1
+
+class RenderSegment:
+    """
+    a range of consecutive pictures, the number of frames rendered for
+    them and a fingerprint of the frames, see RenderEngine.GetSegments()
+    """
+
+    def __init__(self, idx, start, stop, frameCount, fingerprint=None):
+        self.__idx = idx
+        self.__start = start
+        self.__stop = stop
+        self.__frameCount = frameCount
+        self.__fingerprint = fingerprint
+
+    def __repr__(self):
+        return "RenderSegment(%s, %s, %s, %s)" % (self.__idx, self.__start,
+                                                  self.__stop,
+                                                  self.__frameCount)
+
+    def GetIndex(self):
+        return self.__idx
+
+    def GetPictureRange(self):
+        return self.__start, self.__stop
+
+    def GetFrameCount(self):
+        return self.__frameCount
+
+    def GetFingerprint(self):
+        """
+        returns a hash of everything the frames of the segment depend on
+        """
+        return self.__fingerprint
 
 
 class ComputePath:
 
-    def __init__(self, pic, picCount):
+    def __init__(self, pic, picCount, resolution=None, quantum=None):
         px1, py1 = pic.GetStartRect()[:2]
         w1, h1 = pic.GetStartRect()[2:]
 
@@ -245,22 +509,42 @@ class ComputePath:
         mW = clazz(w2 - w1, picCount, w1)
         mH = clazz(h2 - h1, picCount, h1)
 
-        pathRects = []
-        for step in range(picCount):
-            px = mX.Get(step)
-            py = mY.Get(step)
-            width = mW.Get(step)
-            height = mH.Get(step)
+        # evaluate all steps at once, each row is (left, top, width, height)
+        steps = numpy.arange(picCount, dtype=numpy.float64)
+        px = mX.GetArray(steps)
+        py = mY.GetArray(steps)
+        width = mW.GetArray(steps)
+        height = mH.GetArray(steps)
+
+        self.pathRects = numpy.column_stack((px - width / 2.0,
+                                             py - height / 2.0,
+                                             width,
+                                             height))
 
-            rect = (px - width / 2.0,
-                    py - height / 2.0,
-                    width,
-                    height)
+        if resolution is not None and quantum and picCount > 0:
+            self.__Quantize(resolution[0], quantum)
 
-            pathRects.append(rect)
-        self.pathRects = pathRects
+    def __Quantize(self, outWidth, quantum):
+        """
+        snaps left, top and width to a grid of quantum output pixels. The
+        grid is measured at the smallest rect of the path, so no rect moves
+        by more than half a quantum in the output. The height is scaled
+        with the width before it is snapped to the same grid, so each rect
+        keeps its own aspect within half a quantum.
+        """
+        minWidth = numpy.min(self.pathRects[:, 2])
+        if minWidth <= 0:
+            return
+        step = quantum * minWidth / outWidth
+        quantized = numpy.round(self.pathRects[:, :3] / step) * step
+        height = self.pathRects[:, 3] * quantized[:, 2] / self.pathRects[:, 2]
+        self.pathRects[:, :3] = quantized
+        self.pathRects[:, 3] = numpy.round(height / step) * step
 
     def GetPathRects(self):
+        """
+        returns a numpy array of shape (picCount, 4)
+        """
         return self.pathRects
 
 
@@ -281,6 +565,9 @@ class LinearMovement:
         t = float(t)
         return self._v * t + self._s0
 
+    def GetArray(self, steps):
+        return self._v * steps + self._s0
+
 
 class AccelMovement:
 
@@ -304,6 +591,9 @@ class AccelMovement:
     def Get(self, t):
         return self._a * t ** 3 + self._b * t ** 2 + self._c * t + self._d
 
+    def GetArray(self, steps):
+        return ((self._a * steps + self._b) * steps + self._c) * steps + self._d
+
 
 class DelayedMovement(AccelMovement):
 
@@ -319,3 +609,13 @@ class DelayedMovement(AccelMovement):
             self._sAccel = AccelMovement.Get(self, t - self._t4th)
         return self._sAccel
 
+    def GetArray(self, steps):
+        result = numpy.full(len(steps), self._s0)
+        accel = (steps >= self._t4th) & (steps < (self._t * 2) - self._t4th)
+        result[accel] = AccelMovement.GetArray(self, steps[accel] - self._t4th)
+
+        # after the accelerated part the last position is held
+        hold = steps >= (self._t * 2) - self._t4th
+        if accel.any():
+            result[hold] = result[accel][-1]
+        return result
@@ -5,31 +5,80 @@
 # Copyright (C) 2017 Jens Goepfert
 #
 
+import collections
+import functools
 import logging
 import threading
 
+from PIL import Image
+
 from photofilmstrip.ux.Ux import Ux
+from photofilmstrip.core.ImageSourceCache import ImageSourceCache
+from photofilmstrip.core.PILBackend import SourceImage
+from photofilmstrip.core.exceptions import RendererException
+from photofilmstrip.core.tasks import TaskImaging, TaskLoadPic
+from photofilmstrip.lib.jobimpl.JobManager import JobManager
+from photofilmstrip.lib.jobimpl.ProcessPool import SharedBuffer
 from photofilmstrip.lib.jobimpl.VisualJob import VisualJob
 from photofilmstrip.lib.jobimpl.Worker import JobAbortedException
 from photofilmstrip.lib.jobimpl.WorkLoad import WorkLoad
 
 
 class RenderJob(VisualJob, Ux):
+    '''
+    Renders the given tasks into the renderer. tasks may be any iterable, e.g.
+    the generator of RenderEngine.IterTasks(). Tasks are taken from it lazily
+    and only a window of them is queued at a time, so the job does not hold
+    all tasks of the whole slide show in memory, as long as the number of
+    tasks is given with taskCount. A task that is repeated for several frames
+    counts for each frame.
+    Workers are not allowed to get more than reorderWindow frames ahead of
+    the frame the renderer waits for, which bounds the number of finished
+    frames held back until they can be passed to the renderer in order.
+    '''
 
-    def __init__(self, name, renderer, tasks):
+    TASK_WINDOW = 64
+    REORDER_WINDOW = 32
+
+    def __init__(self, name, renderer, tasks, imageCacheBytes=None,
+                 taskCount=None, reorderWindow=None):
         VisualJob.__init__(self, name, groupId="render")
         Ux.__init__(self)
         self.renderer = renderer
-        self.tasks = tasks
 
-        self.SetMaxProgress(len(tasks))
+        if taskCount is None:
+            tasks = list(tasks)
+            taskCount = sum(task.GetRepeat() for task in tasks)
+        self.tasks = iter(tasks)
+        self.taskCount = taskCount
+        # index of the next task taken from the iterator
+        self.taskIdx = 0
+        # number of queued workloads not yet fetched by a worker
+        self.pendingWorkLoads = 0
+
+        self.SetMaxProgress(taskCount)
+
+        if reorderWindow is None:
+            reorderWindow = RenderJob.REORDER_WINDOW
+        self.reorderWindow = max(1, reorderWindow)
+        # index of the next task handed out to a worker
+        self.dispatchIdx = 0
+        self.peakReorderDepth = 0
+        self.reorderWaits = 0
 
         self.resultsForRendererLock = threading.Lock()
+        self.resultsForRendererCond = threading.Condition(self.resultsForRendererLock)
         self.resultForRendererIdx = 0
         self.resultsForRendererCache = {}
 
+        # decoded pictures of TaskLoadPic, shared by all frames
+        self.imageCache = ImageSourceCache(imageCacheBytes)
         self.taskResultCache = {}
+        self.taskResultCacheLock = threading.Lock()
+        self.taskResultRequests = 0
+        self.taskResultHits = 0
         self.finalizeHandler = self.renderer.GetFinalizeHandler()
+        self.processPool = None
 
         self.__logger = logging.getLogger("RenderJob")
 
@@ -39,28 +88,89 @@ class RenderJob(VisualJob, Ux):
     def Done(self):
         if self.IsAborted():
             self.renderer.ProcessAbort()
-        self.renderer.Finalize()
+        try:
+            self.renderer.Finalize()
+        except RendererException as exc:
+            # the output file is missing or incomplete, report it like a
+            # failed task
+            self.__logger.error("%s: finalizing failed: %s",
+                                self.GetName(), exc.GetMessage())
+            self.Abort("Error: %s" % exc.GetMessage())
 
         self.__logger.debug("task cache: %s; result cache: %s",
                            len(self.taskResultCache),
                            len(self.resultsForRendererCache))
+        self.__logger.debug("image cache: %s", self.imageCache.GetStatistics())
+        self.__logger.debug("render job: %s", self.GetStatistics())
+        self.__logger.debug("renderer: %s", self.renderer.GetStatistics())
+        self.imageCache.Clear()
+
+    def GetStatistics(self):
+        with self.taskResultCacheLock:
+            hitRate = 0.0
+            if self.taskResultRequests:
+                hitRate = self.taskResultHits / self.taskResultRequests
+            stats = {"resultRequests": self.taskResultRequests,
+                     "resultHits": self.taskResultHits,
+                     "resultHitRate": hitRate}
+        with self.resultsForRendererLock:
+            stats.update({"frames": self.taskCount,
+                          "tasks": self.taskIdx,
+                          "reorderWindow": self.reorderWindow,
+                          "peakReorderDepth": self.peakReorderDepth,
+                          "reorderWaits": self.reorderWaits})
+        return stats
 
     def Begin(self):
+        self.processPool = JobManager().GetProcessPool(self.GetGroupId())
+        if self.processPool is not None \
+                and not self.finalizeHandler.IsProcessable():
+            self.__logger.debug("%s: finalize handler not processable, "
+                                "rendering in threads", self.GetName())
+            self.processPool = None
+
         # prepare task queue
         self.__logger.debug("%s: prepare task queue", self.GetName())
-        for idx, task in enumerate(self.tasks):
+        self.__FillTaskQueue()
+
+        # prepare the renderer, creates the sink pipe
+        self.renderer.Prepare()
+
+    def __FillTaskQueue(self):
+        '''
+        Takes tasks from the iterator until the window of queued tasks is
+        full. Tasks are registered in the result cache at this point, so
+        results are only shared between tasks within that window.
+        '''
+        if self.IsAborted():
+            return
+
+        while self.pendingWorkLoads < RenderJob.TASK_WINDOW:
+            try:
+                task = next(self.tasks)
+            except StopIteration:
+                break
+            except Exception as exc:
+                self.__logger.error("%s: creating tasks failed",
+                                    self.GetName(), exc_info=1)
+                self.Abort("Error: %s" % exc)
+                break
+
             for subTask in task.IterSubTasks():
                 self._RegisterTaskResult(subTask, True)
 
             self._RegisterTaskResult(task, False)
 
-            prt = RendererResultTask(idx, task)
+            prt = RendererResultTask(self.taskIdx, task)
             self.AddWorkLoad(prt)
-
-        # prepare the renderer, creates the sink pipe
-        self.renderer.Prepare()
+            self.taskIdx += 1
+            self.pendingWorkLoads += 1
 
     def _RegisterTaskResult(self, task, isSubTask):
+        if isinstance(task, TaskLoadPic):
+            # loaded pictures are held by the image cache
+            return False
+
         if isSubTask:
             # no finalize for subtasks
             finalizeHandler = None
@@ -69,19 +179,29 @@ class RenderJob(VisualJob, Ux):
         # make sure that a real sub task is not processed from FinalizeHandler
         # so generate a special key for subtasks
         key = "{0}{1}".format(task.GetKey(), isSubTask)
-        if key in self.taskResultCache:
-            trce = self.taskResultCache[key]
-            isNew = False
-        else:
-            trce = TaskResultCacheEntry(task, self, finalizeHandler)
-            self.taskResultCache[key] = trce
-            isNew = True
-
-        trce.refCount += 1
+        with self.taskResultCacheLock:
+            if key in self.taskResultCache:
+                trce = self.taskResultCache[key]
+                isNew = False
+            else:
+                trce = TaskResultCacheEntry(task, self, finalizeHandler)
+                self.taskResultCache[key] = trce
+                isNew = True
+
+            trce.refCount += 1
+            self.taskResultRequests += 1
+            if not isNew:
+                self.taskResultHits += 1
         return isNew
 
     def GetWorkLoad(self):
+        # called by the JobManager with the lock of the context group held,
+        # so only one worker at a time fills the queue
+        self.__FillTaskQueue()
+        self.__WaitForReorderWindow()
         task = VisualJob.GetWorkLoad(self)
+        self.pendingWorkLoads -= 1
+        self.dispatchIdx += 1
         self.SetInfo(task.GetInfo())
 
         self.__logger.debug("%s: %s: %s - start",
@@ -90,6 +210,21 @@ class RenderJob(VisualJob, Ux):
 
         return task
 
+    def __WaitForReorderWindow(self):
+        '''
+        Blocks while the next task is too far ahead of the frame the renderer
+        waits for. The worker that processes that frame releases the block in
+        PushResult().
+        '''
+        with self.resultsForRendererCond:
+            if self.dispatchIdx < self.resultForRendererIdx + self.reorderWindow:
+                return
+
+            self.reorderWaits += 1
+            while self.pendingWorkLoads > 0 and not self.IsAborted() and \
+                    self.dispatchIdx >= self.resultForRendererIdx + self.reorderWindow:
+                self.resultsForRendererCond.wait(0.5)
+
     def PushResult(self, resultObject):
         '''
         overrides IJobContext.PushResult
@@ -99,12 +234,20 @@ class RenderJob(VisualJob, Ux):
                             threading.current_thread().getName(),
                             self.GetName(), task.GetKey())
 
-        try:
-            result = resultObject.GetResult()
-            self.resultsForRendererCache[task.idx] = result
-        except JobAbortedException:
-            pass
-        with self.resultsForRendererLock:
+        with self.resultsForRendererCond:
+            try:
+                self.resultsForRendererCache[task.idx] = \
+                    (resultObject.GetResult(), task.GetRepeat())
+            except JobAbortedException:
+                pass
+            except Exception as exc:
+                # following frames cannot be passed to the renderer without
+                # this one, stop the job instead of blocking the workers
+                self.__logger.error("%s: task %s failed",
+                                    self.GetName(), task.GetKey())
+                self.Abort("Error: %s" % exc)
+            self.peakReorderDepth = max(self.peakReorderDepth,
+                                        len(self.resultsForRendererCache))
             while self.resultForRendererIdx in self.resultsForRendererCache:
                 idx = self.resultForRendererIdx
 
@@ -112,29 +255,82 @@ class RenderJob(VisualJob, Ux):
                                     threading.current_thread().getName(),
                                     self.GetName(), idx)
 
-                imgData = self.resultsForRendererCache[idx]
+                imgData, repeat = self.resultsForRendererCache[idx]
                 if imgData:
-                    self.renderer.ToSink(imgData)
+                    if repeat > 1:
+                        self.renderer.ToSinkRepeated(imgData, repeat)
+                    else:
+                        self.renderer.ToSink(imgData)
                 del self.resultsForRendererCache[idx]
                 self.resultForRendererIdx += 1
 
-                self.StepProgress()
+                self.StepProgress(progress=repeat)
+
+            self.resultsForRendererCond.notify_all()
+
+    def RunTask(self, task, finalizeHandler):
+        '''
+        Runs the task and applies the finalize handler. If a process pool is
+        available imaging tasks are executed completely within a worker
+        process, the results of their sub tasks are not needed anymore then.
+        The pictures are still decoded once by this process and held in the
+        image cache, the worker processes read them from shared memory.
+        '''
+        if self.processPool is not None \
+                and finalizeHandler is not None \
+                and isinstance(task, TaskImaging):
+            sources = {}
+            for subTask in task.IterSubTasks():
+                if isinstance(subTask, TaskLoadPic):
+                    sources[subTask.GetKey()] = self.imageCache.Get(
+                        subTask.GetKey(),
+                        functools.partial(self.__LoadSharedSource, subTask))
+            result = self.processPool.Execute(_RunTaskInProcess,
+                                              task, finalizeHandler, sources)
+            for subTask in task.IterSubTasks():
+                self._ReleaseTaskResult(subTask, True)
+            return result
+
+        result = task.Run(self)
+        if finalizeHandler and result:
+            result = finalizeHandler.ProcessFinalize(result)
+        return result
+
+    def __LoadSharedSource(self, task):
+        return _SharedSourceImage(task.Run(self))
 
     def ProcessSubTask(self, task, isSubTask=True):
+        if isinstance(task, TaskLoadPic):
+            return self.imageCache.Get(task.GetKey(),
+                                       lambda: task.Run(self))
+
         key = "{0}{1}".format(task.GetKey(), isSubTask)
-        trce = self.taskResultCache[key]
+        with self.taskResultCacheLock:
+            trce = self.taskResultCache[key]
         result = trce.GetResult()
-        if trce.refCount == 0:
+        self._ReleaseTaskResult(task, isSubTask)
+        return result
+
+    def _ReleaseTaskResult(self, task, isSubTask):
+        if isinstance(task, TaskLoadPic):
+            return
+
+        key = "{0}{1}".format(task.GetKey(), isSubTask)
+        with self.taskResultCacheLock:
+            trce = self.taskResultCache[key]
+            trce.refCount -= 1
+            refCount = trce.refCount
+            if refCount == 0:
+                del self.taskResultCache[key]
+
+        if refCount == 0:
             self.__logger.debug("%s: %s: clear cached result %s",
                                 threading.current_thread().getName(),
                                 self.GetName(), key)
-            del self.taskResultCache[key]
         else:
             self.__logger.debug("%s: %s: result ref count %s %s",
                                 threading.current_thread().getName(),
-                                self.GetName(), trce.refCount, key)
-
-        return result
+                                self.GetName(), refCount, key)
 
 
 class RendererResultTask(WorkLoad):
@@ -159,6 +355,9 @@ class RendererResultTask(WorkLoad):
     def GetInfo(self):
         return self.task.GetInfo()
 
+    def GetRepeat(self):
+        return self.task.GetRepeat()
+
 
 class TaskResultCacheEntry:
 
@@ -179,8 +378,96 @@ class TaskResultCacheEntry:
     def GetResult(self):
         with self.lock:
             if self.result is TaskResultCacheEntry.NO_RESULT:
-                self.result = self.task.Run(self.renderJob)
-                if self.finalizeHandler and self.result:
-                    self.result = self.finalizeHandler.ProcessFinalize(self.result)
-            self.refCount -= 1
+                self.result = self.renderJob.RunTask(self.task,
+                                                     self.finalizeHandler)
             return self.result
+
+
+class _SharedSourceImage(SourceImage):
+    '''
+    A decoded picture in shared memory as RGBX, so the worker processes of
+    the ProcessPool can use it without decoding it again. The memory is
+    released when the image cache of the RenderJob evicts the picture.
+    '''
+
+    def __init__(self, sourceImage):
+        SourceImage.__init__(self, None, sourceImage.GetMatrix())
+        pilImg = sourceImage.GetImage()
+        self.__size = pilImg.size
+        self.__buffer = SharedBuffer(pilImg.tobytes("raw", "RGBX"))
+
+    def GetBytes(self):
+        return self.__size[0] * self.__size[1] * 4
+
+    def Attach(self):
+        '''
+        Maps the picture within a worker process without copying it. Returns
+        the SharedMemory, which must be closed after the image is released,
+        and the SourceImage.
+        '''
+        shm = self.__buffer.Attach()
+        pilImg = Image.frombuffer("RGBX", self.__size, shm.buf,
+                                  "raw", "RGBX", 0, 1)
+        return shm, SourceImage(pilImg, self.GetMatrix())
+
+
+class _ProcessJobContext:
+    '''
+    Replaces the RenderJob as job context for tasks that are executed in a
+    worker process. Sub tasks are computed directly, the pictures are mapped
+    from the shared memory of the RenderJob. The most recently used
+    MAX_PICTURES pictures stay mapped because following frames mostly use
+    them again. A mapped picture is not a copy, but a picture that the
+    RenderJob has evicted stays in memory until the last process unmaps it.
+    So in addition to the budget of the image cache at most MAX_PICTURES
+    pictures per process are held.
+    '''
+
+    MAX_PICTURES = 2
+
+    def __init__(self):
+        self.pictures = collections.OrderedDict()
+        self.sources = {}
+
+    def SetSources(self, sources):
+        self.sources = sources
+
+    def ProcessSubTask(self, task, isSubTask=True):  # pylint: disable=unused-argument
+        if not isinstance(task, TaskLoadPic):
+            return task.Run(self)
+
+        key = task.GetKey()
+        if key in self.pictures:
+            self.pictures.move_to_end(key)
+        else:
+            self.pictures[key] = self.sources[key].Attach()
+            while len(self.pictures) > _ProcessJobContext.MAX_PICTURES:
+                shm, sourceImage = self.pictures.popitem(last=False)[1]
+                del sourceImage
+                try:
+                    shm.close()
+                except BufferError:
+                    # still referenced, unmapped when garbage collected
+                    pass
+        return self.pictures[key][1]
+
+
+_processJobContext = None
+
+
+def _RunTaskInProcess(task, finalizeHandler, sources):
+    '''
+    Entry point within a worker process of the ProcessPool.
+    '''
+    global _processJobContext  # pylint: disable=global-statement
+    if _processJobContext is None:
+        _processJobContext = _ProcessJobContext()
+
+    _processJobContext.SetSources(sources)
+    try:
+        result = task.Run(_processJobContext)
+    finally:
+        _processJobContext.SetSources({})
+    if result:
+        result = finalizeHandler.ProcessFinalize(result)
+    return result
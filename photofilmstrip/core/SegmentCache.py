@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import logging
+import os
+import threading
+import time
+
+from photofilmstrip.lib.common.Singleton import Singleton
+from photofilmstrip.lib.util import GetCacheDir
+
+
+class SegmentCache(Singleton):
+    '''
+    Keeps encoded segments of renders on disk. A segment is addressed by a
+    key of everything its frames and their encoding depend on, so a render
+    only encodes the segments that changed since an earlier render and an
+    aborted render continues with the segments that are missing. Segments
+    are written to a temporary file and moved into the cache when they are
+    complete. The least recently used segments are removed if the cache
+    exceeds its budget.
+    '''
+
+    DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+    EXTENSION = ".mkv"
+    TEMP_EXTENSION = ".part"
+    # temporary files of renders that crashed
+    TEMP_MAX_AGE = 24 * 60 * 60
+
+    def __init__(self):
+        self.__logger = logging.getLogger("SegmentCache")
+        self.__lock = threading.Lock()
+        self.__directory = GetCacheDir("segments")
+        self.__maxBytes = SegmentCache.DEFAULT_MAX_BYTES
+
+    def SetDirectory(self, directory):
+        '''
+        The directory is created when the first segment is written, see
+        GetTempFile().
+        '''
+        with self.__lock:
+            self.__directory = directory
+
+    def GetDirectory(self):
+        return self.__directory
+
+    def SetMaxBytes(self, maxBytes):
+        self.__maxBytes = maxBytes
+
+    def GetFile(self, key):
+        return os.path.join(self.__directory, key + SegmentCache.EXTENSION)
+
+    def GetTempFile(self, key, suffix):
+        '''
+        Returns the file a segment is written to before it is added with
+        Put(). suffix distinguishes segments with the same key that are
+        written at the same time.
+        '''
+        with self.__lock:
+            if not os.path.isdir(self.__directory):
+                try:
+                    os.makedirs(self.__directory)
+                except OSError as err:
+                    self.__logger.warning("cache not available (%s): %s",
+                                          self.__directory, err)
+        return os.path.join(self.__directory, "%s.%s%s" % (
+            key, suffix, SegmentCache.TEMP_EXTENSION))
+
+    def Contains(self, key):
+        '''
+        Returns True if the segment is in the cache and marks it as used.
+        '''
+        path = self.GetFile(key)
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def Put(self, key, tempFile):
+        try:
+            os.replace(tempFile, self.GetFile(key))
+        except OSError as err:
+            self.__logger.warning("cannot add segment %s: %s", key, err)
+            return False
+        return True
+
+    def GetBytes(self):
+        return sum(size for __, __, size in self.__ListFiles())
+
+    def __ListFiles(self):
+        result = []
+        try:
+            names = os.listdir(self.__directory)
+        except OSError:
+            return result
+        for name in names:
+            path = os.path.join(self.__directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            result.append((path, stat.st_mtime, stat.st_size))
+        return result
+
+    def Prune(self, keepKeys=()):
+        '''
+        Removes the least recently used segments until the cache uses 3/4 of
+        its budget. The segments of keepKeys are not removed, they are needed
+        by the current render.
+        '''
+        keepFiles = set(self.GetFile(key) for key in keepKeys)
+        with self.__lock:
+            files = self.__ListFiles()
+            totalBytes = sum(size for __, __, size in files)
+            removed = 0
+            now = time.time()
+            for path, mtime, size in sorted(files, key=lambda f: f[1]):
+                if path.endswith(SegmentCache.TEMP_EXTENSION):
+                    if now - mtime < SegmentCache.TEMP_MAX_AGE:
+                        continue
+                elif totalBytes <= self.__maxBytes * 3 // 4 \
+                        or path in keepFiles:
+                    continue
+
+                try:
+                    os.remove(path)
+                except OSError as err:
+                    self.__logger.warning("cannot remove %s: %s", path, err)
+                    continue
+                totalBytes -= size
+                removed += 1
+        self.__logger.debug("pruned %s segments", removed)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import collections
+import heapq
+import itertools
+
+
+class SegmentScheduler:
+    '''
+    Interleaves the tasks of the segments of a RenderEngine, so that the
+    frames of up to parallel segments are rendered at the same time and a
+    renderer can encode these segments in parallel. The next task is always
+    taken from the active segment that got the fewest frames so far, a
+    segment that becomes active starts where the one it replaces stopped.
+    The segment of each task is recorded in the order the tasks are handed
+    out, which is the order the RenderJob passes the frames to the renderer,
+    see PopFrame().
+    Segments that are already encoded can be skipped, see SetFinished().
+    '''
+
+    def __init__(self, renderEngine, segments, parallel):
+        self.__renderEngine = renderEngine
+        self.__segments = segments
+        self.__parallel = max(1, parallel)
+        self.__prologueTasks = list(renderEngine.IterPrologueTasks())
+        self.__frames = collections.deque()
+        self.__finished = set()
+
+    def GetSegments(self):
+        return self.__segments
+
+    def GetParallel(self):
+        return self.__parallel
+
+    def SetFinished(self, segment):
+        '''
+        Marks the segment as encoded already, IterTasks() leaves out its
+        tasks.
+        '''
+        self.__finished.add(segment.GetIndex())
+
+    def IsFinished(self, segment):
+        return segment.GetIndex() in self.__finished
+
+    def GetFrameCount(self):
+        '''
+        Returns the number of frames of all segments including the finished
+        ones.
+        '''
+        return sum(segment.GetFrameCount() for segment in self.__segments)
+
+    def GetTaskCount(self):
+        '''
+        Returns the number of tasks IterTasks() yields, like
+        RenderEngine.GetTaskCount().
+        '''
+        count = sum(task.GetRepeat() for task in self.__prologueTasks)
+        for segment in self.__segments:
+            if not self.IsFinished(segment):
+                count += segment.GetFrameCount()
+        return count
+
+    def IterTasks(self):
+        # prologue tasks do not produce frames, so they are not recorded
+        yield from self.__prologueTasks
+
+        counter = itertools.count()
+        pending = (segment for segment in self.__segments
+                   if not self.IsFinished(segment))
+        active = []
+        for segment in pending:
+            self.__Activate(active, segment, 0, counter)
+            if len(active) == self.__parallel:
+                break
+
+        while active:
+            frames, __, segment, task, tasks = heapq.heappop(active)
+            nextTask = next(tasks, None)
+            self.__frames.append((segment, nextTask is None))
+            yield task
+
+            frames += task.GetRepeat()
+            if nextTask is not None:
+                heapq.heappush(active, (frames, next(counter), segment,
+                                        nextTask, tasks))
+            else:
+                for segment in pending:
+                    if self.__Activate(active, segment, frames, counter):
+                        break
+
+    def __Activate(self, active, segment, frames, counter):
+        tasks = self.__renderEngine.IterSegmentTasks(segment)
+        task = next(tasks, None)
+        if task is None:
+            return False
+        heapq.heappush(active, (frames, next(counter), segment,
+                                task, tasks))
+        return True
+
+    def PopFrame(self):
+        '''
+        Returns the segment of the next frame that is passed to the renderer
+        and True if it is the last frame of its segment. Must be called once
+        for each task that produced a frame.
+        '''
+        return self.__frames.popleft()
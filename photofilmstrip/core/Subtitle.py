@@ -5,6 +5,7 @@
 # Copyright (C) 2010 Jens Goepfert
 #
 
+import bisect
 import codecs
 import os
 
@@ -65,6 +66,10 @@ class SrtParser(object):
         self.__framerate = framerate
 
         self.__data = []
+        # start times of __data, sorted for a binary search
+        self.__starts = []
+        # index of the last entry found, frames are mostly requested in order
+        self.__cursor = 0
 
         if os.path.exists(self.__path):
             self.Parse()
@@ -95,20 +100,48 @@ class SrtParser(object):
         finally:
             fd.close()
 
+        self.__data.sort(key=lambda entry: entry[0])
+        self.__starts = [entry[0] for entry in self.__data]
+        self.__cursor = 0
+
     def __ParseTime(self, text):
         hours = int(text[:2])
         minutes = int(text[3:5])
         seconds = float(text[6:].replace(",", "."))
 
-        millis = ((((hours * 60) + minutes) * 60) + seconds * 1000.0)
+        millis = ((((hours * 60) + minutes) * 60) + seconds) * 1000.0
 
         return millis
 
+    def __IsInSlot(self, idx, msec):
+        '''
+        Returns True if msec is between the start of the entry at idx and the
+        start of the following one.
+        '''
+        if idx >= len(self.__starts) or msec < self.__starts[idx]:
+            return False
+        return idx + 1 == len(self.__starts) or msec < self.__starts[idx + 1]
+
     def Get(self, pic):
         msec = pic * (1.0 / self.__framerate) * 1000.0
-        for start, end, text in self.__data:
-            if msec >= start and msec <= end:
-                return text
+        if not self.__data or msec < self.__starts[0]:
+            return ""
+
+        idx = self.__cursor
+        if not self.__IsInSlot(idx, msec):
+            if self.__IsInSlot(idx + 1, msec):
+                idx += 1
+            else:
+                idx = bisect.bisect_right(self.__starts, msec) - 1
+        self.__cursor = idx
+
+        # an entry that ends exactly where the next one starts wins
+        if idx > 0 and msec <= self.__data[idx - 1][1]:
+            idx -= 1
+
+        start, end, text = self.__data[idx]
+        if msec >= start and msec <= end:
+            return text
         return ""
 
 
@@ -5,9 +5,13 @@
 # Copyright (C) 2014 Jens Goepfert
 #
 
+import functools
+import hashlib
+import json
 import logging
 import os
 import threading
+import time
 
 import queue
 
@@ -16,18 +20,35 @@ from gi.repository import GObject
 
 from photofilmstrip.core.Aspect import Aspect
 from photofilmstrip.core.OutputProfile import OutputProfile
-from photofilmstrip.core.BaseRenderer import BaseRenderer
+from photofilmstrip.core.BaseRenderer import BaseRenderer, \
+    RawImageFinalizeHandler
+from photofilmstrip.core.SegmentCache import SegmentCache
 from photofilmstrip.core.Subtitle import SrtParser
 from photofilmstrip.core.exceptions import RendererException
 from photofilmstrip.core.GtkMainLoop import GtkMainLoop
 
 
 class _GStreamerRenderer(BaseRenderer):
+    '''
+    Frames are passed to a feeder thread that pushes them to the appsrc of
+    the pipeline. The appsrc buffers up to the number of MB of the property
+    SinkBuffer and SINK_MAX_BUFFERS frames, pushing blocks if the encoder
+    falls behind. resQueue only hands over the frames to the feeder.
+    '''
+
+    SINK_BUFFER_MB = 64
+    SINK_MAX_BUFFERS = 50
+    FEED_QUEUE_SIZE = 4
+    # properties that do not affect the encoded video, see GetSegmentKey()
+    RUNTIME_PROPERTIES = ("Segments", "SinkBuffer")
 
     def __init__(self):
         BaseRenderer.__init__(self)
         self._Log = _GStreamerRenderer.Log
-        self.resQueue = queue.Queue(20)
+        self.resQueue = queue.Queue(_GStreamerRenderer.FEED_QUEUE_SIZE)
+        self.sinkBufferBytes = None
+        self.feeder = None
+        self.feedStats = None
 
         self.active = None
         self.finished = None
@@ -39,10 +60,23 @@ class _GStreamerRenderer(BaseRenderer):
         self.finalTime = None
         self.textoverlay = None
         self.srtParse = None
+        self.subtitle = None
         self.concat = None
         self.ptsOffset = 0
         self.ptsLast = -1
 
+        # segment mode, see SetSegmentScheduler()
+        self.segmentScheduler = None
+        self.segmentRenderers = {}
+        self.segmentKeys = {}
+        self.segmentsDone = set()
+        self.segmentAborted = False
+        self.segmentError = None
+        # set for the renderers that encode a single segment, called when
+        # the segment is encoded completely
+        self.segmentOutput = False
+        self.segmentCallback = None
+
     @staticmethod
     def CheckDependencies(msgList):
         if Gst is None or GObject is None:
@@ -55,7 +89,8 @@ class _GStreamerRenderer(BaseRenderer):
 
     @staticmethod
     def GetProperties():
-        return ["Bitrate", "RenderSubtitle", "SubtitleSettings"]
+        return ["Bitrate", "RenderSubtitle", "SubtitleSettings", "RawVideo",
+                "SinkBuffer"]
 
     @staticmethod
     def GetDefaultProperty(prop):
@@ -63,12 +98,68 @@ class _GStreamerRenderer(BaseRenderer):
             return "false"
         if prop == "SubtitleSettings":
             return ""
+        if prop == "RawVideo":
+            return "true"
+        if prop == "Segments":
+            return "1"
+        if prop == "SinkBuffer":
+            return str(_GStreamerRenderer.SINK_BUFFER_MB)
         return BaseRenderer.GetDefaultProperty(prop)
 
+    def GetFinalizeHandler(self):
+        '''
+        In raw video mode the frames are passed as uncompressed RGBX buffers
+        to the appsrc, this avoids a JPEG encode and decode for each frame.
+        :rtype: FinalizeHandler
+        '''
+        if self.GetTypedProperty("RawVideo", bool):
+            return RawImageFinalizeHandler("RGBX")
+        else:
+            return BaseRenderer.GetFinalizeHandler(self)
+
     def ToSink(self, data):
-        self.resQueue.put(data)
+        if self.segmentScheduler is not None:
+            self.__ToSegment(data, 1)
+        else:
+            self.__ToFeeder(data, 1)
+
+    def ToSinkRepeated(self, data, count):
+        '''
+        The frame is queued only once and pushed count times to the appsrc.
+        '''
+        if self.segmentScheduler is not None:
+            self.__ToSegment(data, count)
+        else:
+            self.__ToFeeder(data, count)
+
+    def __ToFeeder(self, data, count):
+        if self.resQueue.full():
+            start = time.perf_counter()
+            self.resQueue.put((data, count))
+            self.feedStats["sinkWaits"] += 1
+            self.feedStats["sinkWaitTime"] += time.perf_counter() - start
+        else:
+            self.resQueue.put((data, count))
+        self.feedStats["peakQueueDepth"] = max(self.feedStats["peakQueueDepth"],
+                                               self.resQueue.qsize())
+
+    def GetStatistics(self):
+        '''
+        sinkWaits counts the frames the renderer had to wait for because the
+        pipeline was busy, feederWaits the frames the pipeline had to wait for.
+        '''
+        if self.segmentScheduler is not None:
+            return dict((idx, renderer.GetStatistics())
+                        for idx, renderer in self.segmentRenderers.items())
+        if self.feedStats is None:
+            return {}
+        stats = dict(self.feedStats)
+        stats["queueDepth"] = self.resQueue.qsize()
+        return stats
 
     def GetOutputFile(self):
+        if self.segmentOutput:
+            return self._outFile
         outFile = '{0}.{1}'.format(self._outFile, self._GetExtension())
         return outFile
 
@@ -81,6 +172,11 @@ class _GStreamerRenderer(BaseRenderer):
         if self.ready is None:
             return
 
+        if self.feeder is not None:
+            self.__FinishFeed()
+            self.feeder.join()
+            self.feeder = None
+
         self._Log(logging.DEBUG, "waiting for ready event")
         self.ready.wait()
 
@@ -94,11 +190,12 @@ class _GStreamerRenderer(BaseRenderer):
         self.finalTime = None
         self.textoverlay = None
         self.srtParse = None
+        self.subtitle = None
         self.concat = None
         self.ptsOffset = 0
         self.ptsLast = -1
 
-        if self.GetTypedProperty("RenderSubtitle", bool):
+        if not self.segmentOutput and self.GetTypedProperty("RenderSubtitle", bool):
             # delete subtitle file, if subtitle is rendered in video
             srtPath = self._outFile + ".srt"
             if os.path.exists(srtPath):
@@ -109,6 +206,12 @@ class _GStreamerRenderer(BaseRenderer):
         Called if the user aborts the rendering. Sets the active flag to false
         and waits until everything is cleaned up.
         '''
+        if self.segmentScheduler is not None:
+            self.segmentAborted = True
+            for renderer in self.segmentRenderers.values():
+                renderer.ProcessAbort()
+            return
+
         if self.active:
             self.active = False
 
@@ -120,6 +223,10 @@ class _GStreamerRenderer(BaseRenderer):
         '''
         GObject.threads_init()
 
+        if self.segmentScheduler is not None:
+            self.__PrepareSegments()
+            return
+
         self.ready = threading.Event()
         self.ready.set()
 
@@ -132,19 +239,35 @@ class _GStreamerRenderer(BaseRenderer):
 
         self.pipeline = Gst.Pipeline()
 
-        caps = Gst.caps_from_string(
-            "image/jpeg,framerate={0}".format(frameRate.AsStr()))
+        rawVideo = self.GetTypedProperty("RawVideo", bool)
+        if rawVideo:
+            width, height = self.GetProfile().GetResolution()
+            caps = Gst.caps_from_string(
+                "video/x-raw,format=RGBx,width={0},height={1},"
+                "framerate={2}".format(width, height, frameRate.AsStr()))
+        else:
+            caps = Gst.caps_from_string(
+                "image/jpeg,framerate={0}".format(frameRate.AsStr()))
         videoSrc = Gst.ElementFactory.make("appsrc")
         videoSrc.set_property("block", True)
+        videoSrc.set_property("emit-signals", False)
+        videoSrc.set_property("format", Gst.Format.TIME)
         videoSrc.set_property("caps", caps)
-        videoSrc.connect("need-data", self._GstNeedData)
+        videoSrc.set_property("max-bytes", self.__GetSinkBufferBytes())
+        if videoSrc.find_property("max-buffers") is not None:
+            # since GStreamer 1.20
+            videoSrc.set_property("max-buffers",
+                                  _GStreamerRenderer.SINK_MAX_BUFFERS)
         self.pipeline.add(videoSrc)
 
         queueVideo = Gst.ElementFactory.make("queue")
         self.pipeline.add(queueVideo)
 
-        jpegDecoder = Gst.ElementFactory.make("jpegdec")
-        self.pipeline.add(jpegDecoder)
+        if rawVideo:
+            jpegDecoder = None
+        else:
+            jpegDecoder = Gst.ElementFactory.make("jpegdec")
+            self.pipeline.add(jpegDecoder)
 
         colorConverter = Gst.ElementFactory.make("videoconvert")
         self.pipeline.add(colorConverter)
@@ -159,8 +282,11 @@ class _GStreamerRenderer(BaseRenderer):
             self.pipeline.add(self.textoverlay)
 
         # link elements for video stream
-        videoSrc.link(jpegDecoder)
-        jpegDecoder.link(colorConverter)
+        if jpegDecoder:
+            videoSrc.link(jpegDecoder)
+            jpegDecoder.link(colorConverter)
+        else:
+            videoSrc.link(colorConverter)
         if self.textoverlay:
             colorConverter.link(self.textoverlay)
             self.textoverlay.link(queueVideo)
@@ -168,6 +294,35 @@ class _GStreamerRenderer(BaseRenderer):
             colorConverter.link(queueVideo)
         queueVideo.link(videoEnc)
 
+        audioEnc = self.__PrepareAudio()
+        self.__PrepareMux(videoEnc, audioEnc)
+        self.__StartPipeline()
+
+        self.feedStats = {"frames": 0,
+                          "sinkWaits": 0,
+                          "sinkWaitTime": 0.0,
+                          "feederWaits": 0,
+                          "feederWaitTime": 0.0,
+                          "peakQueueDepth": 0,
+                          "peakSinkBytes": 0}
+        self.feeder = threading.Thread(target=self.__Feed, args=(videoSrc,),
+                                       name="GStreamerFeeder")
+        self.feeder.start()
+
+    def __GetSinkBufferBytes(self):
+        if self.sinkBufferBytes is not None:
+            return self.sinkBufferBytes
+        sinkBuffer = self.GetTypedProperty("SinkBuffer", int,
+                                           _GStreamerRenderer.SINK_BUFFER_MB)
+        if sinkBuffer is None or sinkBuffer <= 0:
+            sinkBuffer = _GStreamerRenderer.SINK_BUFFER_MB
+        return sinkBuffer * 1024 * 1024
+
+    def __PrepareAudio(self):
+        '''
+        Adds the elements that decode, concatenate and encode the audio files
+        and returns the last one or None if there are no audio files.
+        '''
         audioEnc = None
         if self.GetAudioFiles():
             self.concat = Gst.ElementFactory.make("concat")
@@ -195,7 +350,12 @@ class _GStreamerRenderer(BaseRenderer):
             audioConv.link(audiorate)
             audiorate.link(audioQueue)
             audioQueue.link(audioEnc)
+        return audioEnc
 
+    def __PrepareMux(self, videoEnc, audioEnc):
+        '''
+        Adds the muxer and the filesink and links the encoded streams to it.
+        '''
         if self.GetProfile().IsMPEGProfile():
             vp = Gst.ElementFactory.make("mpegvideoparse")
             self.pipeline.add(vp)
@@ -213,7 +373,10 @@ class _GStreamerRenderer(BaseRenderer):
             videoEnc.link(vp)
             videoEnc = vp
 
-        mux = self._GetMux()
+        if self.segmentOutput:
+            mux = self._GetSegmentMux()
+        else:
+            mux = self._GetMux()
         self.pipeline.add(mux)
 
         videoQueue2 = Gst.ElementFactory.make("queue")
@@ -238,6 +401,7 @@ class _GStreamerRenderer(BaseRenderer):
 
         mux.link(sink)
 
+    def __StartPipeline(self):
         bus = self.pipeline.get_bus()
         bus.add_signal_watch()
         bus.connect("message", self._GstOnMessage)
@@ -248,6 +412,211 @@ class _GStreamerRenderer(BaseRenderer):
 
         self.ready.clear()
 
+    @classmethod
+    def _SupportsSegments(cls):
+        '''
+        Returns True if segments that are encoded separately can be joined
+        without encoding them again, see GetSegmentCount().
+        '''
+        return False
+
+    def GetSegmentCount(self):
+        '''
+        With the property Segments greater than 1 the slide show is split
+        into segments and as many segments are encoded in parallel, each one
+        in its own pipeline into a Matroska file of the SegmentCache.
+        Finalize() joins the segments without encoding them again and muxes
+        them with the audio files.
+        '''
+        if not self._SupportsSegments() or self._outFile is None:
+            return 1
+
+        segments = self.GetTypedProperty("Segments", int)
+        if segments is None or segments <= 1:
+            return 1
+
+        if self.GetTypedProperty("RenderSubtitle", bool):
+            self._Log(logging.WARN,
+                      "subtitles are rendered into the video, "
+                      "encoding without segments")
+            return 1
+        return segments
+
+    def SetSegmentScheduler(self, segmentScheduler):
+        '''
+        Segments that are found in the SegmentCache are not encoded again.
+        Their key is the fingerprint of their frames combined with this
+        renderer and its properties.
+        '''
+        self.segmentScheduler = segmentScheduler
+        self.segmentKeys = {}
+        self.segmentsDone = set()
+
+        segments = segmentScheduler.GetSegments()
+        for segment in segments:
+            key = self.GetSegmentKey(segment)
+            self.segmentKeys[segment.GetIndex()] = key
+            if SegmentCache().Contains(key):
+                segmentScheduler.SetFinished(segment)
+                self.segmentsDone.add(segment.GetIndex())
+
+        self._Log(logging.INFO, "%s of %s segments cached",
+                  len(self.segmentsDone), len(segments))
+
+    def GetSegmentKey(self, segment):
+        '''
+        The key of a segment is built from its fingerprint and the settings
+        that affect the encoded video: the codec and container, the
+        resolution and frame rate, the bitrate, the aspect and the encoder
+        properties. Properties like Segments or SinkBuffer only change how
+        the video is encoded and are left out, so the cached segments can
+        be reused when they change.
+        '''
+        profile = self.GetProfile()
+        props = [(prop, self.GetProperty(prop))
+                 for prop in self.GetProperties()
+                 if prop not in self.RUNTIME_PROPERTIES and prop != "Bitrate"]
+        rendererKey = [self.__class__.__name__, props, self._aspect,
+                       list(profile.GetResolution()),
+                       profile.GetFrameRate().AsStr(), self._GetBitrate()]
+        return hashlib.sha1(json.dumps(
+            [rendererKey, segment.GetFingerprint()]).encode("utf-8")).hexdigest()
+
+    def __GetSegmentTempFile(self, segment):
+        return SegmentCache().GetTempFile(self.segmentKeys[segment.GetIndex()],
+                                          segment.GetIndex())
+
+    def __PrepareSegments(self):
+        frameRate = self.GetProfile().GetFrameRate()
+        self.imgDuration = int(round(1000 * Gst.MSECOND / frameRate.AsFloat()))
+
+        self.segmentRenderers = {}
+        self.segmentAborted = False
+
+    def __OnSegmentDone(self, segment):
+        '''
+        Called from the main loop when the pipeline of a segment has written
+        its last frame.
+        '''
+        if SegmentCache().Put(self.segmentKeys[segment.GetIndex()],
+                              self.__GetSegmentTempFile(segment)):
+            self.segmentsDone.add(segment.GetIndex())
+
+    def __ToSegment(self, data, count):
+        '''
+        Passes the frame to the renderer of its segment, the renderer is
+        created with the first frame of the segment.
+        '''
+        segment, isLast = self.segmentScheduler.PopFrame()
+        renderer = self.segmentRenderers.get(segment.GetIndex())
+        if renderer is None:
+            renderer = self.__class__()
+            renderer.Init(self.GetProfile(), self._aspect,
+                          self.__GetSegmentTempFile(segment))
+            renderer.segmentOutput = True
+            renderer.segmentCallback = functools.partial(self.__OnSegmentDone,
+                                                         segment)
+            # the active segments share the buffer of the appsrc
+            renderer.sinkBufferBytes = \
+                self.__GetSinkBufferBytes() // self.segmentScheduler.GetParallel()
+            renderer.Prepare()
+            self.segmentRenderers[segment.GetIndex()] = renderer
+
+        renderer.ToSinkRepeated(data, count)
+        if isLast:
+            # the pipeline of the segment finishes in the background,
+            # Finalize() waits for it
+            renderer.__FinishFeed()
+
+    def __FinalizeSegments(self):
+        '''
+        Waits for the pipelines of the segments and joins them. Segments that
+        are complete stay in the SegmentCache even if the render was aborted,
+        so the render can be continued. Raises a RendererException if
+        segments are missing or cannot be joined.
+        '''
+        for renderer in self.segmentRenderers.values():
+            renderer.Finalize()
+        self.segmentRenderers = {}
+
+        segments = self.segmentScheduler.GetSegments()
+        for segment in segments:
+            tempFile = self.__GetSegmentTempFile(segment)
+            if os.path.exists(tempFile):
+                os.remove(tempFile)
+
+        if self.segmentAborted:
+            return
+        if len(self.segmentsDone) < len(segments):
+            self._Log(logging.ERROR, "only %s of %s segments encoded",
+                      len(self.segmentsDone), len(segments))
+            raise RendererException(_(u"Only %(done)d of %(total)d segments encoded!")
+                                    % {"done": len(self.segmentsDone),
+                                       "total": len(segments)})
+
+        keys = [self.segmentKeys[segment.GetIndex()] for segment in segments]
+        self.__PrepareConcat([SegmentCache().GetFile(key) for key in keys])
+        self.__CleanUp()
+        SegmentCache().Prune(keys)
+
+        if self.segmentError is not None:
+            self._Log(logging.ERROR, "joining segments failed: %s",
+                      self.segmentError)
+            raise RendererException(_(u"Joining segments failed: %s")
+                                    % self.segmentError)
+
+    def __PrepareConcat(self, segmentFiles):
+        '''
+        Builds the pipeline that joins the encoded segments without encoding
+        them again and muxes them with the audio files. splitmuxsrc plays
+        the files one after another with continuous timestamps and opens
+        only few of them at the same time.
+        '''
+        self.ready = threading.Event()
+        self.ready.set()
+
+        self.active = True
+        self.finished = True
+        self.segmentError = None
+        self.finalTime = self.segmentScheduler.GetFrameCount() * self.imgDuration
+
+        self.pipeline = Gst.Pipeline()
+
+        segmentSrc = Gst.ElementFactory.make("splitmuxsrc")
+        segmentSrc.connect("format-location",
+                           self._GstFormatLocationSegments, segmentFiles)
+        self.pipeline.add(segmentSrc)
+
+        videoQueue = Gst.ElementFactory.make("queue")
+        self.pipeline.add(videoQueue)
+        segmentSrc.connect("pad-added", self._GstPadAddedSegment, videoQueue)
+
+        videoParse = self._GetSegmentParser()  # pylint: disable=assignment-from-none
+        if videoParse:
+            self.pipeline.add(videoParse)
+            videoQueue.link(videoParse)
+        else:
+            videoParse = videoQueue
+
+        audioEnc = self.__PrepareAudio()
+        self.__PrepareMux(videoParse, audioEnc)
+        self.__StartPipeline()
+
+    def _GstFormatLocationSegments(self, splitmuxsrc, segmentFiles):  # pylint: disable=unused-argument
+        '''
+        Gstreamer format-location callback that returns the segment files in
+        the order they are played.
+        '''
+        return segmentFiles
+
+    def _GstPadAddedSegment(self, splitmuxsrc, pad, videoQueue):
+        '''
+        Gstreamer pad-added callback to link the video stream of the joined
+        segments.
+        '''
+        self._Log(logging.DEBUG, "_GstPadAddedSegment: %s - %s", splitmuxsrc, pad)
+        pad.link(videoQueue.get_static_pad("sink"))
+
     def _GstAddAudioFile(self, audioFile):
         '''
         Inserts new elements to refer a new audio file in the gstreamer pipeline.
@@ -265,9 +634,11 @@ class _GStreamerRenderer(BaseRenderer):
         audioSrc.link(audioDec)
 
     def Finalize(self):
-        if not self.finished:
-            self.finished = True
+        if self.segmentScheduler is not None:
+            self.__FinalizeSegments()
+            return
 
+        self.__FinishFeed()
         self.__CleanUp()
 
     def _GetBitrate(self):
@@ -290,70 +661,98 @@ class _GStreamerRenderer(BaseRenderer):
             self._Log(logging.ERROR, "Error received from element %s: %s",
                           msg.src.get_name(), err)
             self._Log(logging.DEBUG, "Debugging information: %s", debug)
+            self.segmentError = err
+            if self.ready is not None:
+                # the pipeline cannot continue, release the waiting cleanup
+                self.pipeline.set_state(Gst.State.NULL)
+                self.ready.set()
 
         elif msg.type == Gst.MessageType.LATENCY:
             self.pipeline.recalculate_latency()
 
         elif msg.type == Gst.MessageType.EOS:
             self.pipeline.set_state(Gst.State.NULL)
+            if self.segmentCallback is not None and self.active:
+                # not aborted, the segment file is complete
+                self.segmentCallback()
             self.ready.set()
 #         return Gst.BusSyncReply.PASS
 
-    def _GstNeedData(self, src, need_bytes):  # pylint: disable=unused-argument
+    def __FinishFeed(self):
+        '''
+        Tells the feeder thread that no more frames follow.
         '''
-        Gstreamer need-data probe callback to feed the appsrc with image data.
-        The image data comes from a queue that is filled from other worker
-        threads. If the queue is empty and the finish flag is set send
-        end-of-stream to the appsrc so the pipeline can finish its processing.
-        If the textoverlay element is available the current text for the
-        rendered subtitle will be set.
+        if self.feeder is not None and not self.finished:
+            self.finished = True
+            self.resQueue.put(None)
+
+    def __Feed(self, src):
+        '''
+        Runs in the feeder thread and pushes the frames from resQueue to the
+        appsrc as soon as they are passed to the renderer. Pushing blocks
+        while the appsrc is full. If the queue returns None the renderer is
+        finished or aborted and end-of-stream is sent to the appsrc so the
+        pipeline can finish its processing. If the textoverlay element is
+        available the current text for the rendered subtitle will be set.
         :param src: GstElement appsrc
-        :param need_bytes: unused size
         '''
-        self._Log(logging.DEBUG, '_GstNeedData: %s', self.idxFrame)
+        flowing = True
+        while True:
+            if self.resQueue.empty():
+                start = time.perf_counter()
+                item = self.resQueue.get()
+                self.feedStats["feederWaits"] += 1
+                self.feedStats["feederWaitTime"] += time.perf_counter() - start
+            else:
+                item = self.resQueue.get()
+            if item is None:
+                break
+            if not flowing or not self.active:
+                # drop the frames so the renderer is not blocked
+                continue
+
+            data, count = item
+            # all repetitions share the memory of the frame
+            buf = Gst.Buffer.new_wrapped(data)
+            for idx in range(count):
+                if idx > 0:
+                    buf = buf.copy()
+                if not self.__PushBuffer(src, buf):
+                    flowing = False
+                    break
 
         pts = self.idxFrame * self.imgDuration
-
-        while self.active:
-            result = None
-            try:
-                result = self.resQueue.get(True, 0.25)
-                break
-            except queue.Empty:
-                self._Log(logging.DEBUG, '_GstNeedData: Queue.Empty')
-                if self.finished:
-                    self._Log(logging.DEBUG, '_GstNeedData: finished, emitting end-of-stream (finalTime %s)', pts)
-                    self.finalTime = pts
-                    src.emit("end-of-stream")
-                    return
-                else:
-                    continue
-        else:
-            self._Log(logging.DEBUG, '_GstNeedData: not active anymore, emitting end-of-stream (finalTime %s)', pts)
-            self.finalTime = pts
+        self._Log(logging.DEBUG, '__Feed: emitting end-of-stream (finalTime %s)', pts)
+        self.finalTime = pts
+        if flowing:
             src.emit("end-of-stream")
-            return
-
-        self._Log(logging.DEBUG, '_GstNeedData: push to buffer (%s)', len(result))
 
-        buf = Gst.Buffer.new_wrapped(result)
-        buf.pts = pts
+    def __PushBuffer(self, src, buf):
+        buf.pts = self.idxFrame * self.imgDuration
         buf.duration = self.imgDuration
-        ret = src.emit("push-buffer", buf)
-        if ret != Gst.FlowReturn.OK:
-            return
 
         if self.textoverlay:
-#             self.textoverlay.set_property("text", "Frame: %s" % self.idxFrame)
             if self.srtParse is None:
                 srtPath = self._outFile + ".srt"
                 self.srtParse = SrtParser(
                     srtPath, self.GetProfile().GetFrameRate().AsFloat())
 
             subtitle = self.srtParse.Get(self.idxFrame)
-            self.textoverlay.set_property("text", subtitle)
+            if subtitle != self.subtitle:
+                self.textoverlay.set_property("text", subtitle)
+                self.subtitle = subtitle
+
+        ret = src.emit("push-buffer", buf)
+        if ret != Gst.FlowReturn.OK:
+            self._Log(logging.DEBUG, '__PushBuffer: %s', ret)
+            return False
 
         self.idxFrame += 1
+        self.feedStats["frames"] += 1
+        self.feedStats["peakSinkBytes"] = max(
+            self.feedStats["peakSinkBytes"],
+            src.get_property("current-level-bytes"))
+        return True
 
     def _GstPadAddedAudio(self, decodebin, pad):
         '''
@@ -429,6 +828,16 @@ class _GStreamerRenderer(BaseRenderer):
     def _GetVideoEncoderCaps(self):
         return None
 
+    def _GetSegmentMux(self):
+        return Gst.ElementFactory.make("matroskamux")
+
+    def _GetSegmentParser(self):
+        '''
+        Returns the parser that is put between the joined segments and the
+        muxer or None.
+        '''
+        return None
+
 
 class MkvX264AC3(_GStreamerRenderer):
 
@@ -464,7 +873,14 @@ class MkvX264AC3(_GStreamerRenderer):
     @staticmethod
     def GetProperties():
         return _GStreamerRenderer.GetProperties() + [
-            "SpeedPreset", "Profile", "HardwareEncoding"]
+            "SpeedPreset", "Profile", "HardwareEncoding", "Segments"]
+
+    @classmethod
+    def _SupportsSegments(cls):
+        return True
+
+    def _GetSegmentParser(self):
+        return Gst.ElementFactory.make("h264parse")
 
     def _GetExtension(self):
         return "mkv"
@@ -540,7 +956,14 @@ class Mp4X264AAC(_GStreamerRenderer):
     @staticmethod
     def GetProperties():
         return _GStreamerRenderer.GetProperties() + [
-            "SpeedPreset", "Profile", "HardwareEncoding"]
+            "SpeedPreset", "Profile", "HardwareEncoding", "Segments"]
+
+    @classmethod
+    def _SupportsSegments(cls):
+        return True
+
+    def _GetSegmentParser(self):
+        return Gst.ElementFactory.make("h264parse")
 
     def _GetExtension(self):
         return "mp4"
@@ -600,7 +1023,11 @@ class MkvX265AC3(_GStreamerRenderer):
 
     @staticmethod
     def GetProperties():
-        return _GStreamerRenderer.GetProperties() + ["SpeedPreset"]
+        return _GStreamerRenderer.GetProperties() + ["SpeedPreset", "Segments"]
+
+    @classmethod
+    def _SupportsSegments(cls):
+        return True
 
     def _GetExtension(self):
         return "mkv"
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import logging
+import os
+import shutil
+
+from PIL import Image
+
+from photofilmstrip.core.BaseRenderer import BaseRenderer, FinalizeHandler
+from photofilmstrip.core.exceptions import RendererException
+
+
+class MultiRenderer(BaseRenderer):
+    '''
+    Passes the frames of one render to several renderers, so a slide show is
+    rendered into several output profiles or formats at once. The frames are
+    generated with the profile given to Init(), which should be the one with
+    the largest resolution, and are resized to the resolution of each
+    renderer. Renderers with the same resolution and the same finalize
+    handler share the finalized frame. All profiles must have the same frame
+    rate.
+    '''
+
+    def __init__(self, renderers):
+        BaseRenderer.__init__(self)
+        self.__renderers = renderers
+        # index of the finalized frame for each renderer
+        self.__resultIdx = []
+        self.__subtitleShared = False
+        self.__logger = logging.getLogger("MultiRenderer")
+
+    @staticmethod
+    def GetName():
+        return _(u"Multiple outputs")
+
+    def GetRenderers(self):
+        return self.__renderers
+
+    def SetAudioFiles(self, audioFiles):
+        BaseRenderer.SetAudioFiles(self, audioFiles)
+        for renderer in self.__renderers:
+            renderer.SetAudioFiles(audioFiles)
+
+    def GetOutputFile(self):
+        return self.__renderers[0].GetOutputFile()
+
+    def GetFinalizeHandler(self):
+        '''
+        :rtype: MultiFinalizeHandler
+        '''
+        targets = []
+        self.__resultIdx = []
+        for renderer in self.__renderers:
+            size = tuple(renderer.GetProfile().GetResolution())
+            finalizeHandler = renderer.GetFinalizeHandler()
+            key = finalizeHandler.GetKey()
+
+            resultIdx = None
+            if key is not None:
+                for idx, (targetSize, targetHandler) in enumerate(targets):
+                    if targetSize == size and targetHandler.GetKey() == key:
+                        resultIdx = idx
+                        break
+            if resultIdx is None:
+                resultIdx = len(targets)
+                targets.append((size, finalizeHandler))
+            self.__resultIdx.append(resultIdx)
+
+        self.__logger.debug("%s renderers, %s finalized frames",
+                            len(self.__renderers), len(targets))
+        return MultiFinalizeHandler(targets)
+
+    def Prepare(self):
+        for renderer in self.__renderers:
+            renderer.Prepare()
+
+    def __ShareSubtitle(self):
+        '''
+        The subtitle file is generated next to the output file of the first
+        renderer before the first frame, the other renderers read it from
+        next to their own output file.
+        '''
+        self.__subtitleShared = True
+        srtPath = os.path.splitext(self.GetOutputFile())[0] + ".srt"
+        if not os.path.exists(srtPath):
+            return
+
+        for renderer in self.__renderers[1:]:
+            targetPath = os.path.splitext(renderer.GetOutputFile())[0] + ".srt"
+            if targetPath != srtPath:
+                shutil.copyfile(srtPath, targetPath)
+
+    def ToSink(self, data):
+        if not self.__subtitleShared:
+            self.__ShareSubtitle()
+        for renderer, resultIdx in zip(self.__renderers, self.__resultIdx):
+            renderer.ToSink(data[resultIdx])
+
+    def ToSinkRepeated(self, data, count):
+        if not self.__subtitleShared:
+            self.__ShareSubtitle()
+        for renderer, resultIdx in zip(self.__renderers, self.__resultIdx):
+            renderer.ToSinkRepeated(data[resultIdx], count)
+
+    def GetStatistics(self):
+        return dict((renderer.GetOutputFile(), renderer.GetStatistics())
+                    for renderer in self.__renderers)
+
+    def ProcessAbort(self):
+        for renderer in self.__renderers:
+            renderer.ProcessAbort()
+
+    def Finalize(self):
+        '''
+        Finalizes all renderers, even if one of them fails, and raises the
+        first error.
+        '''
+        error = None
+        for renderer in self.__renderers:
+            try:
+                renderer.Finalize()
+            except RendererException as exc:
+                self.__logger.error("%s: %s", renderer.GetOutputFile(),
+                                    exc.GetMessage())
+                if error is None:
+                    error = exc
+        if error is not None:
+            raise error
+
+
+class MultiFinalizeHandler(FinalizeHandler):
+    '''
+    Resizes the frame to the size of each target and finalizes it with the
+    handler of the target. Returns a tuple with a result for each target.
+    '''
+
+    def __init__(self, targets):
+        self._targets = targets
+
+    def GetTargets(self):
+        return self._targets
+
+    def ProcessFinalize(self, pilImg):
+        images = {}
+        result = []
+        for size, finalizeHandler in self._targets:
+            img = pilImg
+            if img.size != size:
+                img = images.get(size)
+                if img is None:
+                    # reducing_gap downscales by an integer factor first,
+                    # which is much faster than resampling from full size
+                    img = pilImg.resize(size, Image.BILINEAR, reducing_gap=2.0)
+                    images[size] = img
+            result.append(finalizeHandler.ProcessFinalize(img))
+        return tuple(result)
+
+    def IsProcessable(self):
+        for __, finalizeHandler in self._targets:
+            if not finalizeHandler.IsProcessable():
+                return False
+        return True
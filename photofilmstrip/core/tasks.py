@@ -16,6 +16,7 @@ class Task:
     def __init__(self):
         self.info = u""
         self.subTasks = []
+        self.repeat = 1
 
     def __str__(self):
         return "%s: %s" % (self.__class__.__name__, self.info)
@@ -32,6 +33,15 @@ class Task:
     def SetInfo(self, info):
         self.info = info
 
+    def GetRepeat(self):
+        return self.repeat
+
+    def SetRepeat(self, count):
+        '''
+        Sets how many consecutive frames show the result of this task.
+        '''
+        self.repeat = count
+
     def GetKey(self):
         raise NotImplementedError()
 
@@ -67,16 +77,17 @@ class TaskSubtitle(Task):
 
 class TaskLoadPic(Task):
 
-    def __init__(self, picture):
+    def __init__(self, picture, scale=None):
         Task.__init__(self)
         self.picture = picture
+        self.scale = scale
 
     def GetKey(self):
-        return 'LoadPic_{}'.format(
-            self.picture.GetKey())
+        return 'LoadPic_{}_{}'.format(
+            self.picture.GetKey(), self.scale)
 
     def Run(self, jobContext):
-        return PILBackend.GetImage(self.picture)
+        return PILBackend.GetSourceImage(self.picture, self.scale)
 
 
 class TaskImaging(Task):
@@ -92,11 +103,11 @@ class TaskImaging(Task):
 
 class TaskCropResize(TaskImaging):
 
-    def __init__(self, picture, rect, resolution):
+    def __init__(self, picture, rect, resolution, scale=None):
         TaskImaging.__init__(self, resolution)
         self.picture = picture
         self.rect = rect
-        self.taskLoadPic = TaskLoadPic(picture)
+        self.taskLoadPic = TaskLoadPic(picture, scale)
         self.subTasks.append(self.taskLoadPic)
 
     def GetKey(self):
@@ -104,23 +115,31 @@ class TaskCropResize(TaskImaging):
             self.taskLoadPic.GetKey(), self.rect, self.resolution)
 
     def Run(self, jobContext):
-        image = jobContext.ProcessSubTask(self.taskLoadPic)
-        img = PILBackend.CropAndResize(image,
+        sourceImage = jobContext.ProcessSubTask(self.taskLoadPic)
+        img = PILBackend.CropAndResize(sourceImage.GetImage(),
                                        self.rect,
                                        self.resolution,
-                                       self.draft)
+                                       self.draft,
+                                       sourceImage.GetMatrix())
+        if self.picture.GetEffect() != self.picture.EFFECT_NONE:
+            # effects are applied to the frame, not the whole picture
+            img = PILBackend.ApplyEffect(img, self.picture.GetEffect())
+        elif img.mode != "RGB":
+            # sources shared with worker processes are RGBX
+            img = img.convert("RGB")
         return img
 
 
 class TaskTrans(TaskImaging):
 
     def __init__(self, kind, percentage,
-                 pic1, rect1, pic2, rect2, resolution):
+                 pic1, rect1, pic2, rect2, resolution,
+                 scale1=None, scale2=None):
         TaskImaging.__init__(self, resolution)
         self.kind = kind
         self.percentage = percentage
-        self.taskPic1 = TaskCropResize(pic1, rect1, resolution)
-        self.taskPic2 = TaskCropResize(pic2, rect2, resolution)
+        self.taskPic1 = TaskCropResize(pic1, rect1, resolution, scale1)
+        self.taskPic2 = TaskCropResize(pic2, rect2, resolution, scale2)
         self.subTasks.append(self.taskPic1)
         self.subTasks.append(self.taskPic2)
 
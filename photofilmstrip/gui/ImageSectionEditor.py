@@ -601,39 +601,57 @@ class ImageSectionEditor(wx.Panel, Observer):
 
 class ScaleThread(threading.Thread):
 
-    def __init__(self, picture, callbackOnDone):
+    def __init__(self, picture, level, width, callbackOnDone):
         threading.Thread.__init__(self, name="reload %s" % picture.GetFilename())
         self._picture = picture
+        self._level = level
+        self._width = width
         self._abort = False
         self._callbackOnDone = callbackOnDone
 
     def Abort(self):
         self._abort = True
 
+    def GetLevel(self):
+        return self._level
+
     def run(self):
-        self._abort = False
-        for __ in range(20):
+        # the user may select another picture right away
+        for __ in range(3):
             time.sleep(0.1)
             if self._abort:
                 return
 
-        pilImg = PILBackend.GetImage(self._picture)
-        wxImg = wx.Image(PILBackend.ImageToStream(pilImg), wx.BITMAP_TYPE_JPEG)
+        if self._width is None:
+            pilImg = PILBackend.GetImage(self._picture)
+            wxImg = ImageCache.ToWxImage(pilImg)
+        else:
+            wxImg = ImageCache().GetImage(self._picture, self._width)
 
         if not self._abort:
-            self._callbackOnDone(wxImg)
+            self._callbackOnDone(self, wxImg)
 
 
 class ImageProxy(Observable):
+    '''
+    Provides the picture for the ImageSectionEditor in several resolutions.
+    The preview sizes of the ImageCache are shared by all proxies, the full
+    resolution is only kept for the current picture. Scale() uses the
+    smallest loaded level that covers the requested size and loads the next
+    level in the background if none does.
+    '''
+
+    LEVELS = ImageCache.PREVIEW_SIZES + (None,)
 
     def __init__(self):
         Observable.__init__(self)
         self._curThread = None
 
         self._picture = None
-        self._wxImg = None
+        self._levels = {}
         self._wxBmp = None
         self._curSize = -1, -1
+        self._curScale = None
 
     def Destroy(self):
         if self._curThread:
@@ -643,22 +661,51 @@ class ImageProxy(Observable):
     def IsOk(self):
         return self._picture is not None
 
-    def OnThreadDone(self, img):
-        self._wxImg = img
-        wx.CallAfter(self.Notify)
+    def OnThreadDone(self, thread, img):
+        wx.CallAfter(self.__OnLevelLoaded, thread, img)
+
+    def __OnLevelLoaded(self, thread, img):
+        # ignore threads that were replaced in the meantime
+        if thread is not self._curThread:
+            return
+        self._curThread = None
+        self._levels[thread.GetLevel()] = img
+        self.Notify()
 
     def SetPicture(self, picture):
+        if self._curThread is not None:
+            self._curThread.Abort()
+            self._curThread = None
+
         self._picture = picture
+        self._levels = {}
+        self._curScale = None
         if self._picture is not None:
-            self._wxImg = ImageCache().GetImage(picture)
+            self._levels[0] = ImageCache().GetImage(picture)
+            for level, width in enumerate(ImageCache.PREVIEW_SIZES[1:], 1):
+                wxImg = ImageCache().GetCachedImage(picture, width)
+                if wxImg is not None:
+                    self._levels[level] = wxImg
 
-            if self._curThread is not None:
-                self._curThread.Abort()
+        self.Notify()
 
-            self._curThread = ScaleThread(picture, self.OnThreadDone)
-            self._curThread.start()
+    def __LoadLevel(self, level):
+        if level >= len(self.LEVELS) or level in self._levels:
+            return
+        if self._curThread is not None and self._curThread.GetLevel() >= level:
+            return
 
-        self.Notify()
+        # a preview level that is not smaller than the picture is the last
+        largest = self._levels[max(self._levels)]
+        if largest.GetWidth() >= self._picture.GetWidth() and \
+                largest.GetHeight() >= self._picture.GetHeight():
+            return
+
+        if self._curThread is not None:
+            self._curThread.Abort()
+        self._curThread = ScaleThread(self._picture, level, self.LEVELS[level],
+                                      self.OnThreadDone)
+        self._curThread.start()
 
     def GetWidth(self):
         return self._picture.GetWidth()
@@ -672,8 +719,21 @@ class ImageProxy(Observable):
     def Scale(self, width, height):
         if not (width > 0 and height > 0):
             return
-        img = self._wxImg.Scale(width, height)
-        self._wxBmp = img.ConvertToBitmap()
+        bmpWidth = max(1, int(round(width)))
+        bmpHeight = max(1, int(round(height)))
+
+        level = None
+        for level in sorted(self._levels):
+            img = self._levels[level]
+            if img.GetWidth() >= bmpWidth and img.GetHeight() >= bmpHeight:
+                break
+        else:
+            self.__LoadLevel(level + 1)
+
+        if self._curScale != (level, bmpWidth, bmpHeight):
+            img = self._levels[level].Scale(bmpWidth, bmpHeight)
+            self._wxBmp = img.ConvertToBitmap()
+            self._curScale = level, bmpWidth, bmpHeight
         self._curSize = width, height
 
     def GetCurrentSize(self):
@@ -5,12 +5,14 @@
 # Copyright (C) 2008 Jens Goepfert
 #
 
+import bisect
 import os
 
 import wx
 
 from photofilmstrip.gui.util.ImageCache import ImageCache, EVT_THUMB_READY
 from photofilmstrip.gui.helper import ChopText
+from photofilmstrip.lib.common.LruCache import LruCache
 
 EVT_CHANGED_TYPE = wx.NewEventType()
 EVT_CHANGED = wx.PyEventBinder(EVT_CHANGED_TYPE, 1)
@@ -35,6 +37,8 @@ class PhotoFilmStripList(wx.ScrolledWindow):
 
     STRIP_HEIGHT = THUMB_HEIGHT + 2 * BORDER
 
+    DIA_CACHE_BYTES = 32 * 1024 * 1024
+
     def __init__(self, parent, id=-1,
                  pos=wx.DefaultPosition, size=wx.DefaultSize,
                  style=wx.HSCROLL | wx.VSCROLL, name='PhotoFilmStripList'):
@@ -46,6 +50,13 @@ class PhotoFilmStripList(wx.ScrolledWindow):
 
         self.__frozen = False
         self.__pictures = []
+        # width of each dia and x position of each dia, the last offset is
+        # the width of the whole strip; offsets from __dirtyIdx on are stale
+        self.__widths = []
+        self.__offsets = [0]
+        self.__dirtyIdx = 0
+        self.__widthsPending = False
+        self.__diaCache = LruCache(self.DIA_CACHE_BYTES, ImageCache.GetItemBytes)
         self.__selIdxs = []
         self.__hvrIdx = -1
 
@@ -82,8 +93,40 @@ class PhotoFilmStripList(wx.ScrolledWindow):
         return self.__frozen
 
     def __OnThumbReady(self, event):
+        # update the layout once for all thumbnails that are ready
+        if not self.__widthsPending:
+            self.__widthsPending = True
+            wx.CallAfter(self.__UpdateWidths)
+
+    def __UpdateWidths(self):
+        self.__widthsPending = False
+        if not self:
+            return
+        for idx, pic in enumerate(self.__pictures):
+            width = self.__GetDiaWidth(pic)
+            if width != self.__widths[idx]:
+                self.__widths[idx] = width
+                self.__Invalidate(idx)
         self.__UpdateVirtualSize()
 
+    def __GetDiaWidth(self, pic):
+        # if the picture cannot be loaded the width may be -1
+        return ImageCache().GetThumbSize(pic)[0] + self.GAP
+
+    def __Invalidate(self, idx):
+        self.__dirtyIdx = min(self.__dirtyIdx, idx)
+
+    def __GetOffsets(self):
+        if self.__dirtyIdx < len(self.__widths) or \
+                len(self.__offsets) != len(self.__widths) + 1:
+            del self.__offsets[self.__dirtyIdx + 1:]
+            offset = self.__offsets[self.__dirtyIdx]
+            for width in self.__widths[self.__dirtyIdx:]:
+                offset += width
+                self.__offsets.append(offset)
+            self.__dirtyIdx = len(self.__widths)
+        return self.__offsets
+
     def OnPaint(self, event):
         pdc = wx.BufferedPaintDC(self)
         try:
@@ -96,44 +139,72 @@ class PhotoFilmStripList(wx.ScrolledWindow):
 
         vx = self.GetViewStart()[0]
         clientWidth = self.GetClientSize()[0]
+        offsets = self.__GetOffsets()
 
-        diaRect = wx.Rect(-vx, 0, 0, self.STRIP_HEIGHT)
-
-        for idx, pic in enumerate(self.__pictures):
-            bmp = ImageCache().GetThumbBmp(pic)
-
-            # if the picture cannot be loaded GetWidth may return -1
-            bmpWidth = bmp.GetWidth()
-
-            diaRect.SetWidth(bmpWidth + self.GAP)
-
-            if idx == self.__dropIdx and self.__dragIdx > idx:
-                diaRect.Offset(self.__dragBmp.GetWidth(), 0)
+        # while dragging the dragged dia is removed and a gap is inserted at
+        # the drop position, the dias in between are shifted
+        dragWidth = 0
+        if self.__dragIdx != -1:
+            dragWidth = self.__dragBmp.GetWidth()
+
+        idx = max(0, bisect.bisect_right(offsets, vx - dragWidth) - 1)
+        visiblePics = []
+        while idx < len(self.__pictures):
+            pic = self.__pictures[idx]
+            diaNo = idx + 1
+            shift = 0
+            if self.__dropIdx <= idx < self.__dragIdx:
+                diaNo += 1
+                shift = dragWidth
+            if self.__dragIdx < idx <= self.__dropIdx:
+                diaNo -= 1
+                shift = -dragWidth
+
+            diaRect = wx.Rect(offsets[idx] + shift - vx, 0,
+                              self.__widths[idx], self.STRIP_HEIGHT)
+            if diaRect.left > clientWidth:
+                break
 
             if diaRect.right + 1 >= 0 and idx != self.__dragIdx:
-                if diaRect.left <= clientWidth:
-                    label = os.path.splitext(os.path.basename(pic.GetFilename()))[0]
-                    diaNo = idx + 1
-
-                    if idx >= self.__dropIdx and idx < self.__dragIdx:
-                        diaNo += 1
-
-                    if idx <= self.__dropIdx and idx > self.__dragIdx:
-                        diaNo -= 1
-
-                    self.__DrawDia(dc, diaRect, diaRect.x + vx, bmp, str(diaNo), label, idx in self.__selIdxs, idx == self.__hvrIdx)
-                else:
-                    break
+                visiblePics.append(pic)
+                diaBmp = self.__GetDiaBmp(pic, diaRect.width, diaRect.x + vx,
+                                          str(diaNo),
+                                          idx in self.__selIdxs,
+                                          idx == self.__hvrIdx)
+                dc.DrawBitmap(diaBmp, diaRect.x, diaRect.y)
+            idx += 1
 
-            if idx != self.__dragIdx or self.__dragIdx == self.__dropIdx:
-                diaRect.Offset(diaRect.width, 0)
-
-            if idx == self.__dropIdx and self.__dragIdx < idx:
-                diaRect.Offset(self.__dragBmp.GetWidth(), 0)
+        ImageCache().SetVisiblePictures(visiblePics)
 
         if self.__dragIdx != -1:
             dc.DrawBitmap(self.__dragBmp, self.__dragX - self.__dragOffX - vx, 0, True)
 
+    def __GetDiaBmp(self, pic, width, holeOffset, diaNo, selected, highlighted):
+        '''
+        Returns the composed dia from the cache or draws it. The holes only
+        depend on the position modulo their distance.
+        '''
+        thumbBmp = ImageCache().GetThumbBmp(pic)
+        label = os.path.splitext(os.path.basename(pic.GetFilename()))[0]
+        holePhase = holeOffset % (self.HOLE_WIDTH + self.HOLE_PADDING)
+        key = (pic.GetKey(), thumbBmp is ImageCache().thumb,
+               width, holePhase, diaNo, label, selected, highlighted)
+
+        bmp = self.__diaCache.Get(key)
+        if bmp is None:
+            rect = wx.Rect(0, 0, width, self.STRIP_HEIGHT)
+            bmp = wx.Bitmap(max(1, width), self.STRIP_HEIGHT)
+            dc = wx.MemoryDC(bmp)
+            try:
+                dc = wx.GCDC(dc)
+            except Exception:
+                pass
+            self.__DrawDia(dc, rect, holePhase, thumbBmp, diaNo, label,
+                           selected, highlighted)
+            del dc
+            self.__diaCache.Put(key, bmp)
+        return bmp
+
     def __CreateDiaBmp(self, picIdx, selected=False, highlighted=False, dropIdx=None):
         pic = self.__pictures[picIdx]
         thumbBmp = ImageCache().GetThumbBmp(pic)
@@ -361,12 +432,7 @@ class PhotoFilmStripList(wx.ScrolledWindow):
             self.Scroll(rect.GetRight() - ch, 0)
 
     def __UpdateVirtualSize(self):
-        width = 0
-        for pic in self.__pictures:
-            bmp = ImageCache().GetThumbBmp(pic)
-            # if the picture cannot be loaded GetWidth may return -1
-            width += bmp.GetWidth() + self.GAP
-
+        width = self.__GetOffsets()[-1]
         self.SetVirtualSize((width, self.STRIP_HEIGHT))
         self.Refresh()
 
@@ -377,27 +443,18 @@ class PhotoFilmStripList(wx.ScrolledWindow):
         return thumbWidth, thumbHeight
 
     def GetDiaRect(self, idx):
-        sx = 0
-        for picIdx, pic in enumerate(self.__pictures):
-            thumbWidth = ImageCache().GetThumbBmp(pic).GetWidth()
-
-            if idx == picIdx:
-                rect = wx.Rect(sx, 0, thumbWidth + self.GAP, self.STRIP_HEIGHT)
-                return rect
-
-            sx += thumbWidth + self.GAP
+        if 0 <= idx < len(self.__pictures):
+            offsets = self.__GetOffsets()
+            return wx.Rect(offsets[idx], 0, self.__widths[idx], self.STRIP_HEIGHT)
 
     def HitTest(self, pos):
         pos = self.CalcUnscrolledPosition(pos)
-        sx = 0
-        for idx, pic in enumerate(self.__pictures):
-            thumbWidth = ImageCache().GetThumbBmp(pic).GetWidth()
-
-            rect = wx.Rect(sx, 0, thumbWidth + self.GAP, self.STRIP_HEIGHT)
-            if rect.Contains(pos):
-                return idx
-
-            sx += thumbWidth + self.GAP
+        if pos.y < 0 or pos.y >= self.STRIP_HEIGHT:
+            return -1
+        offsets = self.__GetOffsets()
+        idx = bisect.bisect_right(offsets, pos.x) - 1
+        if 0 <= idx < len(self.__pictures) and pos.x < offsets[idx + 1]:
+            return idx
         return -1
 
 #    def AddPicture(self, pic):
@@ -406,7 +463,10 @@ class PhotoFilmStripList(wx.ScrolledWindow):
 #        self._SendChangedEvent()
 
     def InsertPicture(self, idx, pic):
+        idx = min(idx, len(self.__pictures))
         self.__pictures.insert(idx, pic)
+        self.__widths.insert(idx, self.__GetDiaWidth(pic))
+        self.__Invalidate(idx)
 
         for i in range(len(self.__selIdxs)):
             if self.__selIdxs[i] >= idx \
@@ -418,7 +478,10 @@ class PhotoFilmStripList(wx.ScrolledWindow):
         self._SendChangedEvent()
 
     def DeleteItem(self, idx):
-        self.__pictures.pop(idx)
+        pic = self.__pictures.pop(idx)
+        self.__widths.pop(idx)
+        self.__Invalidate(idx)
+        ImageCache().CancelPicture(pic)
 
         firstSel = 0
         if self.__selIdxs:
@@ -454,8 +517,12 @@ class PhotoFilmStripList(wx.ScrolledWindow):
         self.GetEventHandler().ProcessEvent(evt)
 
     def DeleteAllItems(self):
+        for pic in self.__pictures:
+            ImageCache().CancelPicture(pic)
         self.__selIdxs = []
         self.__pictures = []
+        self.__widths = []
+        self.__Invalidate(0)
         self.__UpdateVirtualSize()
         self._SendChangedEvent()
 
@@ -471,7 +538,9 @@ class PhotoFilmStripList(wx.ScrolledWindow):
     def SetPicture(self, idx, pic):
         if idx in range(len(self.__pictures)):
             self.__pictures[idx] = pic
-            self.Refresh()
+            self.__widths[idx] = self.__GetDiaWidth(pic)
+            self.__Invalidate(idx)
+            self.__UpdateVirtualSize()
 
     def GetPictures(self):
         return self.__pictures[:]
@@ -520,6 +589,9 @@ class PhotoFilmStripList(wx.ScrolledWindow):
         picTo = self.__pictures[idxTo]
         self.__pictures[idxFrom] = picTo
         self.__pictures[idxTo] = picFrom
+        self.__widths[idxFrom], self.__widths[idxTo] = \
+            self.__widths[idxTo], self.__widths[idxFrom]
+        self.__Invalidate(min(idxFrom, idxTo))
 
         evt = None
         try:
@@ -539,6 +611,8 @@ class PhotoFilmStripList(wx.ScrolledWindow):
     def MovePicture(self, idxFrom, idxTo):
         pic = self.__pictures.pop(idxFrom)
         self.__pictures.insert(idxTo, pic)
+        self.__widths.insert(idxTo, self.__widths.pop(idxFrom))
+        self.__Invalidate(min(idxFrom, idxTo))
 
         evt = None
         try:
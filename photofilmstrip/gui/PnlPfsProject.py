@@ -14,6 +14,7 @@ from photofilmstrip.action.ActionAutoPath import ActionAutoPath
 from photofilmstrip.action.ActionCenterPath import ActionCenterPath
 from photofilmstrip.action.ActionRender import ActionRender
 
+from photofilmstrip.core.ImportJob import ImportJob
 from photofilmstrip.core.Renderer import RENDERERS
 from photofilmstrip.core.Picture import Picture
 from photofilmstrip.core.Project import Project
@@ -667,12 +668,43 @@ class PnlPfsProject(PnlEditorPage, Observer):
         if position is None:
             position = self.lvPics.GetItemCount()
 
-        self.lvPics.Freeze()
+        if autopath:
+            # read the pictures in the background and insert them as soon as
+            # they are ready, each batch after the picture before it because
+            # the strip may be edited in the meantime
+            prevPic = self.lvPics.GetPicture(position - 1) if position > 0 else None
+
+            def _OnReady(readyPics, idx):
+                afterPic = pics[idx - 1] if idx > 0 else prevPic
+                wx.CallAfter(self.__OnPicturesImported, readyPics, afterPic)
+            JobManager().EnqueueContext(ImportJob(pics, _OnReady))
+            return
+
+        self.__InsertPictures(pics, position)
+
+    def __OnPicturesImported(self, pics, afterPic):
+        if not self:
+            # panel closed in the meantime
+            return
         for pic in pics:
-            if autopath:
-                actAp = ActionAutoPath(pic, self.__project.GetAspect())
-                actAp.Execute()
+            # picture sizes are cached now
+            actAp = ActionAutoPath(pic, self.__project.GetAspect())
+            actAp.Execute()
 
+        if afterPic is None:
+            position = 0
+        else:
+            # appended if afterPic was removed in the meantime
+            position = self.lvPics.GetItemCount()
+            for idx, pic in enumerate(self.lvPics.GetPictures()):
+                if pic is afterPic:
+                    position = idx + 1
+                    break
+        self.__InsertPictures(pics, position)
+
+    def __InsertPictures(self, pics, position):
+        self.lvPics.Freeze()
+        for pic in pics:
             self.lvPics.InsertPicture(position, pic)
             position += 1
 
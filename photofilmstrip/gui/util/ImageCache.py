@@ -5,35 +5,78 @@
 # Copyright (C) 2011 Jens Goepfert
 #
 
+import collections
+import os
 import threading
-import time
 
 import wx
 
+from photofilmstrip.lib.common.LruCache import LruCache
 from photofilmstrip.lib.common.Singleton import Singleton
 from photofilmstrip.lib.common.ObserverPattern import Observer
 
-from photofilmstrip.core import PILBackend
+from photofilmstrip.core.ImageSourceCache import ImageSourceCache
+from photofilmstrip.core.PictureCache import PictureCache
+from photofilmstrip.lib.Settings import Settings
 from photofilmstrip.lib.DestructionManager import Destroyable
 
 
 class ImageCache(Singleton, Observer):
+    '''
+    Holds the thumbnails of the filmstrip and the preview images of the
+    editor. PIL thumbnails, wx images and wx bitmaps share one memory budget,
+    the least recently used are evicted first and created again on demand.
+    The sizes of the thumbnails are kept, so the layout of the filmstrip does
+    not depend on evicted bitmaps.
+    '''
 
     SIZE = 400
+    PREVIEW_SIZES = (SIZE, 1600)
     THUMB_SIZE = 100
+    SCALE_WORKERS = 4
+    DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+    PIL = "pil"
+    WX_IMAGE = "wxImage"
+    WX_BITMAP = "wxBitmap"
 
     def __init__(self):
         self._picRegistry = {}
-        self._wxImgCache = {}
-        self._wxBmpCache = {}
-        self._pilCache = {}
-        self._inScalingQueue = object()
-
-        self.scaleThread = ScaleThread(self)
-        self.scaleThread.start()
+        self._scaleRequests = {}
+        self._thumbSizes = {}
+
+        maxBytes = ImageCache.DEFAULT_MAX_BYTES
+        cacheSize = Settings().GetPreviewCacheSize()
+        if cacheSize:
+            maxBytes = cacheSize * 1024 * 1024
+        self._cache = LruCache(maxBytes, ImageCache.GetItemBytes)
+
+        self.scaleQueue = ScaleQueue()
+        self.scaleThreads = []
+        for idx in range(max(1, min(ImageCache.SCALE_WORKERS,
+                                    os.cpu_count() or 1))):
+            scaleThread = ScaleThread(self, idx)
+            scaleThread.start()
+            self.scaleThreads.append(scaleThread)
         self.win = None
         self.thumb = None
 
+    @staticmethod
+    def GetItemBytes(item):
+        if isinstance(item, wx.Bitmap):
+            return item.GetWidth() * item.GetHeight() * 4
+        elif isinstance(item, wx.Image):
+            bands = 4 if item.HasAlpha() else 3
+            return item.GetWidth() * item.GetHeight() * bands
+        else:
+            return ImageSourceCache.GetImageBytes(item)
+
+    def GetBytes(self):
+        return self._cache.GetBytes()
+
+    def SetMaxBytes(self, maxBytes):
+        self._cache.SetMaxBytes(maxBytes)
+
     def RegisterWin(self, win):
         self.win = win
 
@@ -42,8 +85,9 @@ class ImageCache(Singleton, Observer):
             self.UpdatePicture(obj)
 
     def ClearCache(self):
-        self._wxImgCache.clear()
-        self._wxBmpCache.clear()
+        for cacheKey in self._cache.Keys():
+            if cacheKey[1] != ImageCache.PIL:
+                self._cache.Pop(cacheKey)
 
     def RegisterPicture(self, picture, pilThumb=None):
 #        if pilThumb is None:
@@ -51,73 +95,191 @@ class ImageCache(Singleton, Observer):
 
         key = picture.GetKey()
         self._picRegistry[key] = picture
-        self._pilCache[key] = pilThumb
+        self._scaleRequests.pop(key, None)
+        if pilThumb is None:
+            self._cache.Pop((key, ImageCache.PIL))
+        else:
+            self._thumbSizes[key] = pilThumb.size
+            self._cache.Put((key, ImageCache.PIL), pilThumb)
 
         picture.AddObserver(self)
 
     def UpdatePicture(self, picture):
         key = picture.GetKey()
-        if key in self._wxImgCache:
-            del self._wxImgCache[key]
-        if key in self._wxBmpCache:
-            del self._wxBmpCache[key]
-        if key in self._pilCache:
-            del self._pilCache[key]
+        for width in ImageCache.PREVIEW_SIZES:
+            self._cache.Pop((key, ImageCache.WX_IMAGE, width))
+        self._cache.Pop((key, ImageCache.WX_BITMAP))
+        self._thumbSizes.pop(key, None)
 
         self.RegisterPicture(picture)
 
-    def GetImage(self, picture):
+    def CancelPicture(self, picture):
+        '''
+        Drops a pending thumbnail request, e.g. if the picture was removed.
+        '''
+        key = picture.GetKey()
+        self.scaleQueue.Cancel(key)
+        self._scaleRequests.pop(key, None)
+
+    def SetVisiblePictures(self, pictures):
+        '''
+        Thumbnails of the given pictures are created before all others.
+        '''
+        self.scaleQueue.SetVisible([pic.GetKey() for pic in pictures])
+
+    def ScaleDone(self, request, pilImg):
+        '''
+        Called by the ScaleThreads. The result is dropped if the request was
+        canceled or the picture changed in the meantime.
+        '''
+        picture = request.GetPicture()
         key = picture.GetKey()
-        if key not in self._wxImgCache:
-            pilImg = PILBackend.GetThumbnail(picture, width=ImageCache.SIZE)
-            wxImg = wx.Image(PILBackend.ImageToStream(pilImg), wx.BITMAP_TYPE_JPEG)
-            self._wxImgCache[key] = wxImg
-        return self._wxImgCache[key]
+        if self._scaleRequests.get(key) is not request:
+            return
+        self.RegisterPicture(picture, pilImg)
+
+        if self.win:
+            evt = ThumbnailReadyEvent(picture)
+            wx.PostEvent(self.win, evt)
+
+    def GetImage(self, picture, width=None):
+        '''
+        Returns a preview of the picture with the given width, which must be
+        one of PREVIEW_SIZES. Pictures smaller than width are not enlarged.
+        '''
+        if width is None:
+            width = ImageCache.SIZE
+        cacheKey = (picture.GetKey(), ImageCache.WX_IMAGE, width)
+        wxImg = self._cache.Get(cacheKey)
+        if wxImg is None:
+            pilImg = PictureCache().GetThumbnail(picture, width=width)
+            wxImg = ImageCache.ToWxImage(pilImg)
+            self._cache.Put(cacheKey, wxImg)
+        return wxImg
+
+    def GetCachedImage(self, picture, width):
+        '''
+        Same as GetImage() but returns None instead of creating the preview.
+        '''
+        return self._cache.Get((picture.GetKey(), ImageCache.WX_IMAGE, width))
 
     def GetThumbBmp(self, picture):
         key = picture.GetKey()
-        if key not in self._wxBmpCache:
-            pilImg = self._pilCache.get(key)
+        bmp = self._cache.Get((key, ImageCache.WX_BITMAP))
+        if bmp is None:
+            pilImg = self._cache.Get((key, ImageCache.PIL))
             if pilImg is None:
-                self._pilCache[key] = self._inScalingQueue
-                self.scaleThread.queue.append(picture)
-                return self.thumb
-            elif pilImg is self._inScalingQueue:
+                if key not in self._scaleRequests:
+                    request = ScaleRequest(picture)
+                    self._scaleRequests[key] = request
+                    self.scaleQueue.Put(key, request)
                 return self.thumb
             else:
-#                pilImg = self._pilCache[key]
-                wxImg = wx.Image(PILBackend.ImageToStream(pilImg), wx.BITMAP_TYPE_JPEG)
-                self._wxBmpCache[key] = wxImg.ConvertToBitmap()
-        return self._wxBmpCache[key]
+                wxImg = ImageCache.ToWxImage(pilImg)
+                bmp = wxImg.ConvertToBitmap()
+                self._cache.Put((key, ImageCache.WX_BITMAP), bmp)
+        return bmp
+
+    def GetThumbSize(self, picture):
+        '''
+        Returns the size of the thumbnail without creating a bitmap or
+        requesting the thumbnail. Until the thumbnail is scaled the size is
+        computed from the size of the picture or the placeholder is used.
+        '''
+        size = self._thumbSizes.get(picture.GetKey())
+        if size is not None:
+            return size
+
+        if picture.GetWidth() > 0 and picture.GetHeight() > 0:
+            aspect = picture.GetWidth() / picture.GetHeight()
+            return (int(round(ImageCache.THUMB_SIZE * aspect)),
+                    ImageCache.THUMB_SIZE)
+        elif self.thumb is not None:
+            return self.thumb.GetWidth(), self.thumb.GetHeight()
+        else:
+            return ImageCache.THUMB_SIZE, ImageCache.THUMB_SIZE
+
+    @staticmethod
+    def ToWxImage(pilImg):
+        if pilImg.mode != "RGB":
+            pilImg = pilImg.convert("RGB")
+        width, height = pilImg.size
+        return wx.Image(width, height, pilImg.tobytes())
+
+
+class ScaleRequest:
+
+    def __init__(self, picture):
+        self.__picture = picture
+
+    def GetPicture(self):
+        return self.__picture
 
 
-class ScaleThread(threading.Thread, Destroyable):
+class ScaleQueue(Destroyable):
+    '''
+    Holds the pending thumbnail requests. Requests of visible pictures are
+    handed out first, all others in the order they were made.
+    '''
 
-    def __init__(self, imgCache):
-        threading.Thread.__init__(self, name="ScaleThread")
+    def __init__(self):
         Destroyable.__init__(self)
-        self.imgCache = imgCache
-        self.active = True
-        self.queue = []
+        self.__cond = threading.Condition()
+        self.__pending = collections.OrderedDict()
+        self.__visible = []
+        self.__active = True
 
     def Destroy(self):
-        self.active = False
+        with self.__cond:
+            self.__active = False
+            self.__pending.clear()
+            self.__cond.notify_all()
+
+    def Put(self, key, request):
+        with self.__cond:
+            self.__pending[key] = request
+            self.__cond.notify()
+
+    def Cancel(self, key):
+        with self.__cond:
+            self.__pending.pop(key, None)
+
+    def SetVisible(self, keys):
+        with self.__cond:
+            self.__visible = keys
+
+    def Get(self):
+        '''
+        Blocks until a request is available. Returns None if the queue was
+        destroyed.
+        '''
+        with self.__cond:
+            while self.__active and not self.__pending:
+                self.__cond.wait()
+            if not self.__active:
+                return None
+
+            for key in self.__visible:
+                if key in self.__pending:
+                    return self.__pending.pop(key)
+            return self.__pending.popitem(last=False)[1]
+
+
+class ScaleThread(threading.Thread):
+
+    def __init__(self, imgCache, idx):
+        threading.Thread.__init__(self, name="ScaleThread-%d" % idx)
+        self.imgCache = imgCache
 
     def run(self):
-        while self.active:
-            pic = None
-            try:
-                pic = self.queue.pop(0)
-            except IndexError:
-                time.sleep(0.1)
-                continue
-
-            pilImg = PILBackend.GetThumbnail(pic, height=ImageCache.THUMB_SIZE)
-            self.imgCache.RegisterPicture(pic, pilImg)
-
-            if self.imgCache.win:
-                evt = ThumbnailReadyEvent(pic)
-                wx.PostEvent(self.imgCache.win, evt)
+        while True:
+            request = self.imgCache.scaleQueue.Get()
+            if request is None:
+                break
+
+            pilImg = PictureCache().GetThumbnail(request.GetPicture(),
+                                                 height=ImageCache.THUMB_SIZE)
+            self.imgCache.ScaleDone(request, pilImg)
 
 
 _EVT_THUMB_READY_TYPE = wx.NewEventType()
@@ -155,6 +155,110 @@ class Settings(Singleton):
                 pass
         return None
 
+    def SetRenderProcesses(self, value):
+        self.Load()
+        self.cp.set("General", "RenderProcesses", str(int(value)))
+        self.Save()
+
+    def GetRenderProcesses(self):
+        self.Load()
+        if self.cp.has_option("General", "RenderProcesses"):
+            try:
+                return self.cp.getboolean("General", "RenderProcesses")
+            except:
+                pass
+        return False
+
+    def SetRenderCacheSize(self, megaBytes):
+        self.Load()
+        self.cp.set("General", "RenderCacheSize", str(megaBytes))
+        self.Save()
+
+    def GetRenderCacheSize(self):
+        '''
+        Returns the memory budget in MB for decoded pictures while rendering
+        or None if not configured.
+        '''
+        self.Load()
+        if self.cp.has_option("General", "RenderCacheSize"):
+            try:
+                return self.cp.getint("General", "RenderCacheSize")
+            except:
+                pass
+        return None
+
+    def SetRenderReorderWindow(self, frames):
+        self.Load()
+        self.cp.set("General", "RenderReorderWindow", str(frames))
+        self.Save()
+
+    def GetRenderReorderWindow(self):
+        '''
+        Returns the maximum number of frames the render workers may get ahead
+        of the renderer or None if not configured.
+        '''
+        self.Load()
+        if self.cp.has_option("General", "RenderReorderWindow"):
+            try:
+                return self.cp.getint("General", "RenderReorderWindow")
+            except:
+                pass
+        return None
+
+    def SetRenderQuantum(self, quantum):
+        self.Load()
+        self.cp.set("General", "RenderQuantum", str(quantum))
+        self.Save()
+
+    def GetRenderQuantum(self):
+        '''
+        Returns the grid in output pixels the motion paths are snapped to
+        while rendering or None if not configured.
+        '''
+        self.Load()
+        if self.cp.has_option("General", "RenderQuantum"):
+            try:
+                return self.cp.getfloat("General", "RenderQuantum")
+            except:
+                pass
+        return None
+
+    def SetPreviewCacheSize(self, megaBytes):
+        self.Load()
+        self.cp.set("General", "PreviewCacheSize", str(megaBytes))
+        self.Save()
+
+    def GetPreviewCacheSize(self):
+        '''
+        Returns the memory budget in MB for thumbnails and previews in the
+        user interface or None if not configured.
+        '''
+        self.Load()
+        if self.cp.has_option("General", "PreviewCacheSize"):
+            try:
+                return self.cp.getint("General", "PreviewCacheSize")
+            except:
+                pass
+        return None
+
+    def SetSegmentCacheSize(self, megaBytes):
+        self.Load()
+        self.cp.set("General", "SegmentCacheSize", str(megaBytes))
+        self.Save()
+
+    def GetSegmentCacheSize(self):
+        '''
+        Returns the disk budget in MB for encoded segments of renders or None
+        if not configured.
+        '''
+        self.Load()
+        if self.cp.has_option("General", "SegmentCacheSize"):
+            try:
+                return self.cp.getint("General", "SegmentCacheSize")
+            except:
+                pass
+        return None
+
     def SetLastKnownVersion(self, version):
         self.Load()
         self.cp.set("General", "LastKnownVersion", version)
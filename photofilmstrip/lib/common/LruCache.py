@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import collections
+import threading
+
+
+class LruCache:
+    '''
+    Keeps at most maxBytes of values. The size of a value is determined by
+    sizeFunc when it is stored. If the budget is exceeded the least recently
+    used values are evicted first. A single value larger than the budget is
+    kept until the next one is stored.
+    '''
+
+    def __init__(self, maxBytes, sizeFunc):
+        self.__maxBytes = maxBytes
+        self.__sizeFunc = sizeFunc
+        self.__values = collections.OrderedDict()
+        self.__bytes = 0
+        self.__peakBytes = 0
+        self.__evictions = 0
+        self.__lock = threading.Lock()
+
+    def GetMaxBytes(self):
+        return self.__maxBytes
+
+    def SetMaxBytes(self, maxBytes):
+        with self.__lock:
+            self.__maxBytes = maxBytes
+            self.__Evict()
+
+    def GetBytes(self):
+        return self.__bytes
+
+    def GetPeakBytes(self):
+        '''
+        Returns the largest number of bytes held at once, including a new
+        value before older ones were evicted for it.
+        '''
+        return self.__peakBytes
+
+    def GetEvictions(self):
+        return self.__evictions
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __contains__(self, key):
+        return key in self.__values
+
+    def Keys(self):
+        with self.__lock:
+            return list(self.__values)
+
+    def Get(self, key, default=None):
+        with self.__lock:
+            entry = self.__values.get(key)
+            if entry is None:
+                return default
+            self.__values.move_to_end(key)
+            return entry[0]
+
+    def Put(self, key, value):
+        size = self.__sizeFunc(value)
+        with self.__lock:
+            old = self.__values.pop(key, None)
+            if old is not None:
+                self.__bytes -= old[1]
+            self.__values[key] = (value, size)
+            self.__bytes += size
+            self.__peakBytes = max(self.__peakBytes, self.__bytes)
+            self.__Evict()
+
+    def Pop(self, key):
+        with self.__lock:
+            entry = self.__values.pop(key, None)
+            if entry is None:
+                return None
+            self.__bytes -= entry[1]
+            return entry[0]
+
+    def Clear(self):
+        with self.__lock:
+            self.__values.clear()
+            self.__bytes = 0
+
+    def __Evict(self):
+        while self.__bytes > self.__maxBytes and len(self.__values) > 1:
+            __, entry = self.__values.popitem(last=False)
+            self.__bytes -= entry[1]
+            self.__evictions += 1
@@ -13,6 +13,7 @@ from photofilmstrip.lib.DestructionManager import Destroyable
 
 from .IVisualJobManager import IVisualJobManager
 from .LogVisualJobManager import LogVisualJobManager
+from .ProcessPool import ProcessPool
 from .Worker import Worker, WorkerAbortSignal
 from .JobAbortedException import JobAbortedException
 
@@ -23,7 +24,7 @@ class _JobCtxGroup:
     JobContexts that are waiting to be processed.
     '''
 
-    def __init__(self, workers):
+    def __init__(self, workers, processPool=None):
         self.__idleQueue = queue.Queue()
 
         # holds the JobContext that is currently active
@@ -38,6 +39,9 @@ class _JobCtxGroup:
         # a list with workers working for this context group
         self.__workers = workers
 
+        # optional pool of processes the workloads may delegate work to
+        self.__processPool = processPool
+
         self.__lock = threading.Lock()
 
     def Put(self, jobContext):
@@ -114,6 +118,9 @@ class _JobCtxGroup:
     def Workers(self):
         return self.__workers
 
+    def ProcessPool(self):
+        return self.__processPool
+
 
 class JobManager(Singleton, Destroyable):
 
@@ -144,7 +151,12 @@ class JobManager(Singleton, Destroyable):
         if len(self.__visuals) == 0:
             self.__visuals.append(self.__defaultVisual)
 
-    def Init(self, workerCtxGroup=None, workerCount=None):
+    def Init(self, workerCtxGroup=None, workerCount=None, processes=False):
+        '''
+        Initializes a context group with the given number of worker threads.
+        If processes is True the group additionally gets a pool with the same
+        number of worker processes, see GetProcessPool().
+        '''
         if workerCtxGroup is None:
             workerCtxGroup = JobManager.DEFAULT_CTXGROUP_ID
         if workerCount is None:
@@ -153,6 +165,17 @@ class JobManager(Singleton, Destroyable):
         if workerCtxGroup in self.__jobCtxGroups:
             raise RuntimeError("group already initialized")
 
+        processPool = None
+        if processes:
+            if ProcessPool.IsAvailable():
+                self.__logger.debug("creating process pool for group %s",
+                                    workerCtxGroup)
+                processPool = ProcessPool(workerCount)
+            else:
+                self.__logger.warning("process pool not available, "
+                                      "group %s uses threads only",
+                                      workerCtxGroup)
+
         workers = []
         i = 0
         while i < workerCount:
@@ -162,12 +185,23 @@ class JobManager(Singleton, Destroyable):
 
             i += 1
 
-        jcGroup = _JobCtxGroup(workers)
+        jcGroup = _JobCtxGroup(workers, processPool)
         self.__jobCtxGroups[workerCtxGroup] = jcGroup
 
         for worker in workers:
             worker.start()
 
+    def GetProcessPool(self, workerCtxGroup):
+        '''
+        Returns the ProcessPool of the given context group or None if the
+        group was initialized without processes.
+        :param workerCtxGroup:
+        '''
+        jcGroup = self.__jobCtxGroups.get(workerCtxGroup)
+        if jcGroup is None:
+            return None
+        return jcGroup.ProcessPool()
+
     def EnqueueContext(self, jobContext):
         if jobContext.GetGroupId() not in self.__jobCtxGroups:
             raise RuntimeError("job group %s not available" % jobContext.GetGroupId())
@@ -289,10 +323,13 @@ class JobManager(Singleton, Destroyable):
             for worker in jcGroup.Workers():
                 self.__logger.debug("<%s> joining...", worker.getName())
                 worker.join(3)
-                if worker.isAlive():
+                if worker.is_alive():
                     self.__logger.warning("<%s> join failed", worker.getName())
                 else:
                     self.__logger.debug("<%s> joined!", worker.getName())
 
+            if jcGroup.ProcessPool() is not None:
+                jcGroup.ProcessPool().Destroy()
+
         self.__logger.debug("destroyed")
 
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import concurrent.futures
+import logging
+import multiprocessing
+
+try:
+    from multiprocessing import resource_tracker
+    from multiprocessing import shared_memory
+except ImportError:
+    resource_tracker = None
+    shared_memory = None
+
+
+class ProcessPool:
+    '''
+    A pool of worker processes that belongs to a context group of the
+    JobManager. Workloads running on the worker threads of that group can
+    delegate CPU bound calls to the pool, so they do not compete for the GIL.
+    Results of type bytes are passed back through shared memory instead of
+    the pipe of the executor. Large arguments can be passed with a
+    SharedBuffer.
+    '''
+
+    def __init__(self, processCount):
+        self.__logger = logging.getLogger("ProcessPool")
+        # the processes share the resource tracker of this process, so a
+        # SharedBuffer attached by a process is not removed when it exits
+        resource_tracker.ensure_running()
+        self.__executor = concurrent.futures.ProcessPoolExecutor(
+            processCount, mp_context=multiprocessing.get_context("fork"))
+
+        # forking a process with running threads is fragile, so start the
+        # processes right now while the caller is the only active thread
+        self.__executor.submit(_Noop).result()
+        self.__logger.debug("started %s processes", processCount)
+
+    @staticmethod
+    def IsAvailable():
+        '''
+        Returns True if shared memory and the fork start method are supported
+        on this platform.
+        '''
+        return shared_memory is not None and \
+            "fork" in multiprocessing.get_all_start_methods()
+
+    def Execute(self, func, *args):
+        '''
+        Calls func with the given args in one of the processes and blocks
+        until the result is available. func and args must be picklable.
+        '''
+        future = self.__executor.submit(_ExecuteInProcess, func, args)
+        result = future.result()
+        if isinstance(result, _SharedResult):
+            result = result.Fetch()
+        return result
+
+    def Destroy(self):
+        self.__executor.shutdown(wait=False)
+
+
+class SharedBuffer:
+    '''
+    Bytes in a shared memory block that the processes of the pool can read
+    without copying them. Only a reference is pickled. The block is released
+    by the creating process when the SharedBuffer is released or garbage
+    collected there, processes that still have it attached keep their
+    mapping until they close it.
+    '''
+
+    def __init__(self, data):
+        self.__shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        self.__shm.buf[:len(data)] = data
+        self.name = self.__shm.name
+        self.size = len(data)
+
+    def __getstate__(self):
+        return {"name": self.name, "size": self.size}
+
+    def __setstate__(self, state):
+        self.__shm = None
+        self.name = state["name"]
+        self.size = state["size"]
+
+    def __del__(self):
+        self.Release()
+
+    def Attach(self):
+        '''
+        Attaches the block within a process of the pool. The caller must
+        close the returned SharedMemory, its buf holds the data.
+        '''
+        return shared_memory.SharedMemory(name=self.name)
+
+    def Release(self):
+        if self.__shm is not None:
+            self.__shm.close()
+            self.__shm.unlink()
+            self.__shm = None
+
+
+class _SharedResult:
+    '''
+    Reference to a result that was written to a shared memory block by a
+    worker process. Fetch() copies the data and releases the block.
+    '''
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def Fetch(self):
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            return bytes(shm.buf[:self.size])
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def _Noop():
+    pass
+
+
+def _ExecuteInProcess(func, args):
+    result = func(*args)
+    if isinstance(result, bytes) and result:
+        shm = shared_memory.SharedMemory(create=True, size=len(result))
+        shm.buf[:len(result)] = result
+        shm.close()
+        # the block is released by the receiving process, do not let the
+        # resource tracker of this process remove it as leaked
+        resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=protected-access
+        result = _SharedResult(shm.name, len(result))
+    return result
@@ -67,3 +67,14 @@ def GetDataDir(subfolder):
             return os.path.abspath(dataDir)
     else:
         return None
+
+
+def GetCacheDir(subfolder):
+    if os.name == "nt":
+        basedir = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        basedir = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        basedir = os.environ.get("XDG_CACHE_HOME",
+                                 os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(basedir, "photofilmstrip", subfolder)
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+'''
+Measures the render throughput with synthetic projects.
+
+The benchmark creates N pictures with the given megapixels, saves them as a
+.pfs project, loads the project again and renders it through a RenderJob
+into a renderer that discards the frames. The result is printed as JSON:
+
+    python3 -m tests.benchmark_render --pictures 10 --megapixels 12
+'''
+
+import gettext
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from optparse import OptionParser
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from PIL import Image
+
+from photofilmstrip.core import PILBackend
+from photofilmstrip.core.Aspect import Aspect
+from photofilmstrip.core.BaseRenderer import BaseRenderer, \
+    FinalizeHandler, ImageDataFinalizeHandler, RawImageFinalizeHandler
+from photofilmstrip.core.OutputProfile import OutputProfile, FrameRate
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.Project import Project
+from photofilmstrip.core.ProjectFile import ProjectFile
+from photofilmstrip.core.RenderEngine import RenderEngineSlideshow, \
+    RenderEngineTimelapse
+from photofilmstrip.core.RenderJob import RenderJob
+from photofilmstrip.lib.DestructionManager import DestructionManager
+from photofilmstrip.lib.jobimpl.JobManager import JobManager
+
+MOVEMENTS = {"linear": Picture.MOVE_LINEAR,
+             "accel": Picture.MOVE_ACCEL,
+             "delayed": Picture.MOVE_DELAYED}
+
+TRANSITIONS = {"none": Picture.TRANS_NONE,
+               "fade": Picture.TRANS_FADE,
+               "roll": Picture.TRANS_ROLL}
+
+
+class StageTimer:
+    '''
+    Sums up the time spent in the stages of the render pipeline over all
+    worker threads.
+    '''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__times = {}
+        self.__calls = {}
+
+    def Add(self, stage, secs):
+        with self.__lock:
+            self.__times[stage] = self.__times.get(stage, 0.0) + secs
+            self.__calls[stage] = self.__calls.get(stage, 0) + 1
+
+    def Wrap(self, stage, func):
+        def _Timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.Add(stage, time.perf_counter() - start)
+        return _Timed
+
+    def GetResult(self):
+        with self.__lock:
+            return {stage: {"secs": round(secs, 4),
+                            "calls": self.__calls[stage]}
+                    for stage, secs in self.__times.items()}
+
+
+class TimedFinalizeHandler(FinalizeHandler):
+
+    def __init__(self, finalizeHandler, stageTimer):
+        self.__finalizeHandler = finalizeHandler
+        self.__stageTimer = stageTimer
+
+    def ProcessFinalize(self, pilImg):
+        start = time.perf_counter()
+        try:
+            return self.__finalizeHandler.ProcessFinalize(pilImg)
+        finally:
+            self.__stageTimer.Add("finalize", time.perf_counter() - start)
+
+
+class NullRenderer(BaseRenderer):
+    '''
+    Discards all frames, only counts them.
+    '''
+
+    def __init__(self, finalizeHandler, stageTimer=None):
+        BaseRenderer.__init__(self)
+        self.__finalizeHandler = finalizeHandler
+        self.__stageTimer = stageTimer
+        self.frames = 0
+        self.bytes = 0
+
+    @staticmethod
+    def GetName():
+        return "Null"
+
+    def GetFinalizeHandler(self):
+        if self.__stageTimer is None:
+            return self.__finalizeHandler
+        return TimedFinalizeHandler(self.__finalizeHandler, self.__stageTimer)
+
+    def Prepare(self):
+        pass
+
+    def ToSink(self, data):
+        start = time.perf_counter()
+        self.frames += 1
+        self.bytes += len(data)
+        if self.__stageTimer is not None:
+            self.__stageTimer.Add("sink", time.perf_counter() - start)
+
+    def Finalize(self):
+        pass
+
+    def ProcessAbort(self):
+        pass
+
+
+def CreatePictures(directory, count, megaPixels, timelapse):
+    '''
+    Creates count JPEG files with smooth random content in the given
+    directory and returns their filenames.
+    '''
+    width = int(math.sqrt(megaPixels * 1000000 * 3 / 2))
+    height = width * 2 // 3
+    filenames = []
+    for idx in range(count):
+        if timelapse:
+            filename = os.path.join(directory, "img_%04d.jpg" % (idx + 1))
+        else:
+            filename = os.path.join(directory, "pic%d.jpg" % idx)
+
+        bands = [Image.effect_noise((width // 16, height // 16), 64)
+                 for __ in range(3)]
+        img = Image.merge("RGB", bands).resize((width, height), Image.BICUBIC)
+        img.save(filename, "JPEG", quality=90)
+        filenames.append(filename)
+    return filenames
+
+
+def CreateProject(filename, picFiles, options):
+    project = Project(filename)
+    project.SetAspect(Aspect.ASPECT_16_9)
+    project.SetTimelapse(options.timelapse)
+
+    pics = []
+    for picFile in picFiles:
+        pic = Picture(picFile)
+        width, height = PILBackend.GetImageSize(picFile)
+        pic.SetWidth(width)
+        pic.SetHeight(height)
+
+        startRect = (0, 0, width, width * 9 // 16)
+        targetWidth = startRect[2] / options.zoom
+        targetHeight = startRect[3] / options.zoom
+        targetRect = (int((width - targetWidth) / 2),
+                      int((height - targetHeight) / 2),
+                      int(targetWidth), int(targetHeight))
+        pic.SetStartRect(startRect)
+        pic.SetTargetRect(targetRect)
+        pic.SetDuration(options.duration)
+        pic.SetMovement(MOVEMENTS[options.movement])
+        pic.SetTransition(TRANSITIONS[options.transition])
+        pic.SetTransitionDuration(options.transitionDuration)
+        pics.append(pic)
+    project.SetPictures(pics)
+
+    ProjectFile(project, filename).Save()
+
+
+def LoadProject(filename):
+    projectFile = ProjectFile(filename=filename)
+    if not projectFile.Load():
+        raise RuntimeError("cannot load %s" % filename)
+    return projectFile.GetProject()
+
+
+def Render(project, options, stageTimer):
+    frameRate = FrameRate(float(options.fps), "%d/1" % options.fps)
+    profile = OutputProfile("Benchmark", (options.width, options.height),
+                            frameRate, 8000)
+
+    if options.finalize == "raw":
+        finalizeHandler = RawImageFinalizeHandler()
+    else:
+        finalizeHandler = ImageDataFinalizeHandler("JPEG", 95)
+    renderer = NullRenderer(finalizeHandler, stageTimer)
+    renderer.Init(profile, project.GetAspect(), os.devnull)
+
+    if project.GetTimelapse():
+        renderEngine = RenderEngineTimelapse(profile, project.GetPictures(),
+                                             False)
+    else:
+        renderEngine = RenderEngineSlideshow(profile, project.GetPictures(),
+                                             False, None)
+    renderEngine.SetQuantum(options.quantum)
+
+    renderJob = RenderJob("Benchmark", renderer,
+                          renderEngine.IterTasks(),
+                          taskCount=renderEngine.GetTaskCount())
+
+    start = time.perf_counter()
+    JobManager().EnqueueContext(renderJob)
+    while not renderJob.IsDone():
+        time.sleep(0.01)
+    secs = time.perf_counter() - start
+
+    return renderer, renderJob, secs
+
+
+def GetPeakRss():
+    '''
+    Returns the peak resident set size of this process in bytes or None if
+    not available on this platform.
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+def main():
+    parser = OptionParser(usage="python3 -m tests.benchmark_render [options]")
+    parser.add_option("--pictures", type="int", default=5)
+    parser.add_option("--megapixels", type="float", default=12)
+    parser.add_option("--duration", type="float", default=4.0,
+                      help="seconds per picture")
+    parser.add_option("--transition", choices=sorted(TRANSITIONS),
+                      default="fade")
+    parser.add_option("--transition-duration", dest="transitionDuration",
+                      type="float", default=1.0)
+    parser.add_option("--movement", choices=sorted(MOVEMENTS),
+                      default="accel")
+    parser.add_option("--zoom", type="float", default=2.0,
+                      help="zoom factor between start and target, 1 for stills")
+    parser.add_option("--timelapse", action="store_true", default=False)
+    parser.add_option("--width", type="int", default=1280)
+    parser.add_option("--height", type="int", default=720)
+    parser.add_option("--fps", type="int", default=25)
+    parser.add_option("--workers", type="int", default=None)
+    parser.add_option("--processes", action="store_true", default=False,
+                      help="render in worker processes, "
+                           "disables the per stage timings")
+    parser.add_option("--finalize", choices=["jpeg", "raw"], default="raw")
+    parser.add_option("--quantum", type="float", default=None)
+    parser.add_option("--output", default=None,
+                      help="write the JSON result to this file")
+    options = parser.parse_args()[0]
+
+    gettext.install("photofilmstrip")
+
+    stageTimer = None
+    if not options.processes:
+        stageTimer = StageTimer()
+        PILBackend.GetSourceImage = stageTimer.Wrap("load",
+                                                    PILBackend.GetSourceImage)
+        PILBackend.CropAndResize = stageTimer.Wrap("cropResize",
+                                                   PILBackend.CropAndResize)
+        PILBackend.Transition = stageTimer.Wrap("transition",
+                                                PILBackend.Transition)
+
+    JobManager().Init("render", options.workers, options.processes)
+
+    tmpDir = tempfile.mkdtemp(prefix="pfs-benchmark-")
+    try:
+        start = time.perf_counter()
+        picFiles = CreatePictures(tmpDir, options.pictures,
+                                  options.megapixels, options.timelapse)
+        projectFilename = os.path.join(tmpDir, "benchmark.pfs")
+        CreateProject(projectFilename, picFiles, options)
+        project = LoadProject(projectFilename)
+        setupSecs = time.perf_counter() - start
+
+        renderer, renderJob, secs = Render(project, options, stageTimer)
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        # also stops the threads of the ImageCache that loading the project
+        # has started, like AppMixin does
+        DestructionManager().Destroy()
+
+    result = {"options": vars(options),
+              "setupSecs": round(setupSecs, 3),
+              "renderSecs": round(secs, 3),
+              "frames": renderer.frames,
+              "framesPerSec": round(renderer.frames / secs, 2) if secs else None,
+              "sinkBytes": renderer.bytes,
+              "stages": stageTimer.GetResult() if stageTimer else None,
+              "renderJob": renderJob.GetStatistics(),
+              "imageCache": renderJob.imageCache.GetStatistics(),
+              "peakRss": GetPeakRss(),
+              # the worker processes are not included
+              "peakRssScope": "parent" if options.processes else "process"}
+
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as fd:
+            fd.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
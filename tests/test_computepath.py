@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import unittest
+
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.RenderEngine import ComputePath, \
+    LinearMovement, AccelMovement, DelayedMovement
+
+
+class TestComputePath(unittest.TestCase):
+
+    def setUp(self):
+        self.pic = Picture("test.jpg")
+        self.pic.SetStartRect((0, 0, 4000, 2250))
+        self.pic.SetTargetRect((1000, 500, 1280, 720))
+
+    def _ScalarPath(self, clazz, picCount):
+        start = self.pic.GetStartRect()
+        target = self.pic.GetTargetRect()
+        movements = []
+        for idx in range(2):
+            s0 = start[idx] + start[idx + 2] / 2.0
+            s1 = target[idx] + target[idx + 2] / 2.0
+            movements.append(clazz(s1 - s0, picCount, s0))
+        for idx in range(2, 4):
+            movements.append(clazz(target[idx] - start[idx], picCount, start[idx]))
+
+        result = []
+        for step in range(picCount):
+            px, py, width, height = [m.Get(step) for m in movements]
+            result.append((px - width / 2.0, py - height / 2.0, width, height))
+        return result
+
+    def _Check(self, movement, clazz):
+        self.pic.SetMovement(movement)
+        for picCount in (1, 2, 7, 175):
+            pathRects = ComputePath(self.pic, picCount).GetPathRects()
+            self.assertEqual(pathRects.shape, (picCount, 4))
+            expected = self._ScalarPath(clazz, picCount)
+            for rect, expRect in zip(pathRects.tolist(), expected):
+                for value, expValue in zip(rect, expRect):
+                    self.assertAlmostEqual(value, expValue, places=6)
+
+    def testLinear(self):
+        self._Check(Picture.MOVE_LINEAR, LinearMovement)
+
+    def testAccel(self):
+        self._Check(Picture.MOVE_ACCEL, AccelMovement)
+
+    def testDelayed(self):
+        self._Check(Picture.MOVE_DELAYED, DelayedMovement)
+
+    def testStartAndTarget(self):
+        self.pic.SetMovement(Picture.MOVE_LINEAR)
+        pathRects = ComputePath(self.pic, 50).GetPathRects()
+        self.assertEqual(tuple(pathRects[0]), self.pic.GetStartRect())
+        self.assertEqual(tuple(pathRects[-1]), self.pic.GetTargetRect())
+
+    def testQuantum(self):
+        self.pic.SetMovement(Picture.MOVE_LINEAR)
+        self.pic.SetTargetRect((10, 6, 3980, 2238))
+        exact = ComputePath(self.pic, 500).GetPathRects()
+        pathRects = ComputePath(self.pic, 500, (1280, 720), 0.25).GetPathRects()
+
+        # a quarter output pixel measured at the smallest rect
+        step = 0.25 * 3980 / 1280
+        self.assertLessEqual(abs(pathRects[:, :3] - exact[:, :3]).max(),
+                             step / 2 + 1e-9)
+        self.assertLess(len(set(map(tuple, pathRects.tolist()))), 500)
+
+        # each rect keeps the aspect of the exact path
+        for rect, exactRect in zip(pathRects.tolist(), exact.tolist()):
+            height = rect[2] * exactRect[3] / exactRect[2]
+            self.assertLessEqual(abs(rect[3] - height), step / 2 + 1e-9)
+
+        self.assertTrue((ComputePath(self.pic, 500, (1280, 720)).GetPathRects() == exact).all())
+
+    def testQuantumAnamorphic(self):
+        # the rects are cropped at the project aspect and resized to the
+        # output resolution afterwards
+        self.pic.SetMovement(Picture.MOVE_LINEAR)
+        self.pic.SetTargetRect((0, 0, 4000, 2250))
+        pathRects = ComputePath(self.pic, 50, (720, 576), 0.25).GetPathRects()
+        step = 0.25 * 4000 / 720
+        for rect in pathRects.tolist():
+            self.assertAlmostEqual(rect[2] / rect[3], 16 / 9.0, places=3)
+            self.assertLessEqual(rect[1] + rect[3], 2250 + step / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import unittest
+
+from photofilmstrip.core.OutputProfile import OutputProfile, FPS25
+from photofilmstrip.core.RenderEngine import RenderSegment
+
+try:
+    from photofilmstrip.core.renderer.GStreamerRenderer import MkvX264AC3
+except ImportError:
+    # the renderers need the GStreamer bindings
+    MkvX264AC3 = None
+
+gettext.install("photofilmstrip")
+
+
+@unittest.skipIf(MkvX264AC3 is None, "gi not available")
+class TestSegmentKey(unittest.TestCase):
+
+    def setUp(self):
+        self.propValues = dict(MkvX264AC3.PROP_VALUES)
+
+    def tearDown(self):
+        MkvX264AC3.PROP_VALUES.clear()
+        MkvX264AC3.PROP_VALUES.update(self.propValues)
+
+    def _GetKeys(self, bitrate=8000):
+        renderer = MkvX264AC3()
+        renderer.Init(OutputProfile("test", (1280, 720), FPS25, bitrate),
+                      "16:9", "out.mkv")
+        return [renderer.GetSegmentKey(RenderSegment(idx, idx, idx + 1, 25,
+                                                     "fingerprint%d" % idx))
+                for idx in range(3)]
+
+    def testRuntimeProperties(self):
+        keys = self._GetKeys()
+        self.assertEqual(len(set(keys)), 3)
+
+        MkvX264AC3.SetProperty("Segments", "4")
+        MkvX264AC3.SetProperty("SinkBuffer", "16")
+        self.assertEqual(self._GetKeys(), keys)
+
+    def testOutputProperties(self):
+        keys = self._GetKeys()
+        self.assertNotEqual(self._GetKeys(bitrate=4000), keys)
+
+        MkvX264AC3.SetProperty("SpeedPreset", "fast")
+        self.assertNotEqual(self._GetKeys(), keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
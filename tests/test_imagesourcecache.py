@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import unittest
+
+from PIL import Image
+
+from photofilmstrip.core.ImageSourceCache import ImageSourceCache
+
+
+class TestImageSourceCache(unittest.TestCase):
+
+    def setUp(self):
+        # each image needs 100 * 100 * 4 bytes
+        self.imgBytes = 100 * 100 * 4
+        self.cache = ImageSourceCache(self.imgBytes * 2)
+        self.loaded = []
+
+    def _Loader(self, key):
+
+        def Load():
+            self.loaded.append(key)
+            return Image.new("RGB", (100, 100))
+        return Load
+
+    def testHit(self):
+        img1 = self.cache.Get("a", self._Loader("a"))
+        img2 = self.cache.Get("a", self._Loader("a"))
+        self.assertIs(img1, img2)
+        self.assertEqual(self.loaded, ["a"])
+        stats = self.cache.GetStatistics()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def testEvictLeastRecentlyUsed(self):
+        self.cache.Get("a", self._Loader("a"))
+        self.cache.Get("b", self._Loader("b"))
+        self.cache.Get("a", self._Loader("a"))
+        self.cache.Get("c", self._Loader("c"))
+        self.assertEqual(self.cache.GetBytes(), self.imgBytes * 2)
+
+        # b was evicted, a is still cached
+        self.cache.Get("a", self._Loader("a"))
+        self.cache.Get("b", self._Loader("b"))
+        self.assertEqual(self.loaded, ["a", "b", "c", "b"])
+
+    def testKeepOversizedImage(self):
+        cache = ImageSourceCache(10)
+        img = cache.Get("a", self._Loader("a"))
+        self.assertIs(cache.Get("a", self._Loader("a")), img)
+        cache.Get("b", self._Loader("b"))
+        self.assertEqual(cache.GetBytes(), self.imgBytes)
+        self.assertEqual(cache.GetStatistics()["evictions"], 1)
+
+    def testLoaderError(self):
+
+        def Fail():
+            raise IOError()
+
+        self.assertRaises(IOError, self.cache.Get, "a", Fail)
+        self.cache.Get("a", self._Loader("a"))
+        self.assertEqual(self.loaded, ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from photofilmstrip.core.ImportJob import ImportJob
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.PictureCache import PictureCache
+from photofilmstrip.lib.jobimpl.ResultObject import ResultObject
+
+
+class TestImportJob(unittest.TestCase):
+
+    def setUp(self):
+        gettext.install("photofilmstrip")
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheFilename = PictureCache().GetFilename()
+        PictureCache().SetFilename(os.path.join(self.tmpDir, "cache.db"))
+
+        self.pics = []
+        for idx in range(5):
+            filename = os.path.join(self.tmpDir, "pic%d.jpg" % idx)
+            Image.new("RGB", (100 + idx, 50)).save(filename)
+            self.pics.append(Picture(filename))
+        self.pics.append(Picture(os.path.join(self.tmpDir, "missing.jpg")))
+
+    def tearDown(self):
+        PictureCache().SetFilename(self.cacheFilename)
+        shutil.rmtree(self.tmpDir)
+
+    def _GetWorkLoads(self, job):
+        workLoads = []
+        while True:
+            try:
+                workLoads.append(job.GetWorkLoad())
+            except queue.Empty:
+                return workLoads
+
+    def testOrder(self):
+        batches = []
+        job = ImportJob(self.pics, lambda pics, idx: batches.append((idx, pics)))
+
+        # finish the workloads in reverse order like slow workers would
+        for workLoad in reversed(self._GetWorkLoads(job)):
+            ro = ResultObject(workLoad)
+            ro.result = workLoad._Execute(job)
+            job.PushResult(ro)
+
+        self.assertEqual(batches, [(0, self.pics)])
+        self.assertEqual(job.GetProgress(), 6)
+        self.assertEqual([pic.GetWidth() for pic in self.pics[:5]],
+                         [100, 101, 102, 103, 104])
+
+    def testPartial(self):
+        batches = []
+        job = ImportJob(self.pics, lambda pics, idx: batches.append((idx, pics)))
+        workLoads = self._GetWorkLoads(job)
+
+        for workLoadIdx in (1, 0, 3, 2, 5, 4):
+            workLoad = workLoads[workLoadIdx]
+            job.PushResult(ResultObject(workLoad))
+
+        self.assertEqual([(idx, len(pics)) for idx, pics in batches],
+                         [(0, 2), (2, 2), (4, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import unittest
+
+from photofilmstrip.lib.common.LruCache import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LruCache(10, len)
+
+    def testEviction(self):
+        self.cache.Put("a", "aaaa")
+        self.cache.Put("b", "bbbb")
+        self.assertEqual(self.cache.Get("a"), "aaaa")
+        self.cache.Put("c", "cccc")
+
+        # b is the least recently used
+        self.assertNotIn("b", self.cache)
+        self.assertEqual(self.cache.Keys(), ["a", "c"])
+        self.assertEqual(self.cache.GetBytes(), 8)
+        self.assertEqual(self.cache.GetEvictions(), 1)
+        # c was stored before b was evicted
+        self.assertEqual(self.cache.GetPeakBytes(), 12)
+
+    def testReplace(self):
+        self.cache.Put("a", "aaaa")
+        self.cache.Put("a", "aa")
+        self.assertEqual(self.cache.GetBytes(), 2)
+        self.assertEqual(self.cache.Pop("a"), "aa")
+        self.assertIsNone(self.cache.Pop("a"))
+        self.assertEqual(self.cache.GetBytes(), 0)
+
+    def testOversized(self):
+        self.cache.Put("a", "aaaa")
+        self.cache.Put("b", "b" * 20)
+        self.assertEqual(self.cache.Keys(), ["b"])
+        self.assertEqual(self.cache.Get("b"), "b" * 20)
+
+        self.cache.SetMaxBytes(100)
+        self.cache.Put("c", "cc")
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.GetBytes(), 22)
+
+
+if __name__ == "__main__":
+    unittest.main()
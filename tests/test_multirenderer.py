@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import unittest
+
+from PIL import Image
+
+from photofilmstrip.core.BaseRenderer import BaseRenderer, \
+    ImageDataFinalizeHandler, RawImageFinalizeHandler
+from photofilmstrip.core.OutputProfile import OutputProfile, FPS25
+from photofilmstrip.core.RenderJob import RenderJob
+from photofilmstrip.core.exceptions import RendererException
+from photofilmstrip.core.renderer.MultiRenderer import MultiRenderer
+
+gettext.install("photofilmstrip")
+
+
+class _FrameRenderer(BaseRenderer):
+
+    def __init__(self, finalizeHandler):
+        BaseRenderer.__init__(self)
+        self.finalizeHandler = finalizeHandler
+        self.frames = []
+        self.finalized = False
+        self.error = None
+
+    @staticmethod
+    def GetName():
+        return "Frames"
+
+    def Prepare(self):
+        pass
+
+    def Finalize(self):
+        self.finalized = True
+        if self.error is not None:
+            raise RendererException(self.error)
+
+    def GetFinalizeHandler(self):
+        return self.finalizeHandler
+
+    def ToSink(self, data):
+        self.frames.append(data)
+
+
+class TestMultiRenderer(unittest.TestCase):
+
+    def _CreateRenderer(self, resolution, finalizeHandler):
+        renderer = _FrameRenderer(finalizeHandler)
+        renderer.Init(OutputProfile("test", resolution, FPS25, 1000),
+                      None, "out")
+        return renderer
+
+    def testFanOut(self):
+        renderers = [
+            self._CreateRenderer((640, 360), RawImageFinalizeHandler()),
+            self._CreateRenderer((320, 180), RawImageFinalizeHandler()),
+            self._CreateRenderer((640, 360), RawImageFinalizeHandler()),
+            self._CreateRenderer((640, 360), ImageDataFinalizeHandler("PPM"))]
+        multiRenderer = MultiRenderer(renderers)
+
+        finalizeHandler = multiRenderer.GetFinalizeHandler()
+        self.assertTrue(finalizeHandler.IsProcessable())
+        # the equal renderers share the finalized frame
+        self.assertEqual(len(finalizeHandler.GetTargets()), 3)
+
+        img = Image.new("RGB", (640, 360), (10, 20, 30))
+        multiRenderer.ToSinkRepeated(finalizeHandler.ProcessFinalize(img), 2)
+
+        self.assertEqual([len(renderer.frames) for renderer in renderers],
+                         [2, 2, 2, 2])
+        self.assertEqual(len(renderers[0].frames[0]), 640 * 360 * 4)
+        self.assertEqual(len(renderers[1].frames[0]), 320 * 180 * 4)
+        self.assertIs(renderers[0].frames[0], renderers[2].frames[0])
+        self.assertTrue(renderers[3].frames[0].startswith(b"P6"))
+
+    def testFinalizeError(self):
+        renderers = [
+            self._CreateRenderer((640, 360), RawImageFinalizeHandler()),
+            self._CreateRenderer((320, 180), RawImageFinalizeHandler())]
+        renderers[0].error = "missing segments"
+        renderJob = RenderJob("test", MultiRenderer(renderers), [])
+
+        # all renderers are finalized and the job reports the error
+        renderJob._Begin()  # pylint: disable=protected-access
+        renderJob._Done()  # pylint: disable=protected-access
+        self.assertEqual([renderer.finalized for renderer in renderers],
+                         [True, True])
+        self.assertTrue(renderJob.IsAborted())
+        self.assertEqual(renderJob.GetInfo(), "Error: missing segments")
+
+
+if __name__ == "__main__":
+    unittest.main()
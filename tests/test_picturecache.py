@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+from photofilmstrip.core import PILBackend
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.PictureCache import PictureCache
+
+
+class TestPictureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cache = PictureCache()
+        self.cacheFilename = self.cache.GetFilename()
+        self.cache.SetFilename(os.path.join(self.tmpDir, "cache", "cache.db"))
+
+        self.filename = os.path.join(self.tmpDir, "pic.jpg")
+        exif = Image.Exif()
+        exif[274] = 6
+        Image.new("RGB", (300, 200), (200, 10, 10)).save(
+            self.filename, exif=exif.tobytes())
+
+        self.getThumbnail = PILBackend.GetThumbnail
+        self.decodes = 0
+
+        def _GetThumbnail(*args, **kwargs):
+            self.decodes += 1
+            return self.getThumbnail(*args, **kwargs)
+        PILBackend.GetThumbnail = _GetThumbnail
+
+    def tearDown(self):
+        PILBackend.GetThumbnail = self.getThumbnail
+        self.cache.SetFilename(self.cacheFilename)
+        shutil.rmtree(self.tmpDir)
+
+    def testThumbnail(self):
+        pic = Picture(self.filename)
+        thumb1 = self.cache.GetThumbnail(pic, height=100)
+        thumb2 = self.cache.GetThumbnail(pic, height=100)
+        self.assertEqual(self.decodes, 1)
+        self.assertEqual(thumb1.size, (67, 100))
+        self.assertEqual(thumb2.size, thumb1.size)
+        self.assertGreater(self.cache.GetBytes(), 0)
+
+        # other size and other rotation are separate entries
+        self.cache.GetThumbnail(pic, width=400)
+        pic.Rotate()
+        self.cache.GetThumbnail(pic, height=100)
+        self.assertEqual(self.decodes, 3)
+
+    def testModifiedFile(self):
+        pic = Picture(self.filename)
+        self.cache.GetThumbnail(pic, height=100)
+        Image.new("RGB", (400, 100)).save(self.filename)
+        os.utime(self.filename, ns=(0, 0))
+        self.assertEqual(self.cache.GetThumbnail(pic, height=100).size, (400, 100))
+        self.assertEqual(self.decodes, 2)
+
+    def testImageInfo(self):
+        self.assertEqual(self.cache.GetImageInfo(self.filename), (200, 300, 6))
+        self.assertEqual(self.cache.GetImageSize(self.filename), (200, 300))
+
+    def testConcurrentBytes(self):
+        pic = Picture(self.filename)
+
+        def _GetThumbnail():
+            for height in range(50, 60):
+                self.cache.GetThumbnail(pic, height=height)
+        threads = [threading.Thread(target=_GetThumbnail) for __ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        conn = sqlite3.connect(self.cache.GetFilename())
+        try:
+            size = conn.execute("SELECT SUM(size) FROM `thumbnail`").fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(self.cache.GetBytes(), size)
+
+    def testNotAvailable(self):
+        self.cache.SetFilename(os.path.join(self.filename, "cache.db"))
+        pic = Picture(self.filename)
+        self.cache.GetThumbnail(pic, height=100)
+        self.cache.GetThumbnail(pic, height=100)
+        self.assertEqual(self.decodes, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageChops, ImageStat
+
+from photofilmstrip.core import PILBackend
+from photofilmstrip.core.Picture import Picture
+
+
+class TestSourceImage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        bands = [Image.effect_noise((30, 20), 64) for __ in range(3)]
+        self.image = Image.merge("RGB", bands).resize((300, 200), Image.BICUBIC)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _CreatePicture(self, orientation, rotation, effect):
+        filename = os.path.join(self.tmpDir, "pic%d.jpg" % orientation)
+        if not os.path.exists(filename):
+            exif = Image.Exif()
+            exif[274] = orientation
+            self.image.save(filename, exif=exif.tobytes(), quality=95)
+        pic = Picture(filename)
+        pic.SetRotation(rotation)
+        pic.SetEffect(effect)
+        return pic
+
+    def _Check(self, orientation, rotation, effect=Picture.EFFECT_NONE):
+        pic = self._CreatePicture(orientation, rotation, effect)
+        pilImg = PILBackend.GetImage(pic)
+        width, height = pic.GetWidth(), pic.GetHeight()
+
+        pic = self._CreatePicture(orientation, rotation, effect)
+        sourceImage = PILBackend.GetSourceImage(pic)
+        self.assertEqual((pic.GetWidth(), pic.GetHeight()), (width, height))
+
+        rect = (width * 0.1, height * 0.2, width * 0.6, height * 0.5)
+        expected = PILBackend.CropAndResize(pilImg, rect, (160, 90))
+        frame = PILBackend.CropAndResize(sourceImage.GetImage(), rect, (160, 90),
+                                         matrix=sourceImage.GetMatrix())
+        frame = PILBackend.ApplyEffect(frame, effect)
+
+        diff = ImageStat.Stat(ImageChops.difference(expected, frame)).mean
+        self.assertLess(max(diff), 2, (orientation, rotation, effect))
+
+    def testOrientation(self):
+        for orientation in range(1, 9):
+            self._Check(orientation, 0)
+
+    def testRotation(self):
+        for rotation in (1, 2, 3, -1):
+            self._Check(6, rotation)
+            self._Check(1, rotation)
+
+    def testEffect(self):
+        self._Check(3, 1, Picture.EFFECT_BLACK_WHITE)
+        self._Check(1, 0, Picture.EFFECT_SEPIA)
+
+    def testScale(self):
+        pic = self._CreatePicture(6, 0, Picture.EFFECT_NONE)
+        sourceImage = PILBackend.GetSourceImage(pic, 0.5)
+        self.assertEqual((pic.GetWidth(), pic.GetHeight()), (200, 300))
+        self.assertEqual(sourceImage.GetImage().size, (150, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from PIL import Image
+
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.PictureCache import PictureCache
+from photofilmstrip.core.Project import Project
+
+try:
+    from photofilmstrip.core.ProjectFile import ProjectFile
+except ImportError:
+    # the thumbnails of loaded projects need wx
+    ProjectFile = None
+
+gettext.install("photofilmstrip")
+
+
+@unittest.skipIf(ProjectFile is None, "wx not available")
+class TestProjectFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cache = PictureCache()
+        self.cacheFilename = self.cache.GetFilename()
+        self.cache.SetFilename(os.path.join(self.tmpDir, "cache.db"))
+        self.filename = os.path.join(self.tmpDir, "test.pfs")
+
+    def tearDown(self):
+        self.cache.SetFilename(self.cacheFilename)
+        shutil.rmtree(self.tmpDir)
+
+    def _CreatePic(self, name, color):
+        filename = os.path.join(self.tmpDir, name)
+        Image.new("RGB", (300, 200), color).save(filename)
+        pic = Picture(filename)
+        pic.SetWidth(300)
+        pic.SetHeight(200)
+        return pic
+
+    def _Save(self, pics):
+        project = Project(self.filename)
+        project.SetPictures(pics)
+        ProjectFile(project, self.filename).Save(includePics=True)
+
+    def _ReadRows(self):
+        conn = sqlite3.connect(self.filename)
+        try:
+            return conn.execute(
+                "SELECT p.filename, p.picture_id, p.data, t.thumbnail_id "
+                "FROM `picture` p JOIN `thumbnail` t "
+                "ON p.picture_id=t.picture_id "
+                "ORDER BY p.picture_id ASC").fetchall()
+        finally:
+            conn.close()
+
+    def testInsertFirst(self):
+        pics = [self._CreatePic("pic%d.png" % idx, (idx * 50, 0, 0))
+                for idx in range(3)]
+        self._Save(pics)
+        rows = self._ReadRows()
+
+        # the embedded data is not written again, so a modified file would
+        # show up in the rows
+        for pic in pics:
+            Image.new("RGB", (300, 200), (0, 0, 255)).save(pic.GetFilename())
+
+        newPic = self._CreatePic("new.png", (0, 255, 0))
+        self._Save([newPic] + pics)
+        newRows = self._ReadRows()
+
+        self.assertEqual([row[0] for row in newRows],
+                         [pic.GetFilename() for pic in [newPic] + pics])
+        self.assertEqual(newRows[1:], rows)
+
+    def testReorder(self):
+        pics = [self._CreatePic("pic%d.png" % idx, (idx * 50, 0, 0))
+                for idx in range(4)]
+        self._Save(pics)
+        thumbIds = dict((row[0], row[3]) for row in self._ReadRows())
+
+        # rows are moved without writing their thumbnails again
+        for newPics in ([pics[3], pics[0], pics[2]],
+                        [pics[3], self._CreatePic("new.png", (0, 255, 0)),
+                         pics[0], pics[2]]):
+            self._Save(newPics)
+            rows = self._ReadRows()
+            self.assertEqual([row[0] for row in rows],
+                             [pic.GetFilename() for pic in newPics])
+            for row in rows:
+                if row[0] in thumbIds:
+                    self.assertEqual(row[3], thumbIds[row[0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
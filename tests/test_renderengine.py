@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import types
+import unittest
+
+from photofilmstrip.core.OutputProfile import OutputProfile, FPS25
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.RenderEngine import RenderEngineSlideshow, \
+    RenderEngineTimelapse
+
+gettext.install("photofilmstrip")
+
+
+class TestRenderEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = OutputProfile("test", (640, 360), FPS25, 1000)
+
+    def _CreatePics(self, filenames):
+        pics = []
+        for filename in filenames:
+            pic = Picture(filename)
+            pic.SetWidth(4000)
+            pic.SetHeight(2250)
+            pic.SetStartRect((0, 0, 4000, 2250))
+            pic.SetTargetRect((1000, 500, 1280, 720))
+            pics.append(pic)
+        return pics
+
+    def _Check(self, engine):
+        tasks = engine.IterTasks()
+        self.assertIsInstance(tasks, types.GeneratorType)
+        tasks = list(tasks)
+        self.assertEqual(sum(task.GetRepeat() for task in tasks),
+                         engine.GetTaskCount())
+        return tasks
+
+    def testSlideshowTaskCount(self):
+        pics = self._CreatePics(["a.jpg", "b.jpg", "c.jpg"])
+        pics[0].SetTransitionDuration(1.5)
+        pics[1].SetDuration(3.3)
+        pics[2].SetTransitionDuration(2)
+
+        self._Check(RenderEngineSlideshow(self.profile, pics, False, None))
+        self._Check(RenderEngineSlideshow(self.profile, pics, False, 17))
+
+    def testSlideshowStillPicture(self):
+        pics = self._CreatePics(["a.jpg", "b.jpg"])
+        pics[1].SetTargetRect(pics[1].GetStartRect())
+
+        tasks = self._Check(RenderEngineSlideshow(self.profile, pics, False, None))
+        picCount = int(round(pics[1].GetDuration() * 25))
+        transCount = int(round(pics[0].GetTransitionDuration() * 25))
+        # subtitle, movement of a.jpg, transition and a single task for b.jpg
+        self.assertEqual(len(tasks), 1 + picCount + transCount + 1)
+        self.assertEqual(tasks[-1].GetRepeat(), picCount)
+
+    def _CheckSegments(self, engine, count):
+        keys = [task.GetKey() for task in engine.IterTasks()]
+        prologue = [task.GetKey() for task in engine.IterPrologueTasks()]
+
+        segments = engine.GetSegments(count)
+        self.assertLessEqual(len(segments), count)
+        segmentKeys = []
+        stop = 0
+        for idx, segment in enumerate(segments):
+            self.assertEqual(segment.GetIndex(), idx)
+            self.assertGreaterEqual(segment.GetPictureRange()[0], stop)
+            stop = segment.GetPictureRange()[1]
+
+            tasks = list(engine.IterSegmentTasks(segment))
+            self.assertEqual(sum(task.GetRepeat() for task in tasks),
+                             segment.GetFrameCount())
+            segmentKeys.extend(task.GetKey() for task in tasks)
+        self.assertEqual(prologue + segmentKeys, keys)
+        return segments
+
+    def testSlideshowSegments(self):
+        pics = self._CreatePics(["a.jpg", "b.jpg", "c.jpg", "d.jpg"])
+        pics[1].SetDuration(12)
+        pics[2].SetTransitionDuration(0)
+        engine = RenderEngineSlideshow(self.profile, pics, False, None)
+
+        self.assertEqual(len(self._CheckSegments(engine, 1)), 1)
+        segments = self._CheckSegments(engine, 3)
+        self.assertEqual([segment.GetPictureRange() for segment in segments],
+                         [(0, 2), (2, 3), (3, 4)])
+        self._CheckSegments(engine, 10)
+
+    def testTimelapseSegments(self):
+        pics = self._CreatePics(["img_0010.jpg", "img_0014.jpg",
+                                 "img_0020.jpg", "img_0021.jpg"])
+        for pic in pics:
+            pic.SetDuration(2)
+            pic.SetTransitionDuration(1)
+        engine = RenderEngineTimelapse(self.profile, pics, False)
+
+        self.assertEqual(len(self._CheckSegments(engine, 3)), 3)
+
+    def testFingerprint(self):
+        pics = self._CreatePics(["a.jpg", "b.jpg", "c.jpg"])
+        engine = RenderEngineSlideshow(self.profile, pics, False, None)
+
+        def Fingerprints(engine):
+            return [segment.GetFingerprint() for segment in engine.GetSegments()]
+        fingerprints = Fingerprints(engine)
+        self.assertEqual(len(set(fingerprints)), 3)
+
+        pics[1].SetComment("only in the subtitle")
+        self.assertEqual(Fingerprints(engine), fingerprints)
+
+        # the segments after an inserted picture stay the same
+        inserted = RenderEngineSlideshow(
+            self.profile, self._CreatePics(["x.jpg"]) + pics, False, None)
+        self.assertEqual(Fingerprints(inserted)[2:], fingerprints[1:])
+
+        pics[1].SetDuration(4)
+        changed = Fingerprints(engine)
+        self.assertEqual(changed[0], fingerprints[0])
+        self.assertNotEqual(changed[1], fingerprints[1])
+        self.assertNotEqual(
+            Fingerprints(RenderEngineSlideshow(self.profile, pics, True, None)),
+            changed)
+
+    def testTimelapseTaskCount(self):
+        pics = self._CreatePics(["img_0010.jpg", "img_0014.jpg",
+                                 "img_0020.jpg"])
+        for pic in pics:
+            pic.SetDuration(3)
+            pic.SetTransitionDuration(2)
+
+        self._Check(RenderEngineTimelapse(self.profile, pics, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import threading
+import unittest
+
+from photofilmstrip.core.BaseRenderer import BaseRenderer, FinalizeHandler
+from photofilmstrip.core.RenderJob import RenderJob
+from photofilmstrip.core.tasks import Task
+from photofilmstrip.lib.jobimpl.ResultObject import ResultObject
+
+gettext.install("photofilmstrip")
+
+
+class _FrameTask(Task):
+
+    def __init__(self, idx):
+        Task.__init__(self)
+        self.idx = idx
+
+    def GetKey(self):
+        return "frame%d" % self.idx
+
+    def Run(self, jobContext):
+        return self.GetKey()
+
+
+class _PassFinalizeHandler(FinalizeHandler):
+
+    def ProcessFinalize(self, pilImg):
+        return pilImg
+
+
+class _FrameRenderer(BaseRenderer):
+
+    def __init__(self):
+        BaseRenderer.__init__(self)
+        self.frames = []
+
+    @staticmethod
+    def GetName():
+        return "Frames"
+
+    def GetFinalizeHandler(self):
+        return _PassFinalizeHandler()
+
+    def Prepare(self):
+        pass
+
+    def ToSink(self, data):
+        self.frames.append(data)
+
+    def Finalize(self):
+        pass
+
+
+class TestRenderJob(unittest.TestCase):
+
+    WINDOW = 4
+
+    def setUp(self):
+        self.renderer = _FrameRenderer()
+        self.renderJob = RenderJob("test", self.renderer,
+                                   [_FrameTask(idx) for idx in range(10)],
+                                   reorderWindow=TestRenderJob.WINDOW)
+        self.renderJob._Begin()  # pylint: disable=protected-access
+
+    def _Push(self, workLoad):
+        resultObject = ResultObject(workLoad)
+        resultObject.result = workLoad.Run(self.renderJob)
+        self.renderJob.PushResult(resultObject)
+
+    def testReorderWindow(self):
+        workLoads = [self.renderJob.GetWorkLoad()
+                     for __ in range(TestRenderJob.WINDOW)]
+        self.assertEqual([workLoad.idx for workLoad in workLoads],
+                         list(range(TestRenderJob.WINDOW)))
+
+        # the results arrive in reverse order, the renderer waits for the
+        # first frame
+        for workLoad in reversed(workLoads[1:]):
+            self._Push(workLoad)
+        self.assertEqual(self.renderer.frames, [])
+
+        # the next task is a whole window ahead of the first frame
+        nextWorkLoads = []
+        worker = threading.Thread(
+            target=lambda: nextWorkLoads.append(self.renderJob.GetWorkLoad()))
+        worker.start()
+        worker.join(0.2)
+        self.assertTrue(worker.is_alive())
+        self.assertEqual(nextWorkLoads, [])
+
+        # the first frame releases the waiting worker
+        self._Push(workLoads[0])
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual([workLoad.idx for workLoad in nextWorkLoads],
+                         [TestRenderJob.WINDOW])
+        self.assertEqual(self.renderer.frames,
+                         ["frame%d" % idx for idx in range(TestRenderJob.WINDOW)])
+
+        # no task is handed out more than a window ahead of the next frame
+        pending = nextWorkLoads
+        while pending:
+            workLoad = pending.pop(0)
+            self.assertLess(workLoad.idx,
+                            self.renderJob.resultForRendererIdx + TestRenderJob.WINDOW)
+            if workLoad.idx < 9:
+                pending.append(self.renderJob.GetWorkLoad())
+            self._Push(workLoad)
+
+        self.assertEqual(self.renderer.frames,
+                         ["frame%d" % idx for idx in range(10)])
+        self.assertEqual(self.renderJob.GetStatistics()["reorderWaits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from photofilmstrip.core.SegmentCache import SegmentCache
+
+
+class TestSegmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = SegmentCache()
+        self.prevDirectory = self.cache.GetDirectory()
+        self.directory = tempfile.mkdtemp()
+        self.cache.SetDirectory(self.directory)
+
+    def tearDown(self):
+        self.cache.SetDirectory(self.prevDirectory)
+        self.cache.SetMaxBytes(SegmentCache.DEFAULT_MAX_BYTES)
+        shutil.rmtree(self.directory)
+
+    def _Put(self, key, size, mtime):
+        tempFile = self.cache.GetTempFile(key, 0)
+        with open(tempFile, "wb") as fd:
+            fd.write(b"x" * size)
+        self.assertTrue(self.cache.Put(key, tempFile))
+        self.assertFalse(os.path.exists(tempFile))
+        os.utime(self.cache.GetFile(key), (mtime, mtime))
+
+    def testPut(self):
+        self.assertFalse(self.cache.Contains("a"))
+        self._Put("a", 10, 1000)
+        self.assertTrue(self.cache.Contains("a"))
+        self.assertEqual(self.cache.GetBytes(), 10)
+
+    def testPrune(self):
+        for idx, key in enumerate(["a", "b", "c", "d"]):
+            self._Put(key, 100, 1000 + idx)
+        self.cache.SetMaxBytes(300)
+
+        # the oldest segments are removed unless they are kept
+        self.cache.Prune(keepKeys=["a"])
+        self.assertEqual([self.cache.Contains(key) for key in "abcd"],
+                         [True, False, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import gettext
+import unittest
+
+from photofilmstrip.core.OutputProfile import OutputProfile, FPS25
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.RenderEngine import RenderEngineSlideshow
+from photofilmstrip.core.SegmentScheduler import SegmentScheduler
+
+gettext.install("photofilmstrip")
+
+
+class TestSegmentScheduler(unittest.TestCase):
+
+    def setUp(self):
+        profile = OutputProfile("test", (640, 360), FPS25, 1000)
+        pics = []
+        for idx in range(6):
+            pic = Picture("pic%d.jpg" % idx)
+            pic.SetWidth(4000)
+            pic.SetHeight(2250)
+            pic.SetStartRect((0, 0, 4000, 2250))
+            pic.SetTargetRect((1000, 500, 1280, 720))
+            pic.SetDuration(2 + idx)
+            pics.append(pic)
+        self.engine = RenderEngineSlideshow(profile, pics, False, None)
+
+    def testInterleave(self):
+        segments = self.engine.GetSegments(4)
+        scheduler = SegmentScheduler(self.engine, segments, 2)
+        self.assertEqual(scheduler.GetTaskCount(), self.engine.GetTaskCount())
+
+        tasks = list(scheduler.IterTasks())
+        self.assertEqual(sum(task.GetRepeat() for task in tasks),
+                         scheduler.GetTaskCount())
+        prologue = list(self.engine.IterPrologueTasks())
+        self.assertEqual(tasks[0].GetKey(), prologue[0].GetKey())
+
+        # each segment gets its tasks in order, at most 2 at the same time
+        segmentKeys = {}
+        active = set()
+        maxActive = 0
+        for task in tasks[len(prologue):]:
+            segment, isLast = scheduler.PopFrame()
+            segmentKeys.setdefault(segment.GetIndex(), []).append(task.GetKey())
+            active.add(segment.GetIndex())
+            maxActive = max(maxActive, len(active))
+            if isLast:
+                active.remove(segment.GetIndex())
+        self.assertEqual(maxActive, 2)
+        self.assertFalse(active)
+
+        for segment in segments:
+            self.assertEqual(segmentKeys[segment.GetIndex()],
+                             [task.GetKey() for task in
+                              self.engine.IterSegmentTasks(segment)])
+
+    def testFinished(self):
+        segments = self.engine.GetSegments(3)
+        scheduler = SegmentScheduler(self.engine, segments, 2)
+        scheduler.SetFinished(segments[1])
+        self.assertEqual(scheduler.GetTaskCount(),
+                         self.engine.GetTaskCount() - segments[1].GetFrameCount())
+
+        tasks = list(scheduler.IterTasks())
+        self.assertEqual(sum(task.GetRepeat() for task in tasks),
+                         scheduler.GetTaskCount())
+        for __ in tasks[1:]:
+            segment = scheduler.PopFrame()[0]
+            self.assertNotEqual(segment.GetIndex(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# PhotoFilmStrip - Creates movies out of your pictures.
+#
+# Copyright (C) 2018 Jens Goepfert
+#
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from photofilmstrip.core.Picture import Picture
+from photofilmstrip.core.Subtitle import SubtitleSrt, SrtParser
+
+
+class TestSrtParser(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        outFile = os.path.join(self.tmpDir, "output")
+
+        self.captions = []
+        pics = []
+        for idx in range(300):
+            pic = Picture(None)
+            pic.SetComment("picture %d" % idx)
+            pic.SetDuration(3 + idx % 5)
+            pic.SetTransitionDuration(idx % 2)
+            pics.append(pic)
+
+        SubtitleSrt(outFile).Start(pics)
+        self.srtPath = outFile + ".srt"
+
+        # expected caption per second
+        for pic in pics:
+            for __ in range(int(pic.GetDuration())):
+                self.captions.append(pic.GetComment())
+            for __ in range(int(pic.GetTransitionDuration())):
+                self.captions.append("")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def _CheckFrame(self, stp, frame):
+        # frames in the middle of a second are never on a boundary
+        expected = self.captions[frame // 25]
+        self.assertEqual(stp.Get(frame + 12), expected)
+
+    def testSequential(self):
+        stp = SrtParser(self.srtPath, 25.0)
+        for frame in range(0, len(self.captions) * 25, 25):
+            self._CheckFrame(stp, frame)
+
+    def testRandom(self):
+        stp = SrtParser(self.srtPath, 25.0)
+        frames = list(range(0, len(self.captions) * 25, 25))
+        random.Random(42).shuffle(frames)
+        for frame in frames:
+            self._CheckFrame(stp, frame)
+
+    def testBoundary(self):
+        stp = SrtParser(self.srtPath, 25.0)
+        # first picture ends exactly where the second one starts
+        self.assertEqual(stp.Get(3 * 25), "picture 0")
+        self.assertEqual(stp.Get(3 * 25 + 1), "picture 1")
+        self.assertEqual(stp.Get(10 ** 7), "")
+
+    def testMissingFile(self):
+        stp = SrtParser(os.path.join(self.tmpDir, "missing.srt"), 25.0)
+        self.assertEqual(stp.Get(0), "")
+
+
+if __name__ == "__main__":
+    unittest.main()